@@ -0,0 +1,85 @@
+"""BENCHMARK - SERIALIZATION
+Compare the time to build and serialize a list() page of persons, with and without trusted reads.
+The documents are generated in memory (no Mongo required), so only the model building, the response model
+validation and the JSON encoding are measured. Run with: python -m benchmarks.serialization [documents]
+"""
+
+# # Native # #
+import sys
+import asyncio
+from time import perf_counter
+
+# # Installed # #
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+# # Project # #
+from people_api.models import ContactsRead
+from people_api.queries import contacts_page
+from people_api.settings import api_settings
+from people_api.serialization import trusted_dict
+from people_api.utils import get_time, get_uuid
+
+DEFAULT_DOCUMENTS = 10000
+ROUNDS = 5
+
+
+def get_documents(count: int) -> list:
+    """Return person documents as stored by the API"""
+    now = get_time()
+    return [{
+        "_id": get_uuid(),
+        "doc_type": "DNI",
+        "doc_number": str(10000000 + i),
+        "name": f"Name {i}",
+        "first_name": "First",
+        "last_name": "Last",
+        "birth": "1990-05-01",
+        "alternative_cellphone_number": "935397346",
+        "address": {"street": "Av. Example 123"},
+        "symptoms": [{"q1": True, "q2": False, "q3": False, "q4": False, "q5": False, "q6": False, "q7": False,
+                      "q8": False, "q9": False, "is_suspicious": False, "created": "2021-10-04",
+                      "updated": "2021-10-04"}],
+        "created": now,
+        "updated": now,
+    } for i in range(count)]
+
+
+async def validated(documents: list, field) -> bytes:
+    """Default path: validate the documents into ContactRead objects, validate again against the response model,
+    and encode with the stdlib JSON encoder"""
+    page = contacts_page(documents, len(documents))
+    content = await serialize_response(field=field, response_content=page.items)
+    return JSONResponse(content=content).body
+
+
+async def trusted(documents: list, field) -> bytes:
+    """Trusted reads path: build the ContactRead objects without validation, and encode them with orjson"""
+    page = contacts_page(documents, len(documents))
+    return ORJSONResponse(content=[trusted_dict(item) for item in page.items]).body
+
+
+def measure(function, documents: list, trusted_reads: bool) -> float:
+    """Return the best time of some rounds of the given function"""
+    api_settings.trusted_reads = trusted_reads
+    field = create_response_field(name="response", type_=ContactsRead)
+    times = list()
+    for _ in range(ROUNDS):
+        start = perf_counter()
+        asyncio.run(function(documents, field))
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def main(count: int):
+    documents = get_documents(count)
+    validated_time = measure(validated, documents, trusted_reads=False)
+    trusted_time = measure(trusted, documents, trusted_reads=True)
+    print(f"list() of {count} persons (best of {ROUNDS} rounds)")
+    print(f"validated: {validated_time * 1000:.1f} ms")
+    print(f"trusted:   {trusted_time * 1000:.1f} ms ({validated_time / trusted_time:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DOCUMENTS)
@@ -2,25 +2,86 @@
 FastAPI app definition, initialization and definition of routes
 """
 
+# # Native # #
+import json
+import asyncio
+from email.utils import formatdate, parsedate_to_datetime
+from datetime import date
+from typing import Optional, List
+
 # # Installed # #
 from people_api.models.alarm_signal_create import AlarmSignalCreate
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response, Depends, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import status as statuscode
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse, FileResponse
+from fastapi.encoders import jsonable_encoder
 
 # # Package # #
 from .models import *
 from .exceptions import *
-from .repositories import ContactRepository, SymptomsRepository
-from .middlewares import request_handler
+from . import repositories
+from .async_repositories import *
+from .middlewares import request_handler, metrics_handler
+from .metrics import generate_latest, CONTENT_TYPE_LATEST
+from .profiling import is_allowed_host, get_profile_path
+from .indexes import ensure_indexes_in_background
+from .serialization import trusted_dict
+from .idempotency import idempotency_handler
+from .events import event_bus, watch_changes, Subscription
 from .settings import api_settings as settings
+from .settings import mongo_settings, profiling_settings, events_settings
 
 __all__ = ("app", "run")
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+FIELDS_QUERY = Query(None,
+                     description="Comma-separated list of fields to return (e.g. name,doc_number,latest_symptom). "
+                                 "Only these fields are fetched, and returned as a ContactPartialRead")
+GROUP_BY_QUERY = Query([StatsDimension.day], description="Dimensions to group the stats by")
+REGION_QUERIES = dict(
+    department=Query(None, description="Only persons of this department (code)"),
+    province=Query(None, description="Only persons of this province (code)"),
+    district=Query(None, description="Only persons of this district (code)"),
+)
+GEO_QUERIES = dict(
+    suspicious_only=Query(True, description="Only the check-ins flagged as suspicious case (false for all of them)"),
+    from_time=Query(None, alias="from", description="Check-ins at or after this Unix timestamp"),
+    to_time=Query(None, alias="to", description="Check-ins at or before this Unix timestamp"),
+    limit=Query(settings.page_size, ge=1, le=settings.max_page_size,
+                description="Maximum number of check-ins to return (the latest ones)"),
+)
+CONDITIONAL_GET_DESCRIPTION = "The person is returned with ETag and Last-Modified headers (unless fields are given), " \
+                              "so it can be revalidated with If-None-Match or If-Modified-Since"
+CONDITIONAL_GET_RESPONSES = {**get_exception_responses(ContactNotFoundException, InvalidFieldsException),
+                             statuscode.HTTP_304_NOT_MODIFIED: {"description": "The person did not change"}}
+PREFER_HEADER = Header(None,
+                       description="Send return=representation to get the updated entity on the response body "
+                                   "(status 200), instead of an empty response (status 204)")
+
+if mongo_settings.backend == "async":
+    ContactRepository = AsyncContactRepository
+    SymptomsRepository = AsyncSymptomsRepository
+    StatsRepository = AsyncStatsRepository
+    RollupsRepository = AsyncRollupsRepository
+    GeoRepository = AsyncGeoRepository
+    HeatmapRepository = AsyncHeatmapRepository
+else:
+    ContactRepository = ThreadpoolRepository(repositories.ContactRepository)
+    SymptomsRepository = ThreadpoolRepository(repositories.SymptomsRepository)
+    StatsRepository = ThreadpoolRepository(repositories.StatsRepository)
+    RollupsRepository = ThreadpoolRepository(repositories.RollupsRepository)
+    GeoRepository = ThreadpoolRepository(repositories.GeoRepository)
+    HeatmapRepository = ThreadpoolRepository(repositories.HeatmapRepository)
+
 app = FastAPI(title=settings.title)
 app.middleware("http")(request_handler)
+# Registered after the error handling, so the stored results include the error responses
+app.middleware("http")(idempotency_handler)
+# Registered last so it wraps the error handling, and measures the whole request
+app.middleware("http")(metrics_handler)
 
 origins = [
     "http://localhost",
@@ -36,31 +97,232 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+def _create_indexes():
+    if mongo_settings.create_indexes:
+        ensure_indexes_in_background()
+
+
+@app.on_event("startup")
+async def _watch_changes():
+    if events_settings.source != "bus":
+        app.state.changes_watcher = asyncio.create_task(watch_changes())
+
+
+@app.on_event("shutdown")
+async def _stop_watching_changes():
+    watcher = getattr(app.state, "changes_watcher", None)
+    if watcher:
+        watcher.cancel()
+
+
+def _partial_response(content) -> JSONResponse:
+    """Return a response with a ContactPartialRead (or list of them) as body, including only the fetched fields.
+    The response model validation is skipped, as it would fill the not-requested fields with nulls"""
+    return JSONResponse(content=jsonable_encoder(content, exclude_unset=True))
+
+
+def _trusted_response(content) -> ORJSONResponse:
+    """Return a response with a ContactRead (or list of them) built with trusted reads as body.
+    Their values are JSON-ready, so the response model validation is skipped, and they are serialized with orjson.
+    Null fields are excluded, as the Read models do"""
+    if isinstance(content, list):
+        return ORJSONResponse(content=[trusted_dict(item) for item in content])
+    return ORJSONResponse(content=trusted_dict(content))
+
+
+def _set_next_page_headers(request: Request, response: Response, next_cursor: Optional[str]):
+    """Set the Link (rel=next) and X-Next-Cursor headers of a paginated response, if there is a next page"""
+    if next_cursor:
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+        response.headers["X-Next-Cursor"] = next_cursor
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Return True if the If-None-Match header of a request matches the current ETag of the entity
+    (weak comparison: W/ prefixes are ignored)"""
+    if not if_none_match:
+        return False
+    values = [value.strip() for value in if_none_match.split(",")]
+    return "*" in values or etag in (value[2:] if value.startswith("W/") else value for value in values)
+
+
+def _version_headers(version: ContactVersion) -> dict:
+    """Return the validator headers (ETag, Last-Modified) of a person version.
+    Clients must revalidate the person (Cache-Control: no-cache) before reusing it"""
+    headers = {"ETag": f'"{version.contact_id}-{version.version or 0}"', "Cache-Control": "no-cache"}
+    if version.updated is not None:
+        headers["Last-Modified"] = formatdate(version.updated, usegmt=True)
+    return headers
+
+
+def _is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def _not_modified(request: Request, version: ContactVersion) -> bool:
+    """Return True if the person version matches the conditional headers of the request.
+    If-Modified-Since is only evaluated without If-None-Match (RFC 7232)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, _version_headers(version)["ETag"])
+    if version.updated is None:
+        return False
+    try:
+        since = parsedate_to_datetime(request.headers["if-modified-since"])
+    except (TypeError, ValueError):
+        return False
+    return version.updated <= since.timestamp()
+
+
+def _contact_response(contact: ContactRead, response: Response):
+    """Return a person read by id or IMEI, with its validator headers"""
+    headers = _version_headers(contact.version)
+    if settings.trusted_reads:
+        trusted_response = _trusted_response(contact)
+        trusted_response.headers.update(headers)
+        return trusted_response
+    response.headers.update(headers)
+    return contact
+
+
+def _wants_representation(prefer: Optional[str]) -> bool:
+    """Return if the Prefer request header asks for the updated entity to be returned"""
+    if not prefer:
+        return False
+    return any(preference.strip() == "return=representation" for preference in prefer.split(","))
+
+
+def _representation_response(content) -> JSONResponse:
+    """Return a response with the updated entity as body, for requests with Prefer: return=representation"""
+    return JSONResponse(content=jsonable_encoder(content, exclude_none=True),
+                        headers={"Preference-Applied": "return=representation"})
+
+
+def _representation_responses(model) -> dict:
+    """Return the responses definition for the 200 status returned with Prefer: return=representation"""
+    return {statuscode.HTTP_200_OK: {"model": model, "description": "Updated entity (Prefer: return=representation)"}}
+
+
 @app.get("/imei/{imei}",
          response_model=ContactRead,
-         description="Get a single person by its unique IMEI",
-         responses=get_exception_responses(ContactNotFoundException),
+         description="Get a single person by its unique IMEI. " + CONDITIONAL_GET_DESCRIPTION,
+         responses=CONDITIONAL_GET_RESPONSES,
          tags=["people"])
-def _get_contact(imei: str):
-    return ContactRepository.getByImei(imei)
+async def _get_contact(request: Request, response: Response, imei: str, fields: Optional[str] = FIELDS_QUERY):
+    if fields:
+        return _partial_response(await ContactRepository.getByImei(imei, fields=fields))
+    version = None
+    if _is_conditional(request):
+        version = await ContactRepository.getVersionByImei(imei)
+        if _not_modified(request, version):
+            return Response(status_code=statuscode.HTTP_304_NOT_MODIFIED, headers=_version_headers(version))
+    return _contact_response(await ContactRepository.getByImei(imei, version=version), response)
 
 
 @app.get("/people",
          response_model=ContactsRead,
-         description="List all the available persons",
+         description="List the available persons, sorted by last update and paginated. "
+                     "If there are more persons, the next page URL is returned on the Link header (rel=next), "
+                     "and its cursor on the X-Next-Cursor header",
+         responses=get_exception_responses(InvalidCursorException, InvalidFieldsException),
+         tags=["people"])
+async def _list_contacts(request: Request,
+                         response: Response,
+                         filters: ContactFilters = Depends(),
+                         limit: int = Query(settings.page_size,
+                                            ge=1,
+                                            le=settings.max_page_size,
+                                            description="Maximum number of persons to return"),
+                         cursor: Optional[str] = Query(None, description="Cursor of the page to return"),
+                         fields: Optional[str] = FIELDS_QUERY):
+    page = await ContactRepository.list(filters=filters, limit=limit, cursor=cursor, fields=fields)
+    if fields:
+        response = _partial_response(page.items)
+    elif settings.trusted_reads:
+        response = _trusted_response(page.items)
+    _set_next_page_headers(request, response, page.next_cursor)
+    return response if fields or settings.trusted_reads else page.items
+
+
+@app.get("/people/changes",
+         description="Incremental sync: get the persons created or updated, and the ids of the persons deleted, "
+                     "since a checkpoint. The first sync is requested with since=0, and the next ones with the "
+                     "checkpoint returned. The changes are paginated (cursor); the next page URL is returned "
+                     "on the Link header",
+         response_model=ContactChanges,
+         responses=get_exception_responses(InvalidCursorException),
+         tags=["people"])
+async def _list_contact_changes(request: Request,
+                                response: Response,
+                                since: int = Query(0, ge=0, description="Checkpoint returned by the previous sync"),
+                                limit: int = Query(settings.page_size,
+                                                   ge=1,
+                                                   le=settings.max_page_size,
+                                                   description="Maximum number of persons (and of deleted persons) "
+                                                               "to return"),
+                                cursor: Optional[str] = Query(None, description="Cursor of the page to return")):
+    changes = await ContactRepository.changes(since=since, limit=limit, cursor=cursor)
+    if settings.trusted_reads:
+        response = ORJSONResponse(content={"items": [trusted_dict(item) for item in changes.items],
+                                           "deleted": changes.deleted, "checkpoint": changes.checkpoint,
+                                           "next_cursor": changes.next_cursor})
+    _set_next_page_headers(request, response, changes.next_cursor)
+    return response if settings.trusted_reads else changes
+
+
+@app.get("/people/export",
+         description="Export all the available persons, optionally filtered, as a stream of NDJSON lines "
+                     "(one person JSON document per line)",
+         response_class=StreamingResponse,
+         responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
+         tags=["people"])
+async def _export_contacts(filters: ContactFilters = Depends()):
+    return StreamingResponse(ContactRepository.export(filters=filters), media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.get("/people/{contact_id}/symptoms",
+         response_model=List[SymptomCheckin],
+         response_model_exclude_none=True,
+         description="List the symptom check-ins of a person, newest first, optionally within a time range, "
+                     "and paginated. If there are older check-ins, the next page URL is returned on the Link header "
+                     "(rel=next), and its cursor on the X-Next-Cursor header",
+         responses=get_exception_responses(ContactNotFoundException, InvalidCursorException),
          tags=["people"])
-def _list_contacts():
-    # TODO Filters
-    return ContactRepository.list()
+async def _list_contact_symptoms(request: Request,
+                                 response: Response,
+                                 contact_id: str,
+                                 from_time: Optional[int] = Query(
+                                     None, alias="from", description="Check-ins at or after this Unix timestamp"),
+                                 to_time: Optional[int] = Query(
+                                     None, alias="to", description="Check-ins at or before this Unix timestamp"),
+                                 limit: int = Query(settings.page_size,
+                                                    ge=1,
+                                                    le=settings.max_page_size,
+                                                    description="Maximum number of check-ins to return"),
+                                 cursor: Optional[str] = Query(None, description="Cursor of the page to return")):
+    page = await ContactRepository.listSymptoms(contact_id, from_time=from_time, to_time=to_time,
+                                                limit=limit, cursor=cursor)
+    _set_next_page_headers(request, response, page.next_cursor)
+    return page.items
 
 
 @app.get("/people/{contact_id}",
          response_model=ContactRead,
-         description="Get a single person by its unique ID",
-         responses=get_exception_responses(ContactNotFoundException),
+         description="Get a single person by its unique ID. " + CONDITIONAL_GET_DESCRIPTION,
+         responses=CONDITIONAL_GET_RESPONSES,
          tags=["people"])
-def _get_contact(contact_id: str):
-    return ContactRepository.get(contact_id)
+async def _get_contact(request: Request, response: Response, contact_id: str,
+                       fields: Optional[str] = FIELDS_QUERY):
+    if fields:
+        return _partial_response(await ContactRepository.get(contact_id, fields=fields))
+    version = None
+    if _is_conditional(request):
+        version = await ContactRepository.getVersion(contact_id)
+        if _not_modified(request, version):
+            return Response(status_code=statuscode.HTTP_304_NOT_MODIFIED, headers=_version_headers(version))
+    return _contact_response(await ContactRepository.get(contact_id, version=version), response)
 
 
 @app.post("/people",
@@ -69,41 +331,117 @@ def _get_contact(contact_id: str):
           status_code=statuscode.HTTP_201_CREATED,
           responses=get_exception_responses(ContactAlreadyExistsException),
           tags=["people"])
-def _create_person(create: ContactCreate):
-    print(create)
-    return ContactRepository.create(create)
+async def _create_person(create: ContactCreate):
+    return await ContactRepository.create(create)
+
+
+@app.put("/people/by-document/{doc_type}/{doc_number}",
+         description="Create a person, or update it if a person with the same document already exists, "
+                     "atomically, so the registration can be retried safely. "
+                     "Returns 201 if the person was created, or 200 if it was updated",
+         response_model=ContactUpsertResult,
+         responses=get_exception_responses(DocumentMismatchException, ContactAlreadyExistsException),
+         tags=["people"])
+async def _upsert_person(doc_type: str, doc_number: str, upsert: ContactUpsert, response: Response):
+    result = await ContactRepository.upsertByDocument(doc_type, doc_number, upsert)
+    if result.created:
+        response.status_code = statuscode.HTTP_201_CREATED
+    return result
+
+
+async def _read_batch(request: Request) -> List[dict]:
+    """Read the items of a batch request body, that can be a JSON array (application/json),
+    or one JSON document per line (application/x-ndjson)"""
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except ValueError as ex:
+        raise InvalidBodyException(message=f"{InvalidBodyException.message}: {ex}")
+
+    if not isinstance(items, list):
+        raise InvalidBodyException(message=f"{InvalidBodyException.message}: a JSON array is required")
+    if len(items) > settings.batch_max_size:
+        raise BatchTooLargeException(
+            message=f"{BatchTooLargeException.message} (maximum {settings.batch_max_size})")
+    return items
+
+
+@app.post("/people:batch",
+          description="Create many persons at once. The body can be a JSON array of persons, "
+                      f"or one person JSON document per line ({NDJSON_MEDIA_TYPE}). "
+                      "Persons are validated and created on their own, and the result of each one is returned",
+          response_model=ContactsBatchResult,
+          responses=get_exception_responses(InvalidBodyException, BatchTooLargeException),
+          openapi_extra={"requestBody": {"required": True, "content": {
+              "application/json": {"schema": {"type": "array",
+                                              "items": {"$ref": "#/components/schemas/ContactCreate"}}},
+              NDJSON_MEDIA_TYPE: {"schema": {"$ref": "#/components/schemas/ContactCreate"}},
+          }}},
+          tags=["people"])
+async def _create_people_batch(request: Request):
+    items = await _read_batch(request)
+    return await ContactRepository.createMany(items)
 
 
 @app.patch(
     "/people/{contact_id}",
     description="Update a single person by its unique ID, providing the fields to update",
     status_code=statuscode.HTTP_204_NO_CONTENT,
-    responses=get_exception_responses(ContactNotFoundException,
-                                      ContactAlreadyExistsException),
+    responses={**get_exception_responses(ContactNotFoundException,
+                                         ContactAlreadyExistsException),
+               **_representation_responses(ContactRead)},
     tags=["people"])
-def _update_contact(contact_id: str, update: ContactUpdate):
-    ContactRepository.update(contact_id, update)
+async def _update_contact(contact_id: str, update: ContactUpdate, prefer: Optional[str] = PREFER_HEADER):
+    representation = _wants_representation(prefer)
+    contact = await ContactRepository.update(contact_id, update, return_document=representation)
+    if representation:
+        return _representation_response(contact)
 
 
 @app.patch(
     "/people-symptom/{contact_id}",
     description="Add a single symptom object for person by its unique ID, providing the fields to update",
     status_code=statuscode.HTTP_204_NO_CONTENT,
-    responses=get_exception_responses(ContactNotFoundException,
-                                      ContactAlreadyExistsException),
+    responses={**get_exception_responses(ContactNotFoundException,
+                                         ContactAlreadyExistsException),
+               **_representation_responses(ContactRead)},
+    tags=["people"])
+async def _add_symptom(contact_id: str, update: SymptomUpdate, prefer: Optional[str] = PREFER_HEADER):
+    representation = _wants_representation(prefer)
+    contact = await ContactRepository.addSymptom(contact_id, update, return_document=representation)
+    if representation:
+        return _representation_response(contact)
+
+@app.patch(
+    "/people-symptom:batch",
+    description="Add many symptoms at once, for one or many persons. "
+                "The symptoms of persons that do not exist are skipped, and their ids returned",
+    response_model=SymptomsBatchResult,
+    responses=get_exception_responses(BatchTooLargeException),
     tags=["people"])
-def _add_symptom(contact_id: str, update: SymptomUpdate):
-    ContactRepository.addSymptom(contact_id, update)
+async def _add_symptoms_batch(items: List[SymptomBatchItem]):
+    if len(items) > settings.batch_max_size:
+        raise BatchTooLargeException(
+            message=f"{BatchTooLargeException.message} (maximum {settings.batch_max_size})")
+    return await ContactRepository.addSymptoms(items)
+
 
 @app.patch(
     "/people-symptom-alarmsignal/{contact_id}",
     description="Add a single symptom object for person by its unique ID, providing the fields to update",
     status_code=statuscode.HTTP_204_NO_CONTENT,
-    responses=get_exception_responses(ContactNotFoundException,
-                                      ContactAlreadyExistsException),
+    responses={**get_exception_responses(ContactNotFoundException,
+                                         ContactAlreadyExistsException),
+               **_representation_responses(ContactRead)},
     tags=["people"])
-def _add_alarmsignal(contact_id: str, update: AlarmSignalCreate):
-    ContactRepository.addAlarmSignal(contact_id, update)
+async def _add_alarmsignal(contact_id: str, update: AlarmSignalCreate, prefer: Optional[str] = PREFER_HEADER):
+    representation = _wants_representation(prefer)
+    contact = await ContactRepository.addAlarmSignal(contact_id, update, return_document=representation)
+    if representation:
+        return _representation_response(contact)
 
 
 # Symtoms
@@ -111,21 +449,29 @@ def _add_alarmsignal(contact_id: str, update: AlarmSignalCreate):
 
 @app.get("/person-symptoms/{person_id}",
          response_model=SymptomsRead,
-         description="List all the available symptoms",
+         description="List all the available symptoms (symptoms collection) of a person. "
+                     "The symptom check-ins of a person are listed on /people/{contact_id}/symptoms",
          tags=["symptoms"])
-def _list_person_symptoms(contact_id: str):
-    # TODO Filters
-    print(contact_id)
-    return SymptomsRepository.list(contact_id)
+async def _list_person_symptoms(person_id: str):
+    return await SymptomsRepository.list(person_id)
 
 
 @app.get("/symptoms",
          response_model=SymptomsRead,
-         description="List all the available symptoms",
+         description="List all the available symptoms, optionally of a single person",
+         tags=["symptoms"])
+async def _list_symptoms(person_id: Optional[str] = None):
+    return await SymptomsRepository.list(person_id)
+
+
+@app.get("/symptoms/export",
+         description="Export all the available symptoms, optionally of a single person, as a stream of NDJSON lines "
+                     "(one symptom JSON document per line)",
+         response_class=StreamingResponse,
+         responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
          tags=["symptoms"])
-def _list_symptoms():
-    # TODO Filters
-    return SymptomsRepository.list()
+async def _export_symptoms(person_id: Optional[str] = None):
+    return StreamingResponse(SymptomsRepository.export(person_id=person_id), media_type=NDJSON_MEDIA_TYPE)
 
 
 @app.get("/symptoms/{symptom_id}",
@@ -133,8 +479,8 @@ def _list_symptoms():
          description="Get a single symptom by its unique ID",
          responses=get_exception_responses(SymptomNotFoundException),
          tags=["symptoms"])
-def _get_symptom(symptom_id: str):
-    return SymptomRepository.get(symptom_id)
+async def _get_symptom(symptom_id: str):
+    return await SymptomsRepository.get(symptom_id)
 
 
 @app.post("/symptoms",
@@ -143,19 +489,23 @@ def _get_symptom(symptom_id: str):
           status_code=statuscode.HTTP_201_CREATED,
           responses=get_exception_responses(SymptomAlreadyExistsException),
           tags=["symptoms"])
-def _create_symptom(create: SymptomCreate):
-    return SymptomsRepository.create(create)
+async def _create_symptom(create: SymptomCreate):
+    return await SymptomsRepository.create(create)
 
 
 @app.patch(
-    "/symptoms/{symptoms_id}",
+    "/symptoms/{symptom_id}",
     description="Update a single symptom by its unique ID, providing the fields to update",
     status_code=statuscode.HTTP_204_NO_CONTENT,
-    responses=get_exception_responses(SymptomNotFoundException,
-                                      SymptomAlreadyExistsException),
+    responses={**get_exception_responses(SymptomNotFoundException,
+                                         SymptomAlreadyExistsException),
+               **_representation_responses(SymptomRead)},
     tags=["symptoms"])
-def _update_symptom(symptom_id: str, update: SymptomUpdate):
-    SymptomRepository.update(symptom_id, update)
+async def _update_symptom(symptom_id: str, update: SymptomUpdate, prefer: Optional[str] = PREFER_HEADER):
+    representation = _wants_representation(prefer)
+    symptom = await SymptomsRepository.update(symptom_id, update, return_document=representation)
+    if representation:
+        return _representation_response(symptom)
 
 
 @app.delete("/symptoms/{symptom_id}",
@@ -163,17 +513,202 @@ def _update_symptom(symptom_id: str, update: SymptomUpdate):
             status_code=statuscode.HTTP_204_NO_CONTENT,
             responses=get_exception_responses(SymptomNotFoundException),
             tags=["symptoms"])
-def _delete_symptom(symptom_id: str):
-    SymptomsRepository.delete(symptom_id)
+async def _delete_symptom(symptom_id: str):
+    await SymptomsRepository.delete(symptom_id)
 
 
-@app.delete("/people/{person_id}",
+@app.delete("/people/{contact_id}",
             description="Delete a single person by its unique ID",
             status_code=statuscode.HTTP_204_NO_CONTENT,
             responses=get_exception_responses(ContactNotFoundException),
             tags=["people"])
-def _delete_person(contact_id: str):
-    ContactRepository.delete(contact_id)
+async def _delete_person(contact_id: str):
+    await ContactRepository.delete(contact_id)
+
+
+# Stats
+
+
+def _regions(department: Optional[str], province: Optional[str], district: Optional[str]) -> dict:
+    """Return the regions the stats are filtered by, as {dimension: code}"""
+    regions = dict(department=department, province=province, district=district)
+    return {dimension: code for dimension, code in regions.items() if code is not None}
+
+
+@app.get("/stats/symptoms",
+         response_model=List[SymptomsStats],
+         response_model_exclude_none=True,
+         description="Count the symptom check-ins (total and suspicious cases), optionally within a time range "
+                     "and of some regions, grouped by day and/or regions",
+         tags=["stats"])
+async def _symptoms_stats(group_by: List[StatsDimension] = GROUP_BY_QUERY,
+                          from_time: Optional[int] = Query(
+                              None, alias="from", description="Check-ins at or after this Unix timestamp"),
+                          to_time: Optional[int] = Query(
+                              None, alias="to", description="Check-ins at or before this Unix timestamp"),
+                          department: Optional[str] = REGION_QUERIES["department"],
+                          province: Optional[str] = REGION_QUERIES["province"],
+                          district: Optional[str] = REGION_QUERIES["district"]):
+    return await StatsRepository.symptoms(group_by, from_time=from_time, to_time=to_time,
+                                          regions=_regions(department, province, district))
+
+
+@app.get("/stats/alarm-signals",
+         response_model=List[AlarmSignalsStats],
+         response_model_exclude_none=True,
+         description="Count the alarm signal reports (total and positives of each question), optionally within "
+                     "a time range and of some regions, grouped by day and/or regions",
+         tags=["stats"])
+async def _alarm_signals_stats(group_by: List[StatsDimension] = GROUP_BY_QUERY,
+                               from_time: Optional[int] = Query(
+                                   None, alias="from", description="Reports at or after this Unix timestamp"),
+                               to_time: Optional[int] = Query(
+                                   None, alias="to", description="Reports at or before this Unix timestamp"),
+                               department: Optional[str] = REGION_QUERIES["department"],
+                               province: Optional[str] = REGION_QUERIES["province"],
+                               district: Optional[str] = REGION_QUERIES["district"]):
+    return await StatsRepository.alarmSignals(group_by, from_time=from_time, to_time=to_time,
+                                              regions=_regions(department, province, district))
+
+
+@app.get("/stats/comorbidities",
+         response_model=List[ComorbiditiesStats],
+         response_model_exclude_none=True,
+         description="Count the persons with each comorbidity, optionally of some regions, "
+                     "grouped by day of registration and/or regions",
+         tags=["stats"])
+async def _comorbidities_stats(group_by: List[StatsDimension] = GROUP_BY_QUERY,
+                               department: Optional[str] = REGION_QUERIES["department"],
+                               province: Optional[str] = REGION_QUERIES["province"],
+                               district: Optional[str] = REGION_QUERIES["district"]):
+    return await StatsRepository.comorbidities(group_by, regions=_regions(department, province, district))
+
+
+@app.get("/stats/rollups",
+         response_model=List[Rollup],
+         description="Get the counters of a range of days (registrations, check-ins, suspicious cases, symptoms "
+                     "and alarm signals), of a department or of all of them. "
+                     "Counters are maintained on each write, so no aggregation is done on read",
+         tags=["stats"])
+async def _get_rollups(from_day: date = Query(..., alias="from", description="First day (UTC), as YYYY-MM-DD"),
+                       to_day: Optional[date] = Query(
+                           None, alias="to", description="Last day (UTC), as YYYY-MM-DD (default: same as from)"),
+                       department: Optional[str] = Query(
+                           None, description="Department code (default: all the departments)")):
+    to_day = to_day or from_day
+    return await RollupsRepository.list(from_day.isoformat(), to_day.isoformat(), department)
+
+
+# Geospatial
+
+
+@app.get("/checkins/near",
+         response_model=List[GeoCheckin],
+         response_model_exclude_none=True,
+         description="Find the latest symptom check-ins located within a distance of a point, newest first",
+         tags=["geo"])
+async def _checkins_near(latitude: float = Query(..., ge=-90, le=90, description="Latitude of the center point"),
+                         longitude: float = Query(..., ge=-180, le=180, description="Longitude of the center point"),
+                         radius_km: float = Query(..., gt=0, le=settings.geo_max_radius_km,
+                                                  description="Distance from the point, in km"),
+                         suspicious_only: bool = GEO_QUERIES["suspicious_only"],
+                         from_time: Optional[int] = GEO_QUERIES["from_time"],
+                         to_time: Optional[int] = GEO_QUERIES["to_time"],
+                         limit: int = GEO_QUERIES["limit"]):
+    return await GeoRepository.near(latitude, longitude, radius_km, suspicious_only=suspicious_only,
+                                    from_time=from_time, to_time=to_time, limit=limit)
+
+
+@app.get("/checkins/within",
+         response_model=List[GeoCheckin],
+         response_model_exclude_none=True,
+         description="Find the latest symptom check-ins located inside a bounding box, newest first",
+         responses=get_exception_responses(InvalidAreaException),
+         tags=["geo"])
+async def _checkins_within(south: float = Query(..., ge=-90, le=90, description="Minimum latitude"),
+                           west: float = Query(..., ge=-180, le=180, description="Minimum longitude"),
+                           north: float = Query(..., ge=-90, le=90, description="Maximum latitude"),
+                           east: float = Query(..., ge=-180, le=180, description="Maximum longitude"),
+                           suspicious_only: bool = GEO_QUERIES["suspicious_only"],
+                           from_time: Optional[int] = GEO_QUERIES["from_time"],
+                           to_time: Optional[int] = GEO_QUERIES["to_time"],
+                           limit: int = GEO_QUERIES["limit"]):
+    return await GeoRepository.within(south, west, north, east, suspicious_only=suspicious_only,
+                                      from_time=from_time, to_time=to_time, limit=limit)
+
+
+@app.get("/heatmap/{tile}",
+         response_model=HeatmapTile,
+         description="Get the counts of suspicious check-ins per cell of a heatmap tile (geohash). "
+                     "The cells are geohashes 2 characters longer than the tile. Tiles are updated on each check-in, "
+                     "and their ETag changes with each update, so they can be revalidated with If-None-Match",
+         responses={**get_exception_responses(InvalidTileException),
+                    statuscode.HTTP_304_NOT_MODIFIED: {"description": "The tile did not change"}},
+         tags=["geo"])
+async def _get_heatmap_tile(tile: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    heatmap_tile = await HeatmapRepository.get(tile.lower())
+    etag = f'"{heatmap_tile.tile}-{heatmap_tile.version}"'
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=statuscode.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return heatmap_tile
+
+
+# Events
+
+
+async def _event_stream(subscription: Subscription):
+    """Write the events of a subscription as Server-Sent Events, until the client disconnects"""
+    try:
+        while True:
+            event = await subscription.get(timeout=events_settings.keepalive)
+            dropped = subscription.pop_dropped()
+            if dropped:
+                yield f"event: dropped\ndata: {json.dumps({'dropped': dropped})}\n\n"
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: {event.type.value}\ndata: {event.json(exclude_none=True)}\n\n"
+    finally:
+        event_bus.unsubscribe(subscription)
+
+
+@app.get("/events",
+         response_class=StreamingResponse,
+         description="Stream of new suspicious cases and alarm signals, as Server-Sent Events (text/event-stream). "
+                     "The name of each event is its type, and its data a CaseEvent (JSON). "
+                     "If the client is slower than the events, the oldest ones are dropped, "
+                     "and the number of events lost is sent on a dropped event",
+         responses={**get_exception_responses(TooManySubscribersException),
+                    statuscode.HTTP_200_OK: {"content": {EVENT_STREAM_MEDIA_TYPE: {}}}},
+         tags=["events"])
+async def _events(types: List[EventType] = Query([], description="Only events of these types (default: all)"),
+                  department: Optional[str] = Query(None, description="Only events of persons of this department")):
+    subscription = event_bus.subscribe(set(types), department)
+    return StreamingResponse(_event_stream(subscription), media_type=EVENT_STREAM_MEDIA_TYPE,
+                             headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/metrics",
+         description="Requests, Mongo commands and cache metrics, in Prometheus text format",
+         response_class=Response,
+         tags=["monitoring"])
+def _metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/profiles/{profile_id}",
+         description="Download the profile of a request (with the id returned on its X-Profile-Id header), "
+                     "as folded stacks, which can be rendered as a flamegraph",
+         response_class=FileResponse,
+         responses=get_exception_responses(ProfileNotFoundException),
+         tags=["monitoring"])
+def _get_profile(profile_id: str, request: Request):
+    if not profiling_settings.enabled or not is_allowed_host(request):
+        raise ProfileNotFoundException(identifier=profile_id)
+    return FileResponse(get_profile_path(profile_id), media_type="text/plain",
+                        filename=f"{profile_id}.folded")
 
 
 def run():
@@ -0,0 +1,549 @@
+"""ASYNC REPOSITORIES
+Non-blocking methods to interact with the database, using the Motor async driver.
+They mirror the sync repositories (same methods, arguments, return values and exceptions), but must be awaited
+"""
+
+# # Native # #
+import inspect
+from typing import Optional, Union, List, Tuple, AsyncIterator
+
+# # Installed # #
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
+
+# # Package # #
+from .models import *
+from .models.alarm_signal_create import AlarmSignalCreate
+from .exceptions import *
+from .cache import contacts_cache
+from .events import publish_checkins, publish_alarm_signal
+from .profiling import current_profile
+from .database import (async_collection, async_symptomCollection, async_symptomsHistory, async_rollups,
+                       async_heatmap, async_tombstones)
+from .queries import *
+from .settings import api_settings, mongo_settings
+from .utils import get_time, get_uuid
+
+__all__ = (
+    "AsyncContactRepository",
+    "AsyncSymptomsRepository",
+    "AsyncSymptomsHistoryRepository",
+    "AsyncStatsRepository",
+    "AsyncRollupsRepository",
+    "AsyncGeoRepository",
+    "AsyncHeatmapRepository",
+    "AsyncTombstonesRepository",
+    "ThreadpoolRepository",
+)
+
+
+class AsyncContactRepository:
+    @staticmethod
+    async def getByImei(imei: str, fields: Optional[str] = None,
+                           version: Optional[ContactVersion] = None) -> ContactRead:
+        """Retrieve a single Person by its unique IMEI.
+        If fields are given (comma-separated), only those are fetched and a ContactPartialRead is returned.
+        Otherwise, the person is cached until it gets written. If its current version (read from the database)
+        is given, a cached person of another version (written by another process) is not returned"""
+        projection = contact_projection(fields)
+        if not projection:
+            contact = contacts_cache.get(f"imei:{imei}")
+            if contact is not None and (version is None or contact.version == version):
+                return contact
+
+        document = await async_collection.find_one({"imei": imei}, projection)
+        if not document:
+            raise ContactNotFoundException(imei)
+        if projection:
+            return ContactPartialRead(**document)
+
+        contact = contact_read(document)
+        contacts_cache.set(f"imei:{imei}", contact, tags=[document["_id"]])
+        return contact
+
+    @staticmethod
+    async def getVersionByImei(imei: str) -> ContactVersion:
+        """Retrieve the version of a Person by its unique IMEI, fetching only its version fields.
+        Always read from the database (not the cache), so the writes done by other processes are seen"""
+        return contact_version(await async_collection.find_one({"imei": imei}, VERSION_PROJECTION), imei)
+
+    @staticmethod
+    async def getVersion(contact_id: str) -> ContactVersion:
+        """Retrieve the version of a Person by its unique id, fetching only its version fields.
+        Always read from the database (not the cache), so the writes done by other processes are seen"""
+        return contact_version(await async_collection.find_one({"_id": contact_id}, VERSION_PROJECTION), contact_id)
+
+    @staticmethod
+    async def get(contact_id: str, fields: Optional[str] = None,
+                     version: Optional[ContactVersion] = None) -> ContactRead:
+        """Retrieve a single Person by its unique id.
+        If fields are given (comma-separated), only those are fetched and a ContactPartialRead is returned.
+        Otherwise, the person is cached until it gets written. If its current version (read from the database)
+        is given, a cached person of another version (written by another process) is not returned"""
+        projection = contact_projection(fields)
+        if not projection:
+            contact = contacts_cache.get(f"id:{contact_id}")
+            if contact is not None and (version is None or contact.version == version):
+                return contact
+
+        document = await async_collection.find_one({"_id": contact_id}, projection)
+        if not document:
+            raise ContactNotFoundException(contact_id)
+        if projection:
+            return ContactPartialRead(**document)
+
+        contact = contact_read(document)
+        contacts_cache.set(f"id:{contact_id}", contact, tags=[contact_id])
+        return contact
+
+    @staticmethod
+    async def list(filters: Optional[ContactFilters] = None,
+                   limit: int = api_settings.page_size,
+                   cursor: Optional[str] = None,
+                   fields: Optional[str] = None) -> ContactsPage:
+        """Retrieve a page of the available persons, optionally filtered.
+        The cursor is the next_cursor returned on the previous page.
+        If fields are given (comma-separated), only those (plus updated, required for the cursor) are fetched"""
+        query = contacts_page_query(filters, cursor)
+        projection = contact_projection(fields)
+        if projection:
+            projection["updated"] = 1
+        documents = async_collection.find(query, projection).sort(CONTACTS_SORT).limit(limit + 1)
+        return contacts_page(await documents.to_list(None), limit, projection)
+
+    @staticmethod
+    async def changes(since: int = 0,
+                      limit: int = api_settings.page_size,
+                      cursor: Optional[str] = None) -> ContactChanges:
+        """Retrieve a page of the persons changed (created or updated) and deleted since a checkpoint (updated time),
+        for incremental syncs. The cursor is the next_cursor returned on the previous page (since is then ignored).
+        Each page has up to limit persons and up to limit deleted persons"""
+        since, until, persons_after, tombstones_after = changes_window(since, cursor)
+        persons, deleted = list(), list()
+        if persons_after is None or persons_after:
+            query = changes_query("updated", since, until, persons_after)
+            documents = await async_collection.find(query).sort(CONTACTS_SORT).limit(limit + 1).to_list(None)
+            persons, persons_after = changes_page(documents, "updated", limit)
+        if tombstones_after is None or tombstones_after:
+            documents = await AsyncTombstonesRepository.list(since, until, tombstones_after, limit + 1)
+            deleted, tombstones_after = changes_page(documents, "deleted", limit)
+        return contact_changes(persons, deleted, since, until, persons_after, tombstones_after)
+
+    @staticmethod
+    async def export(filters: Optional[ContactFilters] = None,
+                     batch_size: int = api_settings.export_batch_size) -> AsyncIterator[bytes]:
+        """Iterate all the available persons, optionally filtered, as chunks of NDJSON lines.
+        Documents are fetched and serialized in batches, so memory usage does not depend on the collection size"""
+        query = filters.query() if filters else dict()
+        batch = list()
+        async for document in async_collection.find(query).batch_size(batch_size):
+            batch.append(document)
+            if len(batch) == batch_size:
+                yield ndjson_chunk(ContactRead, batch)
+                batch.clear()
+        if batch:
+            yield ndjson_chunk(ContactRead, batch)
+
+    @staticmethod
+    async def listSymptoms(contact_id: str,
+                           from_time: Optional[int] = None,
+                           to_time: Optional[int] = None,
+                           limit: int = api_settings.page_size,
+                           cursor: Optional[str] = None) -> SymptomCheckinsPage:
+        """Retrieve a page of the symptom check-ins of a person, newest first, optionally within a time range.
+        The cursor is the next_cursor returned on the previous page.
+        Only the matching check-ins are fetched: from the symptoms history if kept, otherwise from the person"""
+        if mongo_settings.symptoms_window > 0:
+            return await AsyncSymptomsHistoryRepository.list(contact_id, from_time, to_time, limit, cursor)
+
+        upper, skip = checkins_cursor_range(to_time, cursor)
+        pipeline = checkins_pipeline(contact_id, from_time, upper, limit + 1 + skip)
+        documents = await async_collection.aggregate(pipeline).to_list(None)
+        if not documents:
+            raise ContactNotFoundException(identifier=contact_id)
+        return checkins_page(documents[0]["symptoms"][::-1], limit, upper, skip)
+
+    @staticmethod
+    async def create(create: ContactCreate) -> ContactRead:
+        """Create a person and return its Read object"""
+        document = create.dict()
+        document["created"] = document["updated"] = get_time()
+        document["version"] = 1
+        document["_id"] = get_uuid()
+
+        try:
+            result = await async_collection.insert_one(document)
+        except DuplicateKeyError as ex:
+            raise ContactAlreadyExistsException(duplicate_key(ex))
+        assert result.acknowledged
+        await AsyncRollupsRepository.add([(document["created"], department_code(document),
+                                           registration_counters(document))])
+
+        # The Read object is built from the inserted document, to avoid reading it back
+        return ContactRead(**document)
+
+    @staticmethod
+    async def upsertByDocument(doc_type: str, doc_number: str, upsert: ContactUpsert) -> ContactUpsertResult:
+        """Create or update a person by its document, atomically, so retried registrations do not duplicate it.
+        The previous id of the person (if any) is fetched on the same round trip (find_one_and_update)"""
+        query, update, inserted = upsert_operation(doc_type, doc_number, upsert)
+        try:
+            previous = await async_collection.find_one_and_update(query, update, projection={"_id": 1}, upsert=True)
+        except DuplicateKeyError:
+            # a concurrent upsert inserted the same person: now it exists, so this one updates it
+            try:
+                previous = await async_collection.find_one_and_update(query, update, projection={"_id": 1},
+                                                                      upsert=True)
+            except DuplicateKeyError as ex:
+                raise ContactAlreadyExistsException(duplicate_key(ex))
+
+        if previous:
+            contacts_cache.invalidate(previous["_id"])
+            return ContactUpsertResult(contact_id=previous["_id"], created=False)
+        await AsyncRollupsRepository.add([(inserted["created"], department_code(inserted),
+                                           registration_counters(inserted))])
+        return ContactUpsertResult(contact_id=inserted["_id"], created=True)
+
+    @staticmethod
+    async def createMany(items: List[dict]) -> ContactsBatchResult:
+        """Create many persons with a single unordered insert. Each person is validated on its own,
+        and the invalid or duplicated persons are reported on the result, without failing the others"""
+        documents, results = contacts_batch_documents(items)
+        write_errors = list()
+        if documents:
+            try:
+                await async_collection.insert_many(documents, ordered=False)
+            except BulkWriteError as ex:
+                write_errors = ex.details["writeErrors"]
+            await AsyncRollupsRepository.add([(document["created"], department_code(document),
+                                               registration_counters(document))
+                                              for document in inserted_documents(documents, write_errors)])
+        return contacts_batch_result(results, write_errors)
+
+    @staticmethod
+    async def _update(contact_id: str, operation: Union[dict, List[dict]], return_document: bool,
+                      projection: Optional[dict] = None) -> Optional[dict]:
+        """Apply an update operation (or pipeline) on a person. If return_document, the updated person document is returned,
+        fetched on the same round trip (find_one_and_update). Otherwise, if a projection is given,
+        those fields of the person are returned, also on the same round trip"""
+        if return_document or projection:
+            try:
+                document = await async_collection.find_one_and_update(
+                    {"_id": contact_id}, operation, projection=None if return_document else projection,
+                    return_document=ReturnDocument.AFTER)
+            except DuplicateKeyError as ex:
+                raise ContactAlreadyExistsException(duplicate_key(ex))
+            contacts_cache.invalidate(contact_id)
+            if not document:
+                raise ContactNotFoundException(identifier=contact_id)
+            return document
+
+        try:
+            result = await async_collection.update_one({"_id": contact_id}, operation)
+        except DuplicateKeyError as ex:
+            raise ContactAlreadyExistsException(duplicate_key(ex))
+        contacts_cache.invalidate(contact_id)
+        if not result.matched_count:
+            raise ContactNotFoundException(identifier=contact_id)
+
+    @staticmethod
+    async def update(contact_id: str, update: ContactUpdate,
+                     return_document: bool = False) -> Optional[ContactRead]:
+        """Update a person by giving only the fields to update. Only the fields sent are written (nested fields
+        by their dotted path), and the updated time only changes if some of them changed.
+        If return_document, the updated person is returned"""
+        document = await AsyncContactRepository._update(contact_id, patch_pipeline(update), return_document)
+        return ContactRead(**document) if return_document else None
+
+    @staticmethod
+    async def addSymptom(contact_id: str, update: SymptomUpdate,
+                         return_document: bool = False) -> Optional[ContactRead]:
+        """Add a person symptom by giving only the fields to update.
+        If return_document, the updated person is returned"""
+        symptom = symptom_document(update)
+        document = await AsyncContactRepository._update(contact_id, add_symptom_operation(symptom), return_document,
+                                                        department_projection())
+        await AsyncSymptomsHistoryRepository.add([(contact_id, symptom)])
+        await AsyncRollupsRepository.add([(symptom["updated"], department_code(document), checkin_counters(symptom))])
+        await AsyncHeatmapRepository.add([symptom])
+        publish_checkins([(contact_id, department_code(document), symptom)])
+        return ContactRead(**document) if return_document else None
+
+    @staticmethod
+    async def addSymptoms(items: List[SymptomBatchItem]) -> SymptomsBatchResult:
+        """Add many symptoms, for one or many persons, with a single bulk write.
+        The symptoms of persons that do not exist are skipped, and reported on the result"""
+        contact_ids = list(dict.fromkeys(item.contact_id for item in items))
+        departments = {document["_id"]: department_code(document) async for document in
+                       async_collection.find({"_id": {"$in": contact_ids}}, ROLLUP_PROJECTION)}
+        existing_ids = set(departments)
+
+        added = 0
+        checkins = symptoms_batch_checkins(items, existing_ids)
+        if checkins:
+            result = await async_collection.bulk_write(symptoms_batch_operations(checkins), ordered=False)
+            added = result.modified_count
+            for contact_id in existing_ids:
+                contacts_cache.invalidate(contact_id)
+            await AsyncSymptomsHistoryRepository.add(checkins)
+            await AsyncRollupsRepository.add([(symptom["updated"], departments[contact_id], checkin_counters(symptom))
+                                              for contact_id, symptom in checkins])
+            await AsyncHeatmapRepository.add([symptom for _, symptom in checkins])
+            publish_checkins([(contact_id, departments[contact_id], symptom) for contact_id, symptom in checkins])
+
+        not_found = [contact_id for contact_id in contact_ids if contact_id not in existing_ids]
+        return SymptomsBatchResult(added=added, not_found=not_found)
+
+    @staticmethod
+    async def addAlarmSignal(contact_id: str, update: AlarmSignalCreate,
+                             return_document: bool = False) -> Optional[ContactRead]:
+        """Add an alarm signal report to a person, kept with its time on the person alarm signals.
+        If return_document, the updated person is returned"""
+        alarm_signal = alarm_signal_document(update)
+        document = await AsyncContactRepository._update(contact_id, add_alarm_signal_operation(alarm_signal),
+                                                        return_document, department_projection())
+        await AsyncRollupsRepository.add([(alarm_signal["updated"], department_code(document),
+                                           alarm_signal_counters(alarm_signal))])
+        publish_alarm_signal(contact_id, department_code(document), alarm_signal)
+        return ContactRead(**document) if return_document else None
+
+    @staticmethod
+    async def delete(contact_id: str):
+        """Delete a person given its unique id. A tombstone is kept, so the deletion is synced on the changes"""
+        result = await async_collection.delete_one({"_id": contact_id})
+        contacts_cache.invalidate(contact_id)
+        if not result.deleted_count:
+            raise ContactNotFoundException(identifier=contact_id)
+        await AsyncTombstonesRepository.add(contact_id)
+
+
+class AsyncSymptomsRepository:
+    @staticmethod
+    async def get(symptom_id: str) -> SymptomRead:
+        """Retrieve a single Symptom by its unique id"""
+        document = await async_symptomCollection.find_one({"_id": symptom_id})
+        if not document:
+            raise SymptomNotFoundException(symptom_id)
+        return SymptomRead(**document)
+
+    @staticmethod
+    async def list(person_id: Optional[str] = None) -> SymptomsRead:
+        """Retrieve all the available symptoms, optionally of a single person"""
+        cursor = async_symptomCollection.find({"person_id": person_id} if person_id else dict())
+        return [SymptomRead(**document) async for document in cursor]
+
+    @staticmethod
+    async def export(person_id: Optional[str] = None,
+                     batch_size: int = api_settings.export_batch_size) -> AsyncIterator[bytes]:
+        """Iterate all the available symptoms, optionally of a single person, as chunks of NDJSON lines.
+        Documents are fetched and serialized in batches, so memory usage does not depend on the collection size"""
+        query = {"person_id": person_id} if person_id else dict()
+        batch = list()
+        async for document in async_symptomCollection.find(query).batch_size(batch_size):
+            batch.append(document)
+            if len(batch) == batch_size:
+                yield ndjson_chunk(SymptomRead, batch)
+                batch.clear()
+        if batch:
+            yield ndjson_chunk(SymptomRead, batch)
+
+    @staticmethod
+    async def create(create: SymptomCreate) -> SymptomRead:
+        """Create a symptom and return its Read object"""
+        document = create.dict()
+        document["created"] = document["updated"] = get_time()
+        document["_id"] = get_uuid()
+
+        try:
+            result = await async_symptomCollection.insert_one(document)
+        except DuplicateKeyError as ex:
+            raise SymptomAlreadyExistsException(duplicate_key(ex))
+        assert result.acknowledged
+
+        # The Read object is built from the inserted document, to avoid reading it back
+        return SymptomRead(**document)
+
+    @staticmethod
+    async def update(symptom_id: str, update: SymptomUpdate,
+                     return_document: bool = False) -> Optional[SymptomRead]:
+        """Update a symptom by giving only the fields to update.
+        If return_document, the updated symptom is returned, fetched on the same round trip (find_one_and_update)"""
+        document = update.dict()
+        document["updated"] = get_time()
+
+        if return_document:
+            document = await async_symptomCollection.find_one_and_update({"_id": symptom_id}, {"$set": document},
+                                                                         return_document=ReturnDocument.AFTER)
+            if not document:
+                raise SymptomNotFoundException(identifier=symptom_id)
+            return SymptomRead(**document)
+
+        result = await async_symptomCollection.update_one({"_id": symptom_id},
+                                                          {"$set": document})
+        if not result.matched_count:
+            raise SymptomNotFoundException(identifier=symptom_id)
+
+    @staticmethod
+    async def delete(symptom_id: str):
+        """Delete a symptom given its unique id"""
+        result = await async_symptomCollection.delete_one({"_id": symptom_id})
+        if not result.deleted_count:
+            raise SymptomNotFoundException(identifier=symptom_id)
+
+
+class AsyncSymptomsHistoryRepository:
+    @staticmethod
+    async def add(checkins: List[Tuple[str, dict]]):
+        """Append (person id, symptom document) check-ins to the history, if kept"""
+        operations = symptoms_history_operations(checkins)
+        if operations:
+            await async_symptomsHistory.bulk_write(operations, ordered=False)
+
+    @staticmethod
+    async def list(contact_id: str,
+                   from_time: Optional[int] = None,
+                   to_time: Optional[int] = None,
+                   limit: int = api_settings.page_size,
+                   cursor: Optional[str] = None) -> SymptomCheckinsPage:
+        """Retrieve a page of the symptom check-ins of a person, newest first, optionally within a time range.
+        Buckets are read, newest day first, until the page is complete"""
+        upper, skip = checkins_cursor_range(to_time, cursor)
+        query = {"contact_id": contact_id}
+        days = checkins_days(from_time, upper)
+        if days:
+            query["day"] = days
+
+        documents = list()
+        # Buckets are fetched in small batches, as a page usually needs only a few days
+        async for bucket in async_symptomsHistory.find(query).sort("day", DESCENDING).batch_size(2):
+            documents.extend(bucket_checkins(bucket, from_time, upper))
+            if len(documents) > limit + skip:
+                break
+        if not documents and not await async_collection.count_documents({"_id": contact_id}, limit=1):
+            raise ContactNotFoundException(identifier=contact_id)
+        return checkins_page(documents, limit, upper, skip)
+
+
+class AsyncStatsRepository:
+    @staticmethod
+    async def symptoms(group_by: List[StatsDimension],
+                       from_time: Optional[int] = None,
+                       to_time: Optional[int] = None,
+                       regions: Optional[dict] = None) -> List[SymptomsStats]:
+        """Count the symptom check-ins (total and suspicious) within a time range,
+        optionally of some regions ({dimension: code}), grouped by the given dimensions"""
+        pipeline = symptoms_stats_pipeline(group_by, from_time, to_time, regions)
+        source = async_collection if mongo_settings.symptoms_window <= 0 else async_symptomsHistory
+        return symptoms_stats(await source.aggregate(pipeline, allowDiskUse=True).to_list(None))
+
+    @staticmethod
+    async def alarmSignals(group_by: List[StatsDimension],
+                           from_time: Optional[int] = None,
+                           to_time: Optional[int] = None,
+                           regions: Optional[dict] = None) -> List[AlarmSignalsStats]:
+        """Count the alarm signal reports (total and positives of each question) within a time range,
+        optionally of some regions ({dimension: code}), grouped by the given dimensions"""
+        pipeline = alarm_signals_stats_pipeline(group_by, from_time, to_time, regions)
+        return alarm_signals_stats(await async_collection.aggregate(pipeline, allowDiskUse=True).to_list(None))
+
+    @staticmethod
+    async def comorbidities(group_by: List[StatsDimension], regions: Optional[dict] = None) -> List[ComorbiditiesStats]:
+        """Count the persons with each comorbidity, optionally of some regions ({dimension: code}),
+        grouped by the given dimensions"""
+        pipeline = comorbidities_stats_pipeline(group_by, regions)
+        return comorbidities_stats(await async_collection.aggregate(pipeline, allowDiskUse=True).to_list(None))
+
+
+class AsyncRollupsRepository:
+    @staticmethod
+    async def add(events: List[RollupEvent]):
+        """Increment the rollups counters with the given events, if maintained"""
+        operations = rollup_operations(events)
+        if operations:
+            await async_rollups.bulk_write(operations, ordered=False)
+
+    @staticmethod
+    async def list(from_day: str, to_day: str, department: Optional[str] = None) -> List[Rollup]:
+        """Retrieve the rollups of a range of days (YYYY-MM-DD), of a department or of all of them (None)"""
+        cursor = async_rollups.find({"department": department, "day": {"$gte": from_day, "$lte": to_day}})
+        return [Rollup(**document) async for document in cursor.sort("day", ASCENDING)]
+
+
+class AsyncTombstonesRepository:
+    @staticmethod
+    async def add(contact_id: str):
+        await async_tombstones.replace_one({"_id": contact_id}, {"deleted": get_time()}, upsert=True)
+
+    @staticmethod
+    async def list(since: int, until: int, after: Optional[list], limit: int) -> List[dict]:
+        """Retrieve the tombstones of the persons deleted on (since, until], after the given (deleted, id) position"""
+        cursor = async_tombstones.find(changes_query("deleted", since, until, after))
+        return await cursor.sort(TOMBSTONES_SORT).limit(limit).to_list(None)
+
+
+class AsyncGeoRepository:
+    @staticmethod
+    async def _checkins(area: dict, suspicious_only: bool, from_time: Optional[int], to_time: Optional[int],
+                        limit: int) -> List[GeoCheckin]:
+        pipeline = geo_checkins_pipeline(area, suspicious_only, from_time, to_time, limit)
+        source = async_collection if mongo_settings.symptoms_window <= 0 else async_symptomsHistory
+        return [GeoCheckin(**document) async for document in source.aggregate(pipeline)]
+
+    @staticmethod
+    async def near(latitude: float, longitude: float, radius_km: float,
+                   suspicious_only: bool = True,
+                   from_time: Optional[int] = None,
+                   to_time: Optional[int] = None,
+                   limit: int = api_settings.page_size) -> List[GeoCheckin]:
+        """Retrieve the latest check-ins located within a distance (km) of a point, newest first"""
+        area = circle_area(latitude, longitude, radius_km)
+        return await AsyncGeoRepository._checkins(area, suspicious_only, from_time, to_time, limit)
+
+    @staticmethod
+    async def within(south: float, west: float, north: float, east: float,
+                     suspicious_only: bool = True,
+                     from_time: Optional[int] = None,
+                     to_time: Optional[int] = None,
+                     limit: int = api_settings.page_size) -> List[GeoCheckin]:
+        """Retrieve the latest check-ins located inside a bounding box (latitudes and longitudes), newest first"""
+        area = box_area(south, west, north, east)
+        return await AsyncGeoRepository._checkins(area, suspicious_only, from_time, to_time, limit)
+
+
+class AsyncHeatmapRepository:
+    @staticmethod
+    async def add(symptoms: List[dict]):
+        """Increment the heatmap tiles with the check-ins (symptom documents), if maintained"""
+        operations = heatmap_operations(symptoms)
+        if operations:
+            await async_heatmap.bulk_write(operations, ordered=False)
+
+    @staticmethod
+    async def get(tile: str) -> HeatmapTile:
+        """Retrieve a heatmap tile, given its geohash"""
+        validate_tile(tile)
+        return heatmap_tile(tile, await async_heatmap.find_one({"_id": tile}))
+
+
+class ThreadpoolRepository:
+    """Wrap a sync repository so it exposes the same awaitable interface as the async repositories.
+    Each method call runs on the Starlette threadpool, so the blocking pymongo calls do not block the event loop.
+    Generator methods are returned as-is, as StreamingResponse already iterates sync iterators on the threadpool.
+    If the request is being profiled, the threadpool thread is sampled while running the method"""
+
+    def __init__(self, repository):
+        self._repository = repository
+
+    def __getattr__(self, name):
+        method = getattr(self._repository, name)
+        if not callable(method) or inspect.isgeneratorfunction(method):
+            return method
+
+        async def _run_in_threadpool(*args, **kwargs):
+            profile = current_profile.get()
+            if profile is not None:
+                return await run_in_threadpool(profile.run, method, *args, **kwargs)
+            return await run_in_threadpool(method, *args, **kwargs)
+
+        return _run_in_threadpool
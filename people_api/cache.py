@@ -0,0 +1,134 @@
+"""CACHE
+Read caches used by the repositories. Cached entries are tagged (e.g. with the person id),
+so all the entries of an entity can be invalidated when it is written.
+Backends implement the CacheBackend interface, so a backend shared by multiple workers can be plugged in
+"""
+
+# # Native # #
+import threading
+from time import monotonic
+from collections import OrderedDict, defaultdict
+from typing import Any, Optional, Iterable
+
+# # Package # #
+from .settings import cache_settings as settings
+
+__all__ = ("CacheBackend", "NullCache", "LRUCache", "get_cache_backend", "contacts_cache")
+
+
+class CacheBackend:
+    """Interface of the cache backends"""
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the value cached for the key, or None if not cached (or expired)"""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = ()):
+        """Cache a value for the key, tagged with the given tags"""
+        raise NotImplementedError
+
+    def invalidate(self, tag: str):
+        """Remove all the cached entries tagged with the given tag"""
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove all the cached entries"""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """Return the cache counters (hits, misses, size...)"""
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+    """Backend used when the cache is disabled: nothing gets cached"""
+
+    def get(self, key: str) -> Optional[Any]:
+        return None
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = ()):
+        pass
+
+    def invalidate(self, tag: str):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self) -> dict:
+        return dict(hits=0, misses=0, size=0, max_size=0)
+
+
+class LRUCache(CacheBackend):
+    """In-process, thread-safe cache, bounded in size (the least recently used entries are evicted)
+    and in time (entries expire after ttl seconds)"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key: (expiration, value, tags)
+        self._tags = defaultdict(set)  # tag: keys
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = ()):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            tags = tuple(tags)
+            self._entries[key] = (monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._tags[tag].add(key)
+
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tag: str):
+        with self._lock:
+            for key in self._tags.pop(tag, ()):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self) -> dict:
+        return dict(hits=self.hits, misses=self.misses, size=len(self._entries), max_size=self.max_size)
+
+    def _remove(self, key: str):
+        """Remove an entry and its tag references. The lock must be held"""
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+def get_cache_backend() -> CacheBackend:
+    """Return a new cache backend, as defined on the cache settings"""
+    if not settings.enabled or settings.max_size <= 0:
+        return NullCache()
+    if settings.backend == "memory":
+        return LRUCache(max_size=settings.max_size, ttl=settings.ttl)
+    raise ValueError(f"Unknown cache backend: {settings.backend}")
+
+
+contacts_cache = get_cache_backend()
+"""Cache of persons (ContactRead) read by id or IMEI, tagged with the person id"""
@@ -5,15 +5,45 @@ MongoDB database initialization
 # # Installed # #
 from pymongo import MongoClient
 from pymongo.collection import Collection
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
 
 # # Package # #
+from .metrics import mongo_command_listener
 from .settings import mongo_settings as settings
 
-__all__ = ("client", "collection", "symptomCollection", "comorbidities")
+__all__ = ("client", "collection", "symptomCollection", "comorbidities", "symptomsHistory",
+           "rollups", "heatmap", "tombstones", "idempotency", "async_client", "async_collection",
+           "async_symptomCollection", "async_symptomsHistory", "async_rollups", "async_heatmap", "async_tombstones",
+           "async_idempotency")
 
-client = MongoClient(settings.uri)
+# The command listener observes the duration of each Mongo command (see metrics module)
+client = MongoClient(settings.uri, event_listeners=[mongo_command_listener])
 collection: Collection = client[settings.database][settings.collection]
 symptomCollection: Collection = client[settings.database][
     settings.symptoms_collection]
 comorbidities: Collection = client[settings.database][
     settings.comorbidity_collection]
+symptomsHistory: Collection = client[settings.database][
+    settings.symptoms_history_collection]
+rollups: Collection = client[settings.database][settings.rollups_collection]
+heatmap: Collection = client[settings.database][settings.heatmap_collection]
+tombstones: Collection = client[settings.database][settings.tombstones_collection]
+idempotency: Collection = client[settings.database][settings.idempotency_collection]
+
+# Async client, used by the async repositories (MONGO_BACKEND=async).
+# Motor does not connect nor bind to an event loop until the first operation
+async_client = AsyncIOMotorClient(settings.uri, event_listeners=[mongo_command_listener])
+async_collection: AsyncIOMotorCollection = async_client[settings.database][
+    settings.collection]
+async_symptomCollection: AsyncIOMotorCollection = async_client[
+    settings.database][settings.symptoms_collection]
+async_symptomsHistory: AsyncIOMotorCollection = async_client[
+    settings.database][settings.symptoms_history_collection]
+async_rollups: AsyncIOMotorCollection = async_client[settings.database][
+    settings.rollups_collection]
+async_heatmap: AsyncIOMotorCollection = async_client[settings.database][
+    settings.heatmap_collection]
+async_tombstones: AsyncIOMotorCollection = async_client[settings.database][
+    settings.tombstones_collection]
+async_idempotency: AsyncIOMotorCollection = async_client[settings.database][
+    settings.idempotency_collection]
@@ -0,0 +1,223 @@
+"""EVENTS
+Real-time feed of new suspicious cases and positive alarm signals, streamed to the subscribers of the events endpoint.
+Events are fanned out in-process by the event bus, and come from one of these sources (events_settings.source):
+- change streams: a watcher of the persons collection, so the writes of any worker or process are notified
+- bus: the repositories of this process publish the events of their writes (used when change streams are not
+  available, as they require a replica set)
+Each subscriber has a bounded queue: if a subscriber is slower than the events, its oldest events are dropped
+(and counted), so slow subscribers never block the writes nor grow the memory
+"""
+
+# # Native # #
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Optional, List, Set, Tuple, Iterable
+
+# # Installed # #
+from pymongo.errors import PyMongoError, OperationFailure
+
+# # Package # #
+from .models import *
+from .exceptions import TooManySubscribersException
+from .metrics import EVENT_SUBSCRIBERS, EVENTS_DROPPED
+from .database import async_collection
+from .settings import events_settings as settings
+
+__all__ = ("Subscription", "EventBus", "event_bus", "checkin_events", "alarm_signal_events", "publish_checkins",
+           "publish_alarm_signal", "watch_changes")
+
+POSITIVE_ALARM_SIGNALS = [f"q{i}" for i in range(1, 6)]
+"""Alarm signal questions that are positive signs (q6 is "none")"""
+WATCHED_FIELDS = ["latest_symptom", "latest_alarm_signal"]
+"""Person fields whose updates can produce events (set by addSymptom and addAlarmSignal)"""
+CHANGE_STREAM_UNSUPPORTED_ERROR = 40573
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Events queue of a subscriber, with its filters. Must be created from the event loop that consumes it"""
+
+    def __init__(self, types: Optional[Set[EventType]] = None, department: Optional[str] = None,
+                 queue_size: int = settings.queue_size):
+        self.types = types
+        self.department = department
+        self.dropped = 0
+        self._events = deque(maxlen=queue_size)
+        self._available = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+
+    def matches(self, event: CaseEvent) -> bool:
+        return (not self.types or event.type in self.types) and \
+            (self.department is None or event.department == self.department)
+
+    def put(self, event: CaseEvent):
+        """Queue an event, dropping the oldest one if the queue is full. Must run on the event loop"""
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+            EVENTS_DROPPED.inc()
+        self._events.append(event)
+        self._available.set()
+
+    def put_threadsafe(self, event: CaseEvent):
+        """Queue an event from any thread"""
+        try:
+            self._loop.call_soon_threadsafe(self.put, event)
+        except RuntimeError:
+            # the event loop is closed
+            pass
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[CaseEvent]:
+        """Wait for the next event, and return it (or None on timeout)"""
+        if not self._events:
+            self._available.clear()
+            try:
+                await asyncio.wait_for(self._available.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._events.popleft()
+
+    def pop_dropped(self) -> int:
+        """Return the number of events dropped since the last call"""
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class EventBus:
+    """In-process fan-out of the events to the subscriptions that match them"""
+
+    def __init__(self, max_subscribers: int = settings.max_subscribers):
+        self.max_subscribers = max_subscribers
+        self.watching = False
+        """True while a change stream watcher is the source of the events (the repositories do not publish)"""
+        self._subscriptions: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, types: Optional[Set[EventType]] = None, department: Optional[str] = None) -> Subscription:
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                raise TooManySubscribersException()
+            subscription = Subscription(types, department)
+            self._subscriptions.add(subscription)
+        EVENT_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription not in self._subscriptions:
+                return
+            self._subscriptions.discard(subscription)
+        EVENT_SUBSCRIBERS.dec()
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscriptions)
+
+    def publish(self, events: Iterable[CaseEvent]):
+        """Deliver the events to the subscriptions that match them. Can be called from any thread"""
+        with self._lock:
+            subscriptions = tuple(self._subscriptions)
+        for event in events:
+            for subscription in subscriptions:
+                if subscription.matches(event):
+                    subscription.put_threadsafe(event)
+
+
+event_bus = EventBus()
+
+
+def _is_positive(value) -> bool:
+    return value in (True, "true")
+
+
+def checkin_events(contact_id: str, department: Optional[str], symptom: dict) -> List[CaseEvent]:
+    """Return the events of a symptom check-in (symptom document): suspicious case and/or alarm signal"""
+    events = list()
+    if _is_positive(symptom.get("is_suspicious")):
+        events.append(CaseEvent(type=EventType.suspicious_case, contact_id=contact_id, time=symptom["updated"],
+                                department=department))
+    if symptom.get("alarm_signal"):
+        events.extend(alarm_signal_events(contact_id, department, symptom["alarm_signal"]))
+    return events
+
+
+def alarm_signal_events(contact_id: str, department: Optional[str], alarm_signal: dict) -> List[CaseEvent]:
+    """Return the events of an alarm signal (document): an event if some sign is positive"""
+    signals = [q for q in POSITIVE_ALARM_SIGNALS if _is_positive(alarm_signal.get(q))]
+    if not signals:
+        return []
+    return [CaseEvent(type=EventType.alarm_signal, contact_id=contact_id, time=alarm_signal["updated"],
+                      department=department, alarm_signals=signals)]
+
+
+def _publishes_writes() -> bool:
+    """Return True if the repositories must publish the events of their writes: the events do not come from
+    the change streams, and there are subscribers"""
+    return not event_bus.watching and event_bus.has_subscribers()
+
+
+def publish_checkins(checkins: List[Tuple[str, Optional[str], dict]]):
+    """Publish the events of the (person id, department, symptom document) check-ins written by this process"""
+    if _publishes_writes():
+        event_bus.publish([event for contact_id, department, symptom in checkins
+                           for event in checkin_events(contact_id, department, symptom)])
+
+
+def publish_alarm_signal(contact_id: str, department: Optional[str], alarm_signal: dict):
+    """Publish the events of an alarm signal (document) written by this process"""
+    if _publishes_writes():
+        event_bus.publish(alarm_signal_events(contact_id, department, alarm_signal))
+
+
+def _change_stream_pipeline() -> List[dict]:
+    """Return the pipeline of the persons change stream: only the updates of the watched fields,
+    with the department of the person. The updated fields are kept as a list, as their names may have dots"""
+    fields = {"$filter": {"input": {"$objectToArray": "$updateDescription.updatedFields"},
+                          "as": "field",
+                          "cond": {"$in": ["$$field.k", WATCHED_FIELDS]}}}
+    return [
+        {"$match": {"operationType": "update"}},
+        {"$project": {"documentKey": 1, "department": "$fullDocument.address.department.code", "fields": fields}},
+        {"$match": {"fields.0": {"$exists": True}}},
+    ]
+
+
+def _change_events(change: dict) -> List[CaseEvent]:
+    """Return the events of a change of the persons change stream"""
+    contact_id = change["documentKey"]["_id"]
+    department = change.get("department")
+    fields = {field["k"]: field["v"] for field in change["fields"]}
+    events = list()
+    if "latest_symptom" in fields:
+        events.extend(checkin_events(contact_id, department, fields["latest_symptom"]))
+    if "latest_alarm_signal" in fields:
+        events.extend(alarm_signal_events(contact_id, department, fields["latest_alarm_signal"]))
+    return events
+
+
+async def watch_changes(retry_seconds: float = 1):
+    """Publish the events of the persons change stream, resuming it after errors. Run as a background task.
+    With source=auto, if change streams are not supported, return and let the repositories publish the events"""
+    resume_token = None
+    while True:
+        try:
+            async with async_collection.watch(_change_stream_pipeline(), full_document="updateLookup",
+                                              resume_after=resume_token) as stream:
+                event_bus.watching = True
+                logger.info("Watching the persons change stream for events")
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    event_bus.publish(_change_events(change))
+        except OperationFailure as ex:
+            event_bus.watching = False
+            if ex.code == CHANGE_STREAM_UNSUPPORTED_ERROR and settings.source == "auto":
+                logger.info("Change streams are not supported, the events are published by the repositories")
+                return
+            # the server rejected the stream (e.g. the resume token is too old): restart from now
+            resume_token = None
+            logger.exception("Error on the persons change stream")
+        except PyMongoError:
+            event_bus.watching = False
+            logger.exception("Error on the persons change stream")
+        await asyncio.sleep(retry_seconds)
@@ -18,7 +18,11 @@ from .models.errors import *
 __all__ = ("BaseAPIException", "BaseIdentifiedException", "NotFoundException",
            "AlreadyExistsException", "ContactNotFoundException",
            "ComorbidityNotFoundException", "SymptomNotFoundException",
-           "ContactAlreadyExistsException", "get_exception_responses", "SymptomAlreadyExistsException")
+           "ContactAlreadyExistsException", "get_exception_responses", "SymptomAlreadyExistsException",
+           "BadRequestException", "InvalidCursorException", "InvalidFieldsException",
+           "InvalidBodyException", "DocumentMismatchException", "BatchTooLargeException", "ProfileNotFoundException",
+           "InvalidAreaException", "InvalidTileException", "TooManySubscribersException",
+           "InvalidIdempotencyKeyException", "IdempotencyKeyInUseException", "IdempotencyKeyReusedException")
 
 
 class BaseAPIException(Exception):
@@ -43,6 +47,12 @@ class BaseAPIException(Exception):
         return {cls.code: {"model": cls.model}}
 
 
+class BadRequestException(BaseAPIException):
+    """Base error for exceptions raised because the request parameters are not valid"""
+    message = "Bad request"
+    code = statuscode.HTTP_400_BAD_REQUEST
+
+
 class BaseIdentifiedException(BaseAPIException):
     """Base error for exceptions related with entities, uniquely identified"""
     message = "Entity error"
@@ -82,6 +92,11 @@ class SymptomNotFoundException(NotFoundException):
     message = "The symptom does not exist"
 
 
+class ProfileNotFoundException(NotFoundException):
+    """Error raised when a request profile does not exist (or profiling is not allowed)"""
+    message = "The profile does not exist"
+
+
 class ContactAlreadyExistsException(AlreadyExistsException):
     """Error raised when a person already exists"""
     message = "The person already exists"
@@ -91,6 +106,65 @@ class SymptomAlreadyExistsException(AlreadyExistsException):
     message = "The symptom already exists"
 
 
+class InvalidCursorException(BadRequestException):
+    """Error raised when a pagination cursor is malformed"""
+    message = "The pagination cursor is not valid"
+
+
+class InvalidFieldsException(BadRequestException):
+    """Error raised when the fields requested for a partial response do not exist"""
+    message = "Some of the requested fields do not exist"
+
+
+class InvalidBodyException(BadRequestException):
+    """Error raised when a request body that is manually parsed is malformed"""
+    message = "The request body is not valid"
+
+
+class DocumentMismatchException(BadRequestException):
+    """Error raised when the document of a person body does not match the document of the path"""
+    message = "The document type and number of the body do not match the ones of the path"
+
+
+class InvalidAreaException(BadRequestException):
+    """Error raised when the area of a geospatial query is not valid"""
+    message = "The area is not valid (south must be lower than north, and west lower than east)"
+
+
+class InvalidTileException(BadRequestException):
+    """Error raised when a heatmap tile is not a geohash of one of the available lengths"""
+    message = "The tile is not valid"
+
+
+class BatchTooLargeException(BadRequestException):
+    """Error raised when a batch request has more items than allowed"""
+    message = "The batch has too many items"
+    code = statuscode.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+class TooManySubscribersException(BaseAPIException):
+    """Error raised when the maximum number of event subscribers is reached"""
+    message = "Too many subscribers, try again later"
+    code = statuscode.HTTP_503_SERVICE_UNAVAILABLE
+
+
+class InvalidIdempotencyKeyException(BadRequestException):
+    """Error raised when an Idempotency-Key header is empty or too long"""
+    message = "The Idempotency-Key is not valid (1 to 255 characters)"
+
+
+class IdempotencyKeyInUseException(BaseAPIException):
+    """Error raised when a request with the same Idempotency-Key is still being processed"""
+    message = "A request with the same Idempotency-Key is being processed, try again later"
+    code = statuscode.HTTP_409_CONFLICT
+
+
+class IdempotencyKeyReusedException(BaseAPIException):
+    """Error raised when an Idempotency-Key was already used by a different request"""
+    message = "The Idempotency-Key was already used by a different request"
+    code = statuscode.HTTP_422_UNPROCESSABLE_ENTITY
+
+
 def get_exception_responses(*args: Type[BaseAPIException]) -> dict:
     """Given BaseAPIException classes, return a dict of responses used on FastAPI endpoint definition, with the format:
     {statuscode: schema, statuscode: schema, ...}"""
@@ -0,0 +1,162 @@
+"""IDEMPOTENCY
+Support of the Idempotency-Key header on the write requests, so clients can retry them safely.
+The result (status, headers and body) of the first request sent with a key is stored on the idempotency collection
+(expired by a TTL index), with an in-process LRU cache in front, and replayed to the later requests with the same key,
+without processing them again. A key is reserved (stored as pending) before its request is processed, so concurrent
+retries are rejected instead of processed twice. Keys whose requests fail (5xx) are released, so they can be retried
+"""
+
+# # Native # #
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+# # Installed # #
+from fastapi import Request, Response
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+from prometheus_client import Counter
+
+# # Package # #
+from .cache import NullCache, LRUCache
+from .exceptions import *
+from .metrics import cache_collector
+from .database import idempotency, async_idempotency
+from .settings import idempotency_settings as settings
+
+__all__ = ("IdempotencyRepository", "idempotency_handler", "results_cache", "IDEMPOTENCY_REPLAYS")
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+MAX_KEY_LENGTH = 255
+EXCLUDED_HEADERS = ("content-length", "x-profile-id")
+"""Response headers not stored: recomputed on replay, or specific to the first request"""
+
+IDEMPOTENCY_REPLAYS = Counter(
+    "people_api_idempotency_replays_total", "Write requests answered with the stored result of a previous request "
+                                            "with the same Idempotency-Key, by where the result was found",
+    ["source"])
+
+results_cache = LRUCache(max_size=settings.cache_size, ttl=settings.ttl) if settings.cache_size > 0 else NullCache()
+"""Cache of the stored results, by key"""
+cache_collector.add("idempotency", results_cache)
+
+
+class IdempotencyRepository:
+    """Results of the requests sent with an Idempotency-Key. Each key is a document, created as pending when
+    its request starts, and completed with the result (response) when it ends"""
+    collection = idempotency
+    indexes = [
+        IndexModel([("created", ASCENDING)], name="created_ttl", expireAfterSeconds=settings.ttl, background=True),
+    ]
+    """Indexes required by the queries of this repository, created by indexes.ensure_indexes. The TTL index
+    deletes the keys ttl seconds after they were created (the TTL of existing indexes is not updated)"""
+    query_shapes = [
+        ("_id",),
+    ]
+    """Fields (equality first, then sort/range) of the queries performed by this repository"""
+
+    @staticmethod
+    async def reserve(key: str, fingerprint: str) -> Optional[dict]:
+        """Reserve a key for a request. Return None if reserved, or the existing document of the key.
+        Pending keys older than pending_timeout (e.g. their worker died) are taken over"""
+        now = datetime.now(timezone.utc)
+        try:
+            await async_idempotency.insert_one({"_id": key, "fingerprint": fingerprint, "created": now})
+            return None
+        except DuplicateKeyError:
+            pass
+
+        abandoned = {"_id": key, "result": {"$exists": False},
+                     "created": {"$lt": now - timedelta(seconds=settings.pending_timeout)}}
+        result = await async_idempotency.update_one(abandoned, {"$set": {"fingerprint": fingerprint, "created": now}})
+        if result.modified_count:
+            return None
+        document = await async_idempotency.find_one({"_id": key})
+        if document is None:
+            # expired or released meanwhile
+            return await IdempotencyRepository.reserve(key, fingerprint)
+        return document
+
+    @staticmethod
+    async def complete(key: str, result: dict):
+        await async_idempotency.update_one({"_id": key}, {"$set": {"result": result}})
+
+    @staticmethod
+    async def release(key: str):
+        await async_idempotency.delete_one({"_id": key, "result": {"$exists": False}})
+
+
+def _fingerprint(request: Request, body: bytes) -> str:
+    """Return the hash of a request (method, path, query and body), to detect keys reused by other requests"""
+    digest = hashlib.sha256(f"{request.method} {request.url.path}?{request.url.query}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _replay(document: dict, source: str) -> Response:
+    result = document["result"]
+    IDEMPOTENCY_REPLAYS.labels(source).inc()
+    response = Response(content=result["body"], status_code=result["status_code"], headers=result["headers"])
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+
+def _check_request(document: dict, fingerprint: str):
+    """Raise the errors of the keys used by another request, or whose request is still being processed"""
+    if document["fingerprint"] != fingerprint:
+        raise IdempotencyKeyReusedException()
+    if "result" not in document:
+        raise IdempotencyKeyInUseException()
+
+
+async def _process(request: Request, call_next, key: str, fingerprint: str, body: bytes) -> Response:
+    """Process a request with a reserved key, and store its result, unless it failed or is too large"""
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    try:
+        response = await call_next(Request(request.scope, receive=receive))
+        content = b"".join([chunk async for chunk in response.body_iterator])
+    except BaseException:
+        await IdempotencyRepository.release(key)
+        raise
+
+    if response.status_code >= 500 or len(content) > settings.max_response_size:
+        await IdempotencyRepository.release(key)
+    else:
+        headers = {name: value for name, value in response.headers.items() if name not in EXCLUDED_HEADERS}
+        result = {"status_code": response.status_code, "headers": headers, "body": content}
+        await IdempotencyRepository.complete(key, result)
+        results_cache.set(key, {"fingerprint": fingerprint, "result": result})
+    return Response(content=content, status_code=response.status_code, headers=dict(response.headers))
+
+
+async def idempotency_handler(request: Request, call_next):
+    """Middleware used to honor the Idempotency-Key header of the write requests: the first request with a key is
+    processed and its result stored; the later requests with the same key get the stored result.
+    Registered after the error handling middleware, so the error responses are stored too"""
+    key = request.headers.get(HEADER)
+    if key is None or not settings.enabled or request.method not in WRITE_METHODS:
+        return await call_next(request)
+
+    try:
+        if not 0 < len(key) <= MAX_KEY_LENGTH:
+            raise InvalidIdempotencyKeyException()
+        body = await request.body()
+        fingerprint = _fingerprint(request, body)
+
+        document = results_cache.get(key)
+        if document is not None:
+            _check_request(document, fingerprint)
+            return _replay(document, "memory")
+        document = await IdempotencyRepository.reserve(key, fingerprint)
+        if document is not None:
+            _check_request(document, fingerprint)
+            results_cache.set(key, document)
+            return _replay(document, "database")
+    except BaseAPIException as ex:
+        return ex.response()
+
+    return await _process(request, call_next, key, fingerprint, body)
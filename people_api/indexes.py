@@ -0,0 +1,178 @@
+"""INDEXES
+Creation of the indexes declared on the repositories, and report of the repository query shapes
+that have no supporting index on the database.
+Can be run as a command: python -m people_api.indexes [create|check|report]
+(check is a dry-run of create, that reports the duplicated documents that would make the unique indexes fail)
+"""
+
+# # Native # #
+import sys
+import logging
+import threading
+from typing import List, Tuple
+
+# # Installed # #
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+# # Package # #
+from .repositories import (ContactRepository, SymptomsRepository, SymptomsHistoryRepository, RollupsRepository,
+                           TombstonesRepository)
+from .idempotency import IdempotencyRepository
+
+__all__ = ("REPOSITORIES", "ensure_indexes", "ensure_indexes_in_background", "get_duplicates_report",
+           "get_index_report")
+
+REPOSITORIES = (ContactRepository, SymptomsRepository, SymptomsHistoryRepository, RollupsRepository,
+                TombstonesRepository, IdempotencyRepository)
+"""Repositories that declare indexes (attribute "indexes") and query shapes (attribute "query_shapes")"""
+INDEX_CONFLICT_ERRORS = {85, 86}
+"""Errors of an index built with the same keys as an existing one, when the server does not tell them apart
+(IndexOptionsConflict, IndexKeySpecsConflict)"""
+DUPLICATES_REPORT_LIMIT = 10
+"""Maximum number of duplicated key values reported per unique index"""
+
+logger = logging.getLogger(__name__)
+
+
+def _drop_replaced_indexes(repository):
+    """Drop the former indexes of a repository (attribute "dropped_indexes"), replaced by current indexes
+    with the same keys (e.g. the unique version of a former index). Only called once the current indexes are built"""
+    existing = repository.collection.index_information()
+    for name in getattr(repository, "dropped_indexes", []):
+        if name in existing:
+            repository.collection.drop_index(name)
+            logger.info("Index dropped on %s: %s", repository.collection.name, name)
+
+
+def _create_indexes(repository) -> List[str]:
+    """Create the indexes of a repository, and return their names. The current indexes are built while the former
+    ones with the same keys still exist, so the queries keep an index meanwhile: the server accepts it because
+    their definitions differ (the unique indexes are partial, the former ones are not). If the server rejects it
+    as a conflict, the former indexes are dropped first"""
+    try:
+        return repository.collection.create_indexes(repository.indexes)
+    except OperationFailure as ex:
+        if ex.code not in INDEX_CONFLICT_ERRORS or not getattr(repository, "dropped_indexes", None):
+            raise
+        logger.warning("Indexes conflicting with the former ones on %s (%s), dropping the former indexes first",
+                       repository.collection.name, ex)
+    _drop_replaced_indexes(repository)
+    return repository.collection.create_indexes(repository.indexes)
+
+
+def _missing_indexes(repository) -> List[dict]:
+    """Return the definitions (IndexModel documents) of the indexes of a repository that do not exist yet"""
+    existing = repository.collection.index_information()
+    return [index.document for index in repository.indexes if index.document["name"] not in existing]
+
+
+def _duplicates(repository, index: dict, limit: int = DUPLICATES_REPORT_LIMIT) -> List[Tuple[dict, int]]:
+    """Return the (key values, number of documents) of the documents of a repository that share the keys
+    of a unique index (definition), so the index can not be built"""
+    keys = list(index["key"])
+    pipeline = [
+        {"$match": index.get("partialFilterExpression", {})},
+        {"$group": {"_id": {key.replace(".", "_"): f"${key}" for key in keys}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]
+    return [(row["_id"], row["count"]) for row in repository.collection.aggregate(pipeline, allowDiskUse=True)]
+
+
+def get_duplicates_report() -> List[Tuple[str, str, dict, int]]:
+    """Return the (collection name, index name, key values, number of documents) of the duplicated documents
+    that would make the unique indexes not built yet fail (up to DUPLICATES_REPORT_LIMIT per index).
+    Nothing is created nor dropped, so it is a dry-run of ensure_indexes. The collections of the unique indexes
+    not built yet are scanned"""
+    report = list()
+    for repository in REPOSITORIES:
+        for index in _missing_indexes(repository):
+            if index.get("unique"):
+                report.extend((repository.collection.name, index["name"], key_values, count)
+                              for key_values, count in _duplicates(repository, index))
+    return report
+
+
+def ensure_indexes():
+    """Create the indexes declared on the repositories. Index creation is idempotent:
+    existing indexes with the same definition are left as they are.
+    Unique indexes can not be built while the collection has duplicated documents: then the duplicates are logged,
+    DuplicateKeyError is raised, and the former indexes they replace are kept"""
+    for repository in REPOSITORIES:
+        try:
+            names = _create_indexes(repository)
+        except DuplicateKeyError as ex:
+            logger.error("Unique indexes can not be built on %s, the collection has duplicated documents (%s). "
+                         "Former indexes kept: %s", repository.collection.name, ex,
+                         ", ".join(getattr(repository, "dropped_indexes", [])))
+            for collection_name, index_name, key_values, count in get_duplicates_report():
+                logger.error("Duplicated documents on %s for the index %s: %s (%d documents)",
+                             collection_name, index_name, key_values, count)
+            raise
+        logger.info("Indexes ensured on %s: %s", repository.collection.name, ", ".join(names))
+        _drop_replaced_indexes(repository)
+
+
+def _ensure_indexes_logging_errors():
+    try:
+        ensure_indexes()
+    except Exception:
+        logger.exception("Error creating the indexes")
+
+
+def ensure_indexes_in_background() -> threading.Thread:
+    """Run ensure_indexes on a daemon thread, so the caller (e.g. the API startup) is not blocked.
+    Errors are logged, not raised"""
+    thread = threading.Thread(target=_ensure_indexes_logging_errors, name="ensure-indexes", daemon=True)
+    thread.start()
+    return thread
+
+
+def _is_supported(shape: Tuple[str, ...], index_keys: List[str]) -> bool:
+    """Return if a query on the fields of the shape can be served by an index with the given keys,
+    which is when all the shape fields are a prefix of the index keys"""
+    return set(index_keys[:len(shape)]) == set(shape)
+
+
+def get_index_report() -> List[Tuple[str, Tuple[str, ...]]]:
+    """Return the (collection name, query shape) of the repository query shapes that are not supported
+    by any of the indexes that currently exist on the database"""
+    unsupported = list()
+    for repository in REPOSITORIES:
+        indexes = repository.collection.index_information().values()
+        indexes_keys = [[key for key, _ in index["key"]] for index in indexes]
+        for shape in repository.query_shapes:
+            # the _id index always exists, even if the collection does not exist yet
+            if shape == ("_id",):
+                continue
+            if not any(_is_supported(shape, index_keys) for index_keys in indexes_keys):
+                unsupported.append((repository.collection.name, shape))
+    return unsupported
+
+
+def main(command: str = "create"):
+    if command == "create":
+        logging.basicConfig(level=logging.INFO)
+        ensure_indexes()
+    elif command == "check":
+        duplicates = get_duplicates_report()
+        for collection_name, index_name, key_values, count in duplicates:
+            print(f"{collection_name}: {count} documents with the same {index_name} keys {key_values}")
+        if not duplicates:
+            print("The indexes can be created, no duplicated documents were found")
+        return 1 if duplicates else 0
+    elif command == "report":
+        unsupported = get_index_report()
+        for collection_name, shape in unsupported:
+            print(f"{collection_name}: no index supports queries on ({', '.join(shape)})")
+        if not unsupported:
+            print("All the repository queries are supported by an index")
+        return 1 if unsupported else 0
+    else:
+        print("Usage: python -m people_api.indexes [create|check|report]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,94 @@
+"""METRICS
+Prometheus metrics of the API requests (collected by the metrics middleware),
+the Mongo commands (collected by a pymongo command listener, registered on the Mongo clients)
+and the repository caches. Exposed on the /metrics endpoint, in Prometheus text format
+"""
+
+# # Native # #
+from typing import Iterator
+
+# # Installed # #
+from pymongo import monitoring
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# # Package # #
+from .cache import contacts_cache
+
+__all__ = ("REQUESTS", "REQUEST_DURATION", "REQUESTS_IN_PROGRESS", "MONGO_COMMAND_DURATION",
+           "EVENT_SUBSCRIBERS", "EVENTS_DROPPED", "MongoCommandListener", "mongo_command_listener", "CacheCollector",
+           "cache_collector", "generate_latest", "CONTENT_TYPE_LATEST")
+
+REQUESTS = Counter(
+    "people_api_requests_total", "Requests processed, by route and status code",
+    ["method", "route", "status"])
+REQUEST_DURATION = Histogram(
+    "people_api_request_duration_seconds", "Time spent processing requests, by route",
+    ["method", "route"])
+REQUESTS_IN_PROGRESS = Gauge(
+    "people_api_requests_in_progress", "Requests being processed (the route is not known until they are routed)",
+    ["method"])
+MONGO_COMMAND_DURATION = Histogram(
+    "people_api_mongo_command_duration_seconds", "Time spent on Mongo commands, by collection and operation",
+    ["collection", "operation", "status"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+
+EVENT_SUBSCRIBERS = Gauge(
+    "people_api_event_subscribers", "Subscribers connected to the events feed")
+EVENTS_DROPPED = Counter(
+    "people_api_events_dropped_total", "Events dropped because the queue of a subscriber was full")
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """pymongo command listener that observes the duration of each command on MONGO_COMMAND_DURATION.
+    The collection is only available on the started event, so it is kept until the command finishes"""
+
+    def __init__(self):
+        self._collections = dict()  # (connection_id, request_id): collection
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        # Most commands have the collection name as value of the command name key (e.g. {"find": "people"});
+        # getMore has the cursor id there, and the collection name on its own key
+        collection = event.command.get("collection", event.command.get(event.command_name))
+        self._collections[(event.connection_id, event.request_id)] = \
+            collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._observe(event, "success")
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._observe(event, "failure")
+
+    def _observe(self, event, status: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_DURATION.labels(collection, event.command_name, status).observe(event.duration_micros / 1e6)
+
+
+mongo_command_listener = MongoCommandListener()
+"""Listener to register on the Mongo clients (event_listeners)"""
+
+
+class CacheCollector:
+    """Prometheus collector that exposes the counters of the cache backends, labelled by cache name"""
+
+    def __init__(self, **caches):
+        self.caches = caches
+
+    def add(self, name: str, cache):
+        self.caches[name] = cache
+
+    def collect(self) -> Iterator:
+        hits = CounterMetricFamily("people_api_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("people_api_cache_misses", "Cache misses", labels=["cache"])
+        size = GaugeMetricFamily("people_api_cache_size", "Cached entries", labels=["cache"])
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            size.add_metric([name], stats["size"])
+        return iter((hits, misses, size))
+
+
+cache_collector = CacheCollector(contacts=contacts_cache)
+"""Collector of the caches counters. Other caches are added by the modules that define them"""
+REGISTRY.register(cache_collector)
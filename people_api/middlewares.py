@@ -2,20 +2,29 @@
 Functions that run as something gets processed
 """
 
+# # Native # #
+from time import perf_counter
+
 # # Installed # #
 from fastapi import Request
 
 # # Package # #
 from .exceptions import *
+from .metrics import REQUESTS, REQUEST_DURATION, REQUESTS_IN_PROGRESS
+from .profiling import Profile, should_profile
+from .settings import profiling_settings
 
-__all__ = ("request_handler",)
+__all__ = ("request_handler", "metrics_handler")
 
 
 async def request_handler(request: Request, call_next):
     """Middleware used to process each request on FastAPI, to provide error handling (convert exceptions to responses).
+    Requests can also be profiled (see profiling module), returning the profile id on the X-Profile-Id header.
     TODO: add logging and individual request traceability
     """
     try:
+        if profiling_settings.enabled and should_profile(request):
+            return await _profiled(request, call_next)
         return await call_next(request)
 
     except Exception as ex:
@@ -24,3 +33,40 @@ async def request_handler(request: Request, call_next):
 
         # Re-raising other exceptions will return internal error 500 to the client
         raise ex
+
+
+async def _profiled(request: Request, call_next):
+    """Process a request while profiling it. Streamed response bodies are not included on the profile"""
+    async with Profile(name=request.method) as profile:
+        try:
+            response = await call_next(request)
+        finally:
+            route = request.scope.get("route")
+            profile.name = f"{request.method} {getattr(route, 'path', 'unmatched')}"
+    response.headers["X-Profile-Id"] = profile.id
+    return response
+
+
+async def metrics_handler(request: Request, call_next):
+    """Middleware used to collect the requests metrics: count, duration and requests in progress.
+    Requests are labelled with their route template (e.g. /people/{contact_id}) instead of their path,
+    so the number of series is bounded; requests that match no route are labelled as "unmatched"
+    """
+    method = request.method
+    in_progress = REQUESTS_IN_PROGRESS.labels(method)
+    in_progress.inc()
+    start = perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+
+    finally:
+        elapsed = perf_counter() - start
+        in_progress.dec()
+        # The router sets the matched route on the request scope
+        route = request.scope.get("route")
+        route = getattr(route, "path", "unmatched")
+        REQUESTS.labels(method, route, status).inc()
+        REQUEST_DURATION.labels(method, route).observe(elapsed)
@@ -1,9 +1,17 @@
 from .person_update import *
 from .person_create import *
+from .person_upsert import *
 from .person_read import *
 from .person_address import *
 from .person_comorbidity import *
+from .comorbidity_update import *
+from .geo import *
 from .person_symptoms import *
 from .symptom_update import *
 from .symptom_create import *
 from .symptom_read import *
+from .person_filters import *
+from .batch import *
+from .symptom_checkin import *
+from .stats import *
+from .event import *
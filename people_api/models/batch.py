@@ -0,0 +1,57 @@
+"""MODELS - BATCH
+Responses of the batch endpoints, which process many items on a single request.
+Each item has its own result, so some items can fail without failing the whole batch
+"""
+
+# # Native # #
+from enum import Enum
+from typing import Optional, List
+
+# # Installed # #
+import pydantic
+from pydantic import Field
+
+# # Package # #
+from .common import BaseModel
+from .fields import ContactFields
+from .symptom_update import SymptomUpdate
+
+__all__ = ("BatchItemStatus", "ContactBatchItemResult", "ContactsBatchResult",
+           "SymptomBatchItem", "SymptomsBatchResult")
+
+
+class BatchItemStatus(str, Enum):
+    created = "created"
+    invalid = "invalid"
+    duplicate = "duplicate"
+    failed = "failed"
+
+
+class ContactBatchItemResult(pydantic.BaseModel):
+    """Result of a single person of a batch registration"""
+    index: int = Field(..., description="Position of the person on the request batch (0-based)")
+    status: BatchItemStatus = Field(..., description="Result of the person registration")
+    contact_id: Optional[str] = Field(None, description="Unique identifier of the person, if created")
+    errors: Optional[List[dict]] = Field(None, description="Validation or database errors, if not created")
+
+
+class ContactsBatchResult(pydantic.BaseModel):
+    """Body of the batch person registration responses"""
+    created: int = Field(..., description="Number of persons created")
+    invalid: int = Field(..., description="Number of persons not created because their data is not valid")
+    duplicates: int = Field(..., description="Number of persons not created because they already exist")
+    failed: int = Field(..., description="Number of persons not created because of other database errors")
+    items: List[ContactBatchItemResult]
+
+
+class SymptomBatchItem(BaseModel):
+    """A single check-in of a batch symptom registration"""
+    contact_id: str = ContactFields.person_id
+    symptom: SymptomUpdate
+
+
+class SymptomsBatchResult(pydantic.BaseModel):
+    """Body of the batch symptom registration responses"""
+    added: int = Field(..., description="Number of symptoms added")
+    not_found: List[str] = Field(..., description="Unique identifiers of the persons that do not exist, "
+                                                  "whose symptoms were not added")
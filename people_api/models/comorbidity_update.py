@@ -0,0 +1,33 @@
+"""MODELS - PERSON COMORBIDITY - UPDATE
+Comorbidity Update model, for Person PATCH requests. All attributes are set as Optional,
+as only the questions to change are sent
+"""
+
+# # Native # #
+from typing import Optional
+
+# # Package # #
+from .common import BaseModel
+from .fields import ComorbidityFields
+
+__all__ = ("ComorbidityUpdate", )
+
+
+class ComorbidityUpdate(BaseModel):
+    """The comorbidity information of a person, on update"""
+    q1: Optional[bool] = ComorbidityFields.q1
+    q2: Optional[bool] = ComorbidityFields.q2
+    q3: Optional[bool] = ComorbidityFields.q3
+    q4: Optional[bool] = ComorbidityFields.q4
+    q5: Optional[bool] = ComorbidityFields.q5
+    q6: Optional[bool] = ComorbidityFields.q6
+    q7: Optional[bool] = ComorbidityFields.q7
+    q8: Optional[bool] = ComorbidityFields.q8
+    q9: Optional[bool] = ComorbidityFields.q9
+    q10: Optional[bool] = ComorbidityFields.q10
+    q11: Optional[bool] = ComorbidityFields.q11
+    q12: Optional[bool] = ComorbidityFields.q12
+    q13: Optional[bool] = ComorbidityFields.q13
+    q14: Optional[bool] = ComorbidityFields.q14
+    q15: Optional[bool] = ComorbidityFields.q15
+    q16: Optional[bool] = ComorbidityFields.q16
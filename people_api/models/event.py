@@ -0,0 +1,30 @@
+"""MODELS - EVENT
+Events of the real-time feed (new suspicious cases and alarm signals)
+"""
+
+# # Native # #
+from enum import Enum
+from typing import Optional, List
+
+# # Installed # #
+import pydantic
+from pydantic import Field
+
+__all__ = ("EventType", "CaseEvent")
+
+
+class EventType(str, Enum):
+    suspicious_case = "suspicious_case"
+    """A symptom check-in flagged as suspicious case"""
+    alarm_signal = "alarm_signal"
+    """An alarm signal with some positive sign"""
+
+
+class CaseEvent(pydantic.BaseModel):
+    """An event of the real-time feed"""
+    type: EventType = Field(..., description="Type of event")
+    contact_id: str = Field(..., description="Person of the event")
+    time: int = Field(..., description="Time of the check-in or alarm signal, as Unix timestamp")
+    department: Optional[str] = Field(None, description="Department code of the person, if known")
+    alarm_signals: Optional[List[str]] = Field(None, description="Positive signs of an alarm signal (q1..q5)",
+                                               example=["q1", "q3"])
@@ -153,6 +153,7 @@ class SymptomFields:
     is_suspicious = Field(description="¿Es sospechoso?", example=True)
     latitude = Field(description="Latitud", example="12.123123", **_string)
     longitude = Field(description="Longitud", example="12.123123", **_string)
+    location = Field(description="Ubicación (GeoJSON), calculada de la latitud y longitud al registrar")
     alarm_signal = Field(description="Signos de alarma", **_string)
     created_at = Field(
         alias="created",
@@ -0,0 +1,35 @@
+"""MODELS - GEO
+GeoJSON geometries, stored along the entities to support geospatial queries
+"""
+
+# # Native # #
+from typing import List, Dict
+
+# # Installed # #
+import pydantic
+from pydantic import Field
+
+__all__ = ("GeoPoint", "HeatmapTile")
+
+
+class GeoPoint(pydantic.BaseModel):
+    """GeoJSON point. Coordinates are longitude, latitude (in this order)"""
+    type: str = Field("Point", description="GeoJSON type (always Point)")
+    coordinates: List[float] = Field(..., description="Longitude and latitude", example=[-77.042793, -12.046374])
+
+    @pydantic.validator("coordinates")
+    def _valid_coordinates(cls, coordinates):
+        """Points out of range would be rejected by the 2dsphere indexes"""
+        if len(coordinates) != 2 or not (-180 <= coordinates[0] <= 180 and -90 <= coordinates[1] <= 90):
+            raise ValueError("Coordinates must be a valid longitude and latitude")
+        return coordinates
+
+
+class HeatmapTile(pydantic.BaseModel):
+    """Counts of the suspicious check-ins located on each cell of a tile (geohash), precomputed on writes"""
+    tile: str = Field(..., description="Geohash of the tile", example="6mc")
+    precision: int = Field(..., description="Geohash length of the cells", example=5)
+    total: int = Field(0, description="Suspicious check-ins located on the tile")
+    cells: Dict[str, int] = Field(dict(), description="Suspicious check-ins located on each cell (geohash) "
+                                                      "of the tile. Cells without check-ins are not included")
+    version: int = Field(0, description="Number of updates of the tile (used as ETag)")
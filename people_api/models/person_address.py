@@ -11,7 +11,7 @@ from .department import Department
 from .province import Province
 from .district import District
 
-__all__ = ("Address", )
+__all__ = ("Address", "AddressUpdate")
 
 
 class Address(BaseModel):
@@ -20,3 +20,11 @@ class Address(BaseModel):
     province: Optional[Province]
     district: Optional[District]
     street: str = AddressFields.street
+
+
+class AddressUpdate(BaseModel):
+    """The address information of a person, on update (all the attributes are Optional)"""
+    department: Optional[Department]
+    province: Optional[Province]
+    district: Optional[District]
+    street: Optional[str] = AddressFields.street
@@ -6,6 +6,8 @@ from typing import Optional, List
 # # Package # #
 from .person_update import ContactUpdate
 from .person_address import Address
+from .person_comorbidity import Comorbidity
+from .person_symptoms import Symptoms
 from .fields import ContactFields, ComorbidityFields, AddressFields
 
 __all__ = ("ContactCreate", )
@@ -19,4 +21,7 @@ class ContactCreate(ContactUpdate):
     alternative_cellphone_number: str = ContactFields.alternative_cellphone_number
     doc_type: str = ContactFields.doc_type
     doc_number: str = ContactFields.doc_number
+    address: Optional[Address]
+    comorbidity: Optional[Comorbidity]
+    symptoms: Optional[List[Symptoms]]
     # Birth remains Optional, so is not required to re-declare
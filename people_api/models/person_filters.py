@@ -0,0 +1,38 @@
+"""MODELS - PERSON - FILTERS
+Person list filters. Each attribute is an optional query parameter of the list endpoint,
+and maps to an indexed field of the Mongo documents
+"""
+
+# # Native # #
+from typing import Optional
+
+# # Installed # #
+import pydantic
+from pydantic import Field
+
+__all__ = ("ContactFilters", )
+
+
+class ContactFilters(pydantic.BaseModel):
+    """Query parameters used to filter the persons on list requests.
+    Inherits from pydantic BaseModel (instead of models.common.BaseModel) because no filters are required"""
+    doc_type: Optional[str] = Field(None, description="Filter by document type")
+    doc_number: Optional[str] = Field(None, description="Filter by document number")
+    imei: Optional[str] = Field(None, description="Filter by IMEI")
+    parent_contact_id: Optional[str] = Field(None, description="Filter by parent person unique ID")
+    updated_from: Optional[int] = Field(
+        None, description="Filter persons updated at or after this Unix timestamp")
+    updated_to: Optional[int] = Field(
+        None, description="Filter persons updated at or before this Unix timestamp")
+
+    def query(self) -> dict:
+        """Return the Mongo query (filter) document for these filters"""
+        query = self.dict(exclude_none=True, exclude={"updated_from", "updated_to"})
+        updated = dict()
+        if self.updated_from is not None:
+            updated["$gte"] = self.updated_from
+        if self.updated_to is not None:
+            updated["$lte"] = self.updated_to
+        if updated:
+            query["updated"] = updated
+        return query
@@ -4,7 +4,7 @@ Person Read model. Inherits from PersonCreate and adds the person_id field, whic
 
 # # Native # #
 from datetime import date, datetime
-from typing import Optional, List
+from typing import Optional, List, NamedTuple
 from people_api.models.alarm_signal_update import AlarmSignal
 
 # # Installed # #
@@ -17,10 +17,24 @@ from .person_update import ContactUpdate
 from .fields import ContactFields
 from .person_address import Address
 from .person_comorbidity import Comorbidity
-from .person_symptoms import Symptoms
+from .symptom_checkin import SymptomCheckin
 from .person_eess import Eess
 
-__all__ = ("ContactRead", "ContactsRead")
+__all__ = ("ContactRead", "ContactsRead", "ContactsPage", "ContactPartialRead", "ContactVersion", "ContactChanges",
+           "get_age")
+
+
+def get_age(birth: date) -> int:
+    """Calculate the current age of a person from the date of birth"""
+    return relativedelta(datetime.now().date(), birth).years
+
+
+class ContactVersion(NamedTuple):
+    """Id, write counter (version field, incremented on every write) and last write time (updated field)
+    of a person, which identify the version of its representation"""
+    contact_id: str
+    version: Optional[int]
+    updated: Optional[int]
 
 
 class ContactRead(ContactUpdate):
@@ -39,9 +53,16 @@ class ContactRead(ContactUpdate):
     cellphone_number: Optional[str] = ContactFields.cellphone_number
     address: Optional[Address]
     comorbidity: Optional[Comorbidity]
-    symptoms: Optional[List[Symptoms]]
+    symptoms: Optional[List[SymptomCheckin]]
+    latest_symptom: Optional[SymptomCheckin]  # copy of the last symptoms item, stored on write
     # eess: Optional[Eess]
     # alarm_signal: Optional[AlarmSignal]
+    _version: Optional[int] = pydantic.PrivateAttr(None)  # version field of the document, not returned
+    _updated: Optional[int] = pydantic.PrivateAttr(None)  # updated field of the document, not returned
+
+    @property
+    def version(self) -> ContactVersion:
+        return ContactVersion(self.contact_id, self._version, self._updated)
 
     @pydantic.root_validator(pre=True)
     def _set_contact_id(cls, data):
@@ -57,8 +78,7 @@ class ContactRead(ContactUpdate):
         """Calculate the current age of the person from the date of birth, if any"""
         birth = data.get("birth")
         if birth:
-            today = datetime.now().date()
-            data["age"] = relativedelta(today, birth).years
+            data["age"] = get_age(birth)
         return data
 
     class Config(ContactCreate.Config):
@@ -66,3 +86,29 @@ class ContactRead(ContactUpdate):
 
 
 ContactsRead = List[ContactRead]
+
+
+class ContactPartialRead(ContactRead):
+    """Body of Person GET responses when only some fields are requested (?fields=...).
+    Only the requested fields are fetched from the database, validated and returned"""
+    pass
+
+
+class ContactsPage(pydantic.BaseModel):
+    """A page of persons, returned by the repositories on list"""
+    items: List[ContactRead]
+    next_cursor: Optional[str] = pydantic.Field(
+        None, description="Cursor to request the next page, if there are more persons")
+
+
+class ContactChanges(pydantic.BaseModel):
+    """Body of the person changes (incremental sync) responses: a page of the persons changed and deleted
+    since a checkpoint"""
+    items: List[ContactRead] = pydantic.Field(
+        ..., description="Persons created or updated since the checkpoint, oldest change first")
+    deleted: List[str] = pydantic.Field(
+        ..., description="Unique identifiers of the persons deleted since the checkpoint")
+    checkpoint: int = pydantic.Field(
+        ..., description="Checkpoint to request the next changes (since), once all the pages are read")
+    next_cursor: Optional[str] = pydantic.Field(
+        None, description="Cursor to request the next page, if there are more changes")
@@ -13,13 +13,14 @@ from people_api.models.alarm_signal_update import AlarmSignal
 
 # # Package # #
 from .common import BaseModel
+from .geo import GeoPoint
 from .fields import SymptomFields
 
-__all__ = ("Symptoms", )
+__all__ = ("SymptomsBase", "Symptoms")
 
 
-class Symptoms(BaseModel):
-    """The symptoms information of a person"""
+class SymptomsBase(BaseModel):
+    """The answers of a symptoms questionnaire, common to the symptoms of a person and its check-ins"""
     q1: bool = SymptomFields.q1
     q2: bool = SymptomFields.q2
     q3: bool = SymptomFields.q3
@@ -32,10 +33,15 @@ class Symptoms(BaseModel):
     q10: Optional[str] = SymptomFields.q10
     is_suspicious: bool = SymptomFields.is_suspicious
     created: Optional[date] = SymptomFields.created_at
-    updated: Optional[date] = SymptomFields.updated_at
     alarm_signal: Optional[AlarmSignal]
     latitude: Optional[str] = SymptomFields.latitude
     longitude: Optional[str] = SymptomFields.longitude
+    location: Optional[GeoPoint] = SymptomFields.location
+
+
+class Symptoms(SymptomsBase):
+    """The symptoms information of a person"""
+    updated: Optional[date] = SymptomFields.updated_at
 
     @pydantic.root_validator()
     def _set_age(cls, data):
@@ -13,9 +13,8 @@ from people_api.models.alarm_signal_update import AlarmSignal
 # # Package # #
 from .common import BaseModel
 from .fields import ContactFields, AddressFields, ComorbidityFields, SymptomFields
-from .person_address import Address
-from .person_comorbidity import Comorbidity
-from .person_symptoms import Symptoms
+from .person_address import AddressUpdate
+from .comorbidity_update import ComorbidityUpdate
 from .person_eess import Eess
 
 __all__ = ("ContactUpdate", )
@@ -35,9 +34,8 @@ class ContactUpdate(BaseModel):
     alternative_cellphone_number: Optional[
         str] = ContactFields.alternative_cellphone_number
     cellphone_number: Optional[str] = ContactFields.cellphone_number
-    address: Optional[Address]
-    comorbidity: Optional[Comorbidity]
-    symptoms: Optional[List[Symptoms]]
+    address: Optional[AddressUpdate]
+    comorbidity: Optional[ComorbidityUpdate]
 
     # eess: Optional[Eess]
 
@@ -0,0 +1,28 @@
+"""MODELS - PERSON - UPSERT
+Person Upsert models, for the idempotent registration of persons by their document
+"""
+
+# # Native # #
+from typing import Optional
+
+# # Installed # #
+import pydantic
+from pydantic import Field
+
+# # Package # #
+from .person_create import ContactCreate
+from .fields import ContactFields
+
+__all__ = ("ContactUpsert", "ContactUpsertResult")
+
+
+class ContactUpsert(ContactCreate):
+    """Body of Person PUT (by document) requests. The document type and number are given on the path"""
+    doc_type: Optional[str] = ContactFields.doc_type
+    doc_number: Optional[str] = ContactFields.doc_number
+
+
+class ContactUpsertResult(pydantic.BaseModel):
+    """Body of Person PUT (by document) responses"""
+    contact_id: str = ContactFields.person_id
+    created: bool = Field(..., description="True if the person was created, False if an existing person was updated")
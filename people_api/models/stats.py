@@ -0,0 +1,68 @@
+"""MODELS - STATS
+Summaries returned by the stats endpoints, computed with aggregation pipelines
+"""
+
+# # Native # #
+from enum import Enum
+from typing import Optional, Dict
+
+# # Installed # #
+import pydantic
+from pydantic import Field
+
+__all__ = ("StatsDimension", "StatsGroup", "SymptomsStats", "AlarmSignalsStats", "ComorbiditiesStats", "Rollup")
+
+
+class StatsDimension(str, Enum):
+    """Dimensions the stats can be grouped by. Regions are grouped by their code"""
+    day = "day"
+    department = "department"
+    province = "province"
+    district = "district"
+
+
+class StatsGroup(pydantic.BaseModel):
+    """Values of the dimensions of a stats group. Only the requested dimensions are set"""
+    day: Optional[str] = Field(None, description="Day (UTC), in format YYYY-MM-DD", example="2021-10-04")
+    department: Optional[str] = Field(None, description="Department code")
+    province: Optional[str] = Field(None, description="Province code")
+    district: Optional[str] = Field(None, description="District code")
+
+
+class SymptomsStats(pydantic.BaseModel):
+    """Symptom check-ins summary of a group"""
+    group: StatsGroup
+    checkins: int = Field(..., description="Number of symptom check-ins")
+    suspicious: int = Field(..., description="Number of check-ins flagged as suspicious case")
+
+
+class AlarmSignalsStats(pydantic.BaseModel):
+    """Alarm signal reports summary of a group"""
+    group: StatsGroup
+    reports: int = Field(..., description="Number of alarm signals reported")
+    alarm_signals: Dict[str, int] = Field(
+        ..., description="Number of reports with each alarm signal question (q1..q6) answered positive")
+
+
+class ComorbiditiesStats(pydantic.BaseModel):
+    """Comorbidity prevalence summary of a group"""
+    group: StatsGroup
+    persons: int = Field(..., description="Number of persons")
+    with_comorbidity: int = Field(..., description="Number of persons with comorbidity information")
+    comorbidities: Dict[str, int] = Field(
+        ..., description="Number of persons with each comorbidity question (q1..q16) answered positive")
+
+
+class Rollup(pydantic.BaseModel):
+    """Counters of a day and department, incremented on each write (registrations, check-ins and alarm signals).
+    Counters of questions only include the positive answers"""
+    day: str = Field(..., description="Day (UTC), in format YYYY-MM-DD", example="2021-10-04")
+    department: Optional[str] = Field(None, description="Department code, or null for all the departments")
+    registrations: int = Field(0, description="Number of persons registered")
+    with_comorbidity: int = Field(0, description="Number of persons registered with comorbidity information")
+    comorbidities: Dict[str, int] = Field(dict(), description="Registered persons with each comorbidity (q1..q16)")
+    checkins: int = Field(0, description="Number of symptom check-ins")
+    suspicious: int = Field(0, description="Number of check-ins flagged as suspicious case")
+    symptoms: Dict[str, int] = Field(dict(), description="Check-ins with each symptom (q1..q9)")
+    alarm_signal_reports: int = Field(0, description="Number of alarm signals reported")
+    alarm_signals: Dict[str, int] = Field(dict(), description="Alarm signals with each question (q1..q6) positive")
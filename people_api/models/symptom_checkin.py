@@ -0,0 +1,38 @@
+"""MODELS - SYMPTOM CHECK-IN
+Symptom check-ins of a person history, returned by the person symptoms and geospatial endpoints
+"""
+
+# # Native # #
+from typing import Optional, List
+
+# # Installed # #
+import pydantic
+from pydantic import Field
+
+# # Package # #
+from .person_symptoms import SymptomsBase
+from ..utils import parse_timestamp
+
+__all__ = ("SymptomCheckin", "SymptomCheckinsPage", "GeoCheckin")
+
+
+class SymptomCheckin(SymptomsBase):
+    """A symptom check-in, as stored. Unlike Symptoms, the updated field keeps the time of the check-in"""
+    updated: Optional[int] = Field(None, description="Time of the check-in, as Unix timestamp")
+
+    @pydantic.validator("updated", pre=True)
+    def _parse_updated(cls, value):
+        """The check-ins of the persons registered with symptoms store their time as ISO date string"""
+        return parse_timestamp(value) if isinstance(value, str) else value
+
+
+class SymptomCheckinsPage(pydantic.BaseModel):
+    """A page of the symptom check-ins of a person, newest first, returned by the repositories"""
+    items: List[SymptomCheckin]
+    next_cursor: Optional[str] = Field(
+        None, description="Cursor to request the next (older) page, if there are more check-ins")
+
+
+class GeoCheckin(SymptomCheckin):
+    """A symptom check-in found by location, with the person it belongs to"""
+    contact_id: str = Field(..., description="Person of the check-in")
@@ -0,0 +1,139 @@
+"""PROFILING
+On-demand profiling of single requests. While a request is profiled, a sampler thread takes the call stacks
+of the threads working on it (the event loop thread, plus the threadpool threads running its repository calls)
+every few milliseconds. The samples are stored as a "folded stacks" file (one line per distinct stack,
+with its sample count), which flamegraph.pl, speedscope or inferno can render as a flamegraph.
+The event loop thread is shared by all the requests, so its samples include anything else it runs meanwhile
+(e.g. other concurrent requests): profiles are only meaningful for requests sent in isolation.
+Profiling is opt-in (PROFILING_* settings), and nothing of this module runs on requests that are not profiled
+"""
+
+# # Native # #
+import os
+import sys
+import random
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional, Callable
+
+# # Installed # #
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+
+# # Package # #
+from .exceptions import ProfileNotFoundException
+from .settings import profiling_settings as settings
+from .utils import get_uuid
+
+__all__ = ("Profile", "current_profile", "should_profile", "is_allowed_host", "get_profile_path")
+
+FOLDED_EXTENSION = ".folded"
+
+current_profile: ContextVar[Optional["Profile"]] = ContextVar("current_profile", default=None)
+"""Profile of the request being processed, if profiled"""
+
+
+class Profile:
+    """Sampling profiler of a single request. Use as context manager, around the request processing:
+    from the event loop, as async context manager, so the profile is saved without blocking the loop.
+    Only meaningful for isolated requests, as the whole event loop thread is sampled"""
+
+    def __init__(self, name: str, interval: float = settings.interval):
+        self.id = get_uuid()
+        self.name = name
+        self.interval = interval
+        self.samples = Counter()  # folded stack: count
+        self._threads = {threading.get_ident()}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name=f"profile-{self.id}", daemon=True)
+
+    def __enter__(self) -> "Profile":
+        self._token = current_profile.set(self)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        current_profile.reset(self._token)
+        self._finish()
+
+    async def __aenter__(self) -> "Profile":
+        return self.__enter__()
+
+    async def __aexit__(self, *args):
+        self._stop.set()
+        current_profile.reset(self._token)
+        await run_in_threadpool(self._finish)
+
+    def _finish(self):
+        """Wait for the sampler to stop (it may be taking a sample) and save the profile"""
+        self._sampler.join()
+        self.save()
+
+    def run(self, function: Callable, *args, **kwargs):
+        """Run a function (from a threadpool thread) sampling the current thread as part of the profile"""
+        thread_id = threading.get_ident()
+        self._threads.add(thread_id)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self._threads.discard(thread_id)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in tuple(self._threads):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.samples[_fold(frame)] += 1
+
+    def folded(self) -> str:
+        """Return the samples in folded stacks format"""
+        return "".join(f"{self.name};{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def save(self):
+        """Write the profile to the profiles directory, and delete the oldest profiles over the limit"""
+        os.makedirs(settings.directory, exist_ok=True)
+        with open(os.path.join(settings.directory, self.id + FOLDED_EXTENSION), "w") as file:
+            file.write(self.folded())
+        _delete_old_profiles()
+
+
+def _fold(frame) -> str:
+    """Return the call stack of a frame, from the outermost call, as semicolon-separated functions"""
+    stack = list()
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def _delete_old_profiles():
+    paths = [entry.path for entry in os.scandir(settings.directory) if entry.name.endswith(FOLDED_EXTENSION)]
+    if len(paths) > settings.keep:
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - settings.keep]:
+            os.remove(path)
+
+
+def is_allowed_host(request: Request) -> bool:
+    """Return True if the client of the request is allowed to ask for profiles"""
+    return request.client is not None and request.client.host in settings.allowed_hosts
+
+
+def should_profile(request: Request) -> bool:
+    """Return True if the request must be profiled: asked by an allowed client, or sampled.
+    Must only be called when profiling is enabled"""
+    if request.headers.get(settings.header) and is_allowed_host(request):
+        return True
+    return settings.sample_rate > 0 and random.random() < settings.sample_rate
+
+
+def get_profile_path(profile_id: str) -> str:
+    """Return the path of a stored profile, given its id"""
+    path = os.path.join(settings.directory, os.path.basename(profile_id) + FOLDED_EXTENSION)
+    if not os.path.isfile(path):
+        raise ProfileNotFoundException(identifier=profile_id)
+    return path
@@ -0,0 +1,815 @@
+"""QUERIES
+Builders of the queries, aggregation pipelines and write operations of the repositories, and of the results read.
+They do not access the database, so they are shared by the sync and async repositories
+"""
+
+# # Native # #
+from datetime import date, datetime, timezone
+from collections import Counter, defaultdict
+from typing import Optional, List, Dict, Tuple
+
+# # Installed # #
+import pydantic
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+# # Package # #
+from people_api.models.alarm_signal_create import AlarmSignalCreate
+from .models import *
+from .exceptions import *
+from .events import event_bus
+from .settings import api_settings, mongo_settings
+from .utils import get_time, parse_timestamp, get_uuid, encode_cursor, decode_cursor, encode_geohash, GEOHASH_ALPHABET
+
+__all__ = (
+    "CONTACTS_SORT",
+    "VERSION_PROJECTION",
+    "VERSION_INCREMENT",
+    "TOMBSTONES_SORT",
+    "DUPLICATE_KEY_ERROR",
+    "REGION_FIELDS",
+    "ALARM_SIGNAL_QUESTIONS",
+    "COMORBIDITY_QUESTIONS",
+    "EARTH_RADIUS_KM",
+    "SYMPTOM_QUESTIONS",
+    "ROLLUP_PROJECTION",
+    "RollupEvent",
+    "HEATMAP_CELLS_DEPTH",
+    "contacts_page_query",
+    "contact_read",
+    "contact_version",
+    "contacts_page",
+    "changes_position",
+    "changes_window",
+    "changes_query",
+    "changes_page",
+    "contact_changes",
+    "contact_projection",
+    "dotted_fields",
+    "patch_pipeline",
+    "upsert_operation",
+    "duplicate_key",
+    "contacts_batch_documents",
+    "contacts_batch_result",
+    "utc_day",
+    "geo_point",
+    "symptom_document",
+    "add_symptom_operation",
+    "alarm_signal_document",
+    "add_alarm_signal_operation",
+    "symptoms_batch_checkins",
+    "symptoms_batch_operations",
+    "symptoms_history_operations",
+    "to_timestamp",
+    "checkins_cursor_range",
+    "checkins_pipeline",
+    "checkins_days",
+    "bucket_checkins",
+    "checkins_page",
+    "is_true",
+    "day_expression",
+    "stats_group_id",
+    "regions_query",
+    "symptoms_stats_pipeline",
+    "symptoms_stats",
+    "alarm_signals_stats_pipeline",
+    "alarm_signals_stats",
+    "comorbidities_stats_pipeline",
+    "comorbidities_stats",
+    "circle_area",
+    "box_area",
+    "geo_checkins_pipeline",
+    "is_positive",
+    "department_code",
+    "registration_counters",
+    "alarm_signal_counters",
+    "checkin_counters",
+    "rollup_increments",
+    "rollup_id",
+    "rollup_operations",
+    "department_projection",
+    "inserted_documents",
+    "heatmap_increments",
+    "heatmap_operations",
+    "heatmap_tile",
+    "validate_tile",
+    "ndjson_chunk",
+)
+
+
+CONTACTS_SORT = [("updated", ASCENDING), ("_id", ASCENDING)]
+"""Sort used for paginating persons. Pages are keyset-based on (updated, _id), so they are stable under inserts"""
+
+
+def contacts_page_query(filters: Optional[ContactFilters], cursor: Optional[str]) -> dict:
+    """Return the Mongo query to find the persons of a page, given the filters and the cursor of the previous page"""
+    query = filters.query() if filters else dict()
+    if cursor:
+        try:
+            updated, contact_id = decode_cursor(cursor)
+        except (ValueError, TypeError):
+            raise InvalidCursorException()
+        query["$or"] = [
+            {"updated": {"$gt": updated}},
+            {"updated": updated, "_id": {"$gt": contact_id}},
+        ]
+    return query
+
+
+def contact_read(document: dict) -> ContactRead:
+    """Build the ContactRead of a whole person document.
+    With trusted reads, the object is built without validation (ContactRead.construct), and the values
+    (including nested objects) are kept as stored, which are JSON-ready"""
+    if not api_settings.trusted_reads:
+        contact = ContactRead(**document)
+    else:
+        values = {name: document[name] for name in ContactRead.__fields__ if name in document}
+        values["contact_id"] = document["_id"]
+        birth = values.get("birth")
+        if birth:
+            values["age"] = get_age(date.fromisoformat(birth))
+        contact = ContactRead.construct(**values)
+    contact._version = document.get("version")
+    contact._updated = document.get("updated")
+    return contact
+
+
+VERSION_PROJECTION = {"version": 1, "updated": 1}
+"""Fields of a person fetched to know its version (conditional requests)"""
+VERSION_INCREMENT = {"version": 1}
+"""Increment ($inc) of the version of a person, done by every write: unlike the updated time (seconds),
+it changes on each write, even if many are done within the same second"""
+
+
+def contact_version(document: Optional[dict], identifier: str) -> ContactVersion:
+    if not document:
+        raise ContactNotFoundException(identifier)
+    return ContactVersion(document["_id"], document.get("version"), document.get("updated"))
+
+
+def contacts_page(documents: List[dict], limit: int, projection: Optional[dict] = None) -> ContactsPage:
+    """Build the page of persons from the documents found, which must be fetched with a limit of limit+1:
+    the extra document (if any) tells that there is a next page"""
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_cursor = encode_cursor(last.get("updated"), last["_id"])
+    if projection:
+        items = [ContactPartialRead(**document) for document in documents]
+    else:
+        items = [contact_read(document) for document in documents]
+    # The page is not validated, as the items are (unless trusted reads are enabled, when they must not be)
+    return ContactsPage.construct(items=items, next_cursor=next_cursor)
+
+
+TOMBSTONES_SORT = [("deleted", ASCENDING), ("_id", ASCENDING)]
+"""Sort used for paginating the deleted persons (tombstones) on the changes, keyset-based like CONTACTS_SORT"""
+
+
+def changes_position(position) -> Optional[list]:
+    """Return a (time, id) position of a changes cursor, validated: None, empty, or a list of both values.
+    Raises ValueError if not valid"""
+    if position is None or position == []:
+        return position
+    if not isinstance(position, list) or len(position) != 2:
+        raise ValueError("Invalid changes position")
+    time, identifier = position
+    if not isinstance(time, int) or isinstance(time, bool) or not isinstance(identifier, str):
+        raise ValueError("Invalid changes position")
+    return position
+
+
+def changes_window(since: int, cursor: Optional[str]) -> Tuple[int, int, Optional[list], Optional[list]]:
+    """Return the (since, until, persons position, tombstones position) of a page of changes.
+    The changes are read on (since, until], with until fixed on the first page to the previous second, as the
+    changes of the current second may not be written yet (times have seconds precision). The positions are the
+    (time, id) of the last change returned of each kind: None to start from since, or empty once all were returned"""
+    if not cursor:
+        return since, max(since, get_time() - 1), None, None
+    try:
+        since, until, persons_after, tombstones_after = decode_cursor(cursor)
+        return int(since), int(until), changes_position(persons_after), changes_position(tombstones_after)
+    except (ValueError, TypeError):
+        raise InvalidCursorException()
+
+
+def changes_query(field: str, since: int, until: int, after: Optional[list]) -> dict:
+    """Return the query of the changes (persons by updated, or tombstones by deleted) of a window,
+    after the given position"""
+    query = {field: {"$gt": since, "$lte": until}}
+    if after:
+        time, identifier = after
+        query["$or"] = [{field: {"$gt": time}}, {field: time, "_id": {"$gt": identifier}}]
+    return query
+
+
+def changes_page(documents: List[dict], field: str, limit: int) -> Tuple[List[dict], list]:
+    """Return the documents of a page of changes (fetched with a limit of limit+1), and the position after them
+    (empty if there are no more)"""
+    if len(documents) > limit:
+        documents = documents[:limit]
+        return documents, [documents[-1][field], documents[-1]["_id"]]
+    return documents, []
+
+
+def contact_changes(persons: List[dict], deleted: List[dict], since: int, until: int,
+                     persons_after: list, tombstones_after: list) -> ContactChanges:
+    next_cursor = None
+    if persons_after or tombstones_after:
+        next_cursor = encode_cursor(since, until, persons_after, tombstones_after)
+    # Not validated, as the items are (unless trusted reads are enabled, when they must not be)
+    return ContactChanges.construct(items=[contact_read(document) for document in persons],
+                                    deleted=[document["_id"] for document in deleted],
+                                    checkpoint=until, next_cursor=next_cursor)
+
+
+def contact_projection(fields: Optional[str]) -> Optional[dict]:
+    """Return the Mongo projection that fetches only the given comma-separated ContactPartialRead fields,
+    or None to fetch the whole documents if no fields are given.
+    The _id (contact_id) is always returned"""
+    if not fields:
+        return None
+
+    names = {name.strip() for name in fields.split(",")} - {""}
+    unknown = names - set(ContactPartialRead.__fields__)
+    if unknown:
+        raise InvalidFieldsException(message=f"{InvalidFieldsException.message}: {', '.join(sorted(unknown))}")
+
+    projection = {name: 1 for name in names - {"contact_id", "latest_symptom"}}
+    if "latest_symptom" in names:
+        # Persons with symptoms added before latest_symptom was stored only have the symptoms list
+        projection["latest_symptom"] = {"$ifNull": ["$latest_symptom", {"$arrayElemAt": ["$symptoms", -1]}]}
+    return projection or {"_id": 1}
+
+
+DUPLICATE_KEY_ERROR = 11000
+"""Mongo error code for writes that violate a unique index"""
+
+
+def dotted_fields(document: dict, prefix: str = "") -> dict:
+    """Flatten a (partial) document into its leaf fields, as {dotted path: value}. Lists are leaves (set whole)"""
+    fields = dict()
+    for name, value in document.items():
+        if isinstance(value, dict) and value:
+            fields.update(dotted_fields(value, f"{prefix}{name}."))
+        else:
+            fields[f"{prefix}{name}"] = value
+    return fields
+
+
+def patch_pipeline(update: ContactUpdate) -> List[dict]:
+    """Return the update pipeline of a person PATCH, which sets only the leaf fields sent (by their dotted path),
+    and the updated time and version only if some of them changes. Unchanged persons are not modified
+    (nor logged on the oplog). The values are literals, so strings starting with $ are not taken as field paths"""
+    fields = dotted_fields(update.dict(exclude_unset=True))
+    changed = {"$or": [{"$ne": [f"${path}", {"$literal": value}]} for path, value in fields.items()]}
+    stage = {"updated": {"$cond": [changed, get_time(), "$updated"]},
+             "version": {"$cond": [changed, {"$add": [{"$ifNull": ["$version", 0]}, 1]}, "$version"]}}
+    stage.update({path: {"$literal": value} for path, value in fields.items()})
+    return [{"$set": stage}]
+
+
+def upsert_operation(doc_type: str, doc_number: str, upsert: ContactUpsert) -> Tuple[dict, dict, dict]:
+    """Return the (query, update, inserted document) of a person upsert by document.
+    The mutable fields are set on every upsert, and the id and created time only when the person is inserted.
+    The inserted document is the one stored if the person is created"""
+    document = upsert.dict()
+    if document.pop("doc_type", doc_type) != doc_type or document.pop("doc_number", doc_number) != doc_number:
+        raise DocumentMismatchException()
+    document["updated"] = get_time()
+    query = {"doc_type": doc_type, "doc_number": doc_number}
+    on_insert = {"_id": get_uuid(), "created": document["updated"]}
+    update = {"$set": document, "$setOnInsert": on_insert, "$inc": VERSION_INCREMENT}
+    return query, update, {**query, **document, **on_insert, "version": 1}
+
+
+def duplicate_key(error: DuplicateKeyError) -> str:
+    """Return the duplicated unique key of a duplicate key error, as identifier (e.g. "doc_number=123,doc_type=DNI")"""
+    key_value = (error.details or dict()).get("keyValue") or dict()
+    return ",".join(f"{field}={value}" for field, value in key_value.items()) or "unknown"
+
+
+def contacts_batch_documents(items: List[dict]) -> Tuple[List[dict], List[ContactBatchItemResult]]:
+    """Validate the persons of a batch registration, returning the documents to insert, and the result of each item.
+    The results of the valid items are set as created, and must be updated with the insert errors,
+    using contacts_batch_result"""
+    documents, results = list(), list()
+    now = get_time()
+    for index, item in enumerate(items):
+        try:
+            create = ContactCreate.parse_obj(item)
+        except pydantic.ValidationError as ex:
+            results.append(ContactBatchItemResult(index=index, status=BatchItemStatus.invalid, errors=ex.errors()))
+            continue
+
+        document = create.dict()
+        document["created"] = document["updated"] = now
+        document["version"] = 1
+        document["_id"] = get_uuid()
+        documents.append(document)
+        results.append(ContactBatchItemResult(index=index, status=BatchItemStatus.created, contact_id=document["_id"]))
+    return documents, results
+
+
+def contacts_batch_result(results: List[ContactBatchItemResult], write_errors: List[dict]) -> ContactsBatchResult:
+    """Build the result of a batch registration, given the results returned by contacts_batch_documents,
+    and the write errors of the insert_many (which reference the inserted documents by their index)"""
+    inserted_results = [result for result in results if result.status == BatchItemStatus.created]
+    for error in write_errors:
+        result = inserted_results[error["index"]]
+        result.status = BatchItemStatus.duplicate if error["code"] == DUPLICATE_KEY_ERROR else BatchItemStatus.failed
+        result.errors = [{"msg": error["errmsg"], "code": error["code"]}]
+        result.contact_id = None
+
+    counts = {status: 0 for status in BatchItemStatus}
+    for result in results:
+        counts[result.status] += 1
+    return ContactsBatchResult(created=counts[BatchItemStatus.created],
+                               invalid=counts[BatchItemStatus.invalid],
+                               duplicates=counts[BatchItemStatus.duplicate],
+                               failed=counts[BatchItemStatus.failed],
+                               items=results)
+
+
+def utc_day(timestamp: int) -> str:
+    """Return the day (UTC, YYYY-MM-DD) of a Unix timestamp"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).date().isoformat()
+
+
+def geo_point(latitude: Optional[str], longitude: Optional[str]) -> Optional[dict]:
+    """Return the GeoJSON point of the given latitude and longitude (stored as strings), or None if they are
+    missing or not valid coordinates (the 2dsphere indexes reject the documents with invalid points)"""
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return None
+    # comparisons with NaN are always False
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def symptom_document(update: SymptomUpdate) -> dict:
+    """Return the document of a symptom check-in, as stored (with its location as GeoJSON point, if valid)"""
+    document = update.dict()
+    document["updated"] = get_time()
+    location = geo_point(update.latitude, update.longitude)
+    if location:
+        document["location"] = location
+    return document
+
+
+def add_symptom_operation(document: dict) -> dict:
+    """Return the update operation that adds a symptom check-in to a person: the check-in is pushed to the symptoms
+    (keeping only the latest symptoms_window ones, if set), stored as latest_symptom, and the person is updated"""
+    push = document
+    if mongo_settings.symptoms_window > 0:
+        push = {"$each": [document], "$slice": -mongo_settings.symptoms_window}
+    return {"$push": {"symptoms": push}, "$set": {"latest_symptom": document, "updated": document["updated"]},
+            "$inc": VERSION_INCREMENT}
+
+
+def alarm_signal_document(update: AlarmSignalCreate) -> dict:
+    """Return the document of an alarm signal report, as stored"""
+    document = update.dict()
+    document["updated"] = get_time()
+    return document
+
+
+def add_alarm_signal_operation(document: dict) -> dict:
+    """Return the update operation that adds an alarm signal report to a person: the report is pushed to the
+    alarm_signals, stored as latest_alarm_signal, and the person is updated"""
+    return {"$push": {"alarm_signals": document},
+            "$set": {"latest_alarm_signal": document, "updated": document["updated"]},
+            "$inc": VERSION_INCREMENT}
+
+
+def symptoms_batch_checkins(items: List[SymptomBatchItem], existing_ids: set) -> List[Tuple[str, dict]]:
+    """Return the (person id, symptom document) check-ins of a batch, for the persons that exist"""
+    return [(item.contact_id, symptom_document(item.symptom)) for item in items if item.contact_id in existing_ids]
+
+
+def symptoms_batch_operations(checkins: List[Tuple[str, dict]]) -> List[UpdateOne]:
+    """Return the bulk write operations that add the check-ins of a batch to their persons"""
+    return [UpdateOne({"_id": contact_id}, add_symptom_operation(document)) for contact_id, document in checkins]
+
+
+def symptoms_history_operations(checkins: List[Tuple[str, dict]]) -> List[UpdateOne]:
+    """Return the bulk write operations that append (person id, symptom document) check-ins to the symptoms history.
+    The history has a bucket document per person and day (UTC), upserted with a deterministic _id.
+    Returns no operations if the history is not kept (the symptoms_window is not set)"""
+    if mongo_settings.symptoms_window <= 0:
+        return []
+
+    operations = list()
+    for contact_id, document in checkins:
+        day = utc_day(document["updated"])
+        operations.append(UpdateOne(
+            {"_id": f"{contact_id}:{day}"},
+            {"$setOnInsert": {"contact_id": contact_id, "day": day},
+             "$push": {"symptoms": document},
+             "$inc": {"count": 1}},
+            upsert=True
+        ))
+    return operations
+
+
+def to_timestamp(time_expression: str) -> dict:
+    """Return the aggregation expression of the Unix timestamp of a check-in time, which is stored as timestamp,
+    or as ISO date string by the persons registered with symptoms (Symptoms.dict). Invalid strings are null"""
+    from_string = {"$dateFromString": {"dateString": time_expression, "onError": None, "onNull": None}}
+    return {"$cond": [{"$eq": [{"$type": time_expression}, "string"]},
+                      {"$toLong": {"$divide": [{"$toLong": from_string}, 1000]}},
+                      time_expression]}
+
+
+def checkins_cursor_range(to_time: Optional[int], cursor: Optional[str]) -> Tuple[Optional[int], int]:
+    """Return the upper bound (inclusive, None for no bound) of the check-in times of a symptoms page,
+    and the number of check-ins at that time to skip (returned on previous pages), given the cursor"""
+    if not cursor:
+        return to_time, 0
+    try:
+        before, skip = decode_cursor(cursor)
+        before, skip = int(before), int(skip)
+    except (ValueError, TypeError):
+        raise InvalidCursorException()
+    if to_time is not None and to_time < before:
+        return to_time, 0
+    return before, skip
+
+
+def checkins_pipeline(contact_id: str, from_time: Optional[int], upper: Optional[int], count: int) -> List[dict]:
+    """Return the aggregation pipeline that fetches only the latest count check-ins of a person, within the range,
+    from its symptoms list (the person document is not returned)"""
+    conditions = list()
+    if from_time is not None:
+        conditions.append({"$gte": [to_timestamp("$$symptom.updated"), from_time]})
+    if upper is not None:
+        conditions.append({"$lte": [to_timestamp("$$symptom.updated"), upper]})
+    checkins = {"$filter": {"input": {"$ifNull": ["$symptoms", []]}, "as": "symptom", "cond": {"$and": conditions}}}
+    return [
+        {"$match": {"_id": contact_id}},
+        {"$project": {"_id": 0, "symptoms": {"$slice": [checkins, -count]}}},
+    ]
+
+
+def checkins_days(from_time: Optional[int], upper: Optional[int]) -> dict:
+    """Return the query of the symptoms history buckets (days) within the range"""
+    days = dict()
+    if from_time is not None:
+        days["$gte"] = utc_day(from_time)
+    if upper is not None:
+        days["$lte"] = utc_day(upper)
+    return days
+
+
+def bucket_checkins(bucket: dict, from_time: Optional[int], upper: Optional[int]) -> List[dict]:
+    """Return the check-ins of a symptoms history bucket within the range, newest first"""
+    return [document for document in reversed(bucket["symptoms"])
+            if (from_time is None or document["updated"] >= from_time)
+            and (upper is None or document["updated"] <= upper)]
+
+
+def checkins_page(documents: List[dict], limit: int, upper: Optional[int], skip: int) -> SymptomCheckinsPage:
+    """Build a page of check-ins from the documents found (newest first), which must include the skip check-ins
+    at the upper bound returned on previous pages, plus an extra one that tells that there is a next page.
+    The check-in times stored as ISO date strings (persons registered with symptoms) are returned as timestamps"""
+    documents = documents[skip:]
+    items = [{**document, "updated": parse_timestamp(document.get("updated"))} for document in documents[:limit]]
+    next_cursor = None
+    if len(documents) > limit:
+        last = items[-1]["updated"]
+        returned = sum(1 for document in items if document["updated"] == last)
+        if last == upper:
+            returned += skip
+        next_cursor = encode_cursor(last, returned)
+    return SymptomCheckinsPage(items=[SymptomCheckin(**document) for document in items], next_cursor=next_cursor)
+
+
+REGION_FIELDS = {
+    StatsDimension.department: "address.department.code",
+    StatsDimension.province: "address.province.code",
+    StatsDimension.district: "address.district.code",
+}
+"""Person fields of the region dimensions of the stats"""
+ALARM_SIGNAL_QUESTIONS = [f"q{i}" for i in range(1, 7)]
+COMORBIDITY_QUESTIONS = [f"q{i}" for i in range(1, 17)]
+
+
+def is_true(expression: str) -> dict:
+    """Return the aggregation expression that is 1 if the value is true (stored as boolean or string), else 0"""
+    return {"$cond": [{"$in": [expression, [True, "true"]]}, 1, 0]}
+
+
+def day_expression(timestamp_expression: str) -> dict:
+    """Return the aggregation expression of the day (UTC, YYYY-MM-DD) of a Unix timestamp"""
+    return {"$dateToString": {"format": "%Y-%m-%d", "date": {"$toDate": {"$multiply": [timestamp_expression, 1000]}}}}
+
+
+def stats_group_id(group_by: List[StatsDimension], day: dict, person_prefix: str = "") -> dict:
+    """Return the $group _id of the stats, given the dimensions, the day expression,
+    and the prefix of the person fields (if the person is not the root document)"""
+    group_id = dict()
+    for dimension in dict.fromkeys(group_by):
+        if dimension == StatsDimension.day:
+            group_id["day"] = day
+        else:
+            group_id[dimension.value] = f"${person_prefix}{REGION_FIELDS[dimension]}"
+    return group_id
+
+
+def regions_query(regions: Optional[dict], person_prefix: str = "") -> dict:
+    """Return the query that matches the persons of the given regions ({dimension: code})"""
+    return {person_prefix + REGION_FIELDS[StatsDimension(dimension)]: code
+            for dimension, code in (regions or {}).items()}
+
+
+def symptoms_stats_pipeline(group_by: List[StatsDimension], from_time: Optional[int], to_time: Optional[int],
+                             regions: Optional[dict]) -> List[dict]:
+    """Return the aggregation pipeline of the symptom check-ins stats. Without a symptoms window, the check-ins are
+    read from the persons (filtered by their updated time, which is the time of their last check-in).
+    Otherwise, they are read from the symptoms history buckets (filtered by day), joined with their persons
+    only if the stats are grouped or filtered by region"""
+    checkins_range = dict()
+    if from_time is not None:
+        checkins_range["$gte"] = from_time
+    if to_time is not None:
+        checkins_range["$lte"] = to_time
+
+    if mongo_settings.symptoms_window <= 0:
+        match = regions_query(regions)
+        if from_time is not None:
+            match["updated"] = {"$gte": from_time}
+        pipeline = [{"$match": match}]
+        group_id = stats_group_id(group_by, day_expression("$symptoms.updated"))
+    else:
+        days = checkins_days(from_time, to_time)
+        pipeline = [{"$match": {"day": days} if days else {}}]
+        person_prefix = ""
+        if regions or set(group_by) - {StatsDimension.day}:
+            person_prefix = "person."
+            pipeline += [
+                {"$lookup": {"from": mongo_settings.collection, "localField": "contact_id", "foreignField": "_id",
+                             "as": "person"}},
+                {"$unwind": "$person"},
+            ]
+            if regions:
+                pipeline.append({"$match": regions_query(regions, person_prefix)})
+        group_id = stats_group_id(group_by, "$day", person_prefix)
+
+    pipeline.append({"$unwind": "$symptoms"})
+    if mongo_settings.symptoms_window <= 0 and (checkins_range or StatsDimension.day in group_by):
+        # the check-ins of the persons can have their time as string; the history ones are always timestamps
+        pipeline.append({"$set": {"symptoms.updated": to_timestamp("$symptoms.updated")}})
+    if checkins_range:
+        pipeline.append({"$match": {"symptoms.updated": checkins_range}})
+    pipeline += [
+        {"$group": {
+            "_id": group_id,
+            "checkins": {"$sum": 1},
+            "suspicious": {"$sum": is_true("$symptoms.is_suspicious")},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    return pipeline
+
+
+def symptoms_stats(rows: List[dict]) -> List[SymptomsStats]:
+    return [SymptomsStats(group=StatsGroup(**row["_id"]),
+                          checkins=row["checkins"],
+                          suspicious=row["suspicious"])
+            for row in rows]
+
+
+def alarm_signals_stats_pipeline(group_by: List[StatsDimension], from_time: Optional[int], to_time: Optional[int],
+                                  regions: Optional[dict]) -> List[dict]:
+    """Return the aggregation pipeline of the alarm signals stats. The reports are read from the persons
+    (filtered by their updated time, which is at or after the time of their last report)"""
+    match = regions_query(regions)
+    match["alarm_signals.0"] = {"$exists": True}
+    if from_time is not None:
+        match["updated"] = {"$gte": from_time}
+    pipeline = [{"$match": match}, {"$unwind": "$alarm_signals"}]
+
+    reports_range = dict()
+    if from_time is not None:
+        reports_range["$gte"] = from_time
+    if to_time is not None:
+        reports_range["$lte"] = to_time
+    if reports_range:
+        pipeline.append({"$match": {"alarm_signals.updated": reports_range}})
+    pipeline += [
+        {"$group": {
+            "_id": stats_group_id(group_by, day_expression("$alarm_signals.updated")),
+            "reports": {"$sum": 1},
+            **{f"alarm_signal_{q}": {"$sum": is_true(f"$alarm_signals.{q}")} for q in ALARM_SIGNAL_QUESTIONS},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    return pipeline
+
+
+def alarm_signals_stats(rows: List[dict]) -> List[AlarmSignalsStats]:
+    return [AlarmSignalsStats(group=StatsGroup(**row["_id"]),
+                              reports=row["reports"],
+                              alarm_signals={q: row[f"alarm_signal_{q}"] for q in ALARM_SIGNAL_QUESTIONS})
+            for row in rows]
+
+
+def comorbidities_stats_pipeline(group_by: List[StatsDimension], regions: Optional[dict]) -> List[dict]:
+    """Return the aggregation pipeline of the comorbidities stats. The day dimension is the day of registration"""
+    return [
+        {"$match": regions_query(regions)},
+        {"$group": {
+            "_id": stats_group_id(group_by, day_expression("$created")),
+            "persons": {"$sum": 1},
+            "with_comorbidity": {"$sum": {"$cond": [{"$ifNull": ["$comorbidity", False]}, 1, 0]}},
+            **{f"comorbidity_{q}": {"$sum": is_true(f"$comorbidity.{q}")} for q in COMORBIDITY_QUESTIONS},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+def comorbidities_stats(rows: List[dict]) -> List[ComorbiditiesStats]:
+    return [ComorbiditiesStats(group=StatsGroup(**row["_id"]),
+                               persons=row["persons"],
+                               with_comorbidity=row["with_comorbidity"],
+                               comorbidities={q: row[f"comorbidity_{q}"] for q in COMORBIDITY_QUESTIONS})
+            for row in rows]
+
+
+EARTH_RADIUS_KM = 6378.1
+
+
+def circle_area(latitude: float, longitude: float, radius_km: float) -> dict:
+    """Return the $geoWithin area of a circle, given its center and radius"""
+    return {"$centerSphere": [[longitude, latitude], radius_km / EARTH_RADIUS_KM]}
+
+
+def box_area(south: float, west: float, north: float, east: float) -> dict:
+    """Return the $geoWithin area of a bounding box, as a GeoJSON polygon.
+    The edges are geodesics, so on large boxes the latitude edges do not follow the parallels exactly"""
+    if south >= north or west >= east:
+        raise InvalidAreaException()
+    ring = [[west, south], [east, south], [east, north], [west, north], [west, south]]
+    return {"$geometry": {"type": "Polygon", "coordinates": [ring]}}
+
+
+def geo_checkins_pipeline(area: dict, suspicious_only: bool, from_time: Optional[int], to_time: Optional[int],
+                           limit: int) -> List[dict]:
+    """Return the aggregation pipeline that finds the latest check-ins located within an area ($geoWithin),
+    on the collection that keeps the full check-ins history (the persons, or the symptoms history buckets)"""
+    query = {"symptoms.location": {"$geoWithin": area}}
+    if suspicious_only:
+        query["symptoms.is_suspicious"] = True
+    times = dict()
+    if from_time is not None:
+        times["$gte"] = from_time
+    if to_time is not None:
+        times["$lte"] = to_time
+    if times:
+        query["symptoms.updated"] = times
+
+    history = mongo_settings.symptoms_window > 0
+    return [
+        # the first match (supported by the 2dsphere index) finds the documents with some matching check-in,
+        # and the same match after unwinding keeps only the matching check-ins of those documents
+        {"$match": query},
+        {"$unwind": "$symptoms"},
+        {"$match": query},
+        {"$sort": {"symptoms.updated": DESCENDING}},
+        {"$limit": limit},
+        {"$addFields": {"symptoms.contact_id": "$contact_id" if history else "$_id"}},
+        {"$replaceRoot": {"newRoot": "$symptoms"}},
+    ]
+
+
+SYMPTOM_QUESTIONS = [f"q{i}" for i in range(1, 10)]
+ROLLUP_PROJECTION = {"address.department.code": 1}
+"""Fields of a person required to maintain the rollups of its writes"""
+RollupEvent = Tuple[int, Optional[str], Dict[str, int]]
+"""A write counted on the rollups: (Unix timestamp, department code, counters to increment)"""
+
+
+def is_positive(value) -> bool:
+    """Return if a question answer is positive (stored as boolean or string)"""
+    return value in (True, "true")
+
+
+def department_code(document: Optional[dict]) -> Optional[str]:
+    """Return the department code of a person document, if any"""
+    address = (document or {}).get("address") or {}
+    return (address.get("department") or {}).get("code")
+
+
+def registration_counters(document: dict) -> Dict[str, int]:
+    """Return the rollup counters of a person registration"""
+    comorbidity = document.get("comorbidity") or {}
+    counters = {"registrations": 1, "with_comorbidity": int(bool(comorbidity))}
+    counters.update({f"comorbidities.{q}": 1 for q in COMORBIDITY_QUESTIONS if is_positive(comorbidity.get(q))})
+    return counters
+
+
+def alarm_signal_counters(alarm_signal: dict) -> Dict[str, int]:
+    """Return the rollup counters of an alarm signal report"""
+    counters = {"alarm_signal_reports": 1}
+    counters.update({f"alarm_signals.{q}": 1 for q in ALARM_SIGNAL_QUESTIONS if is_positive(alarm_signal.get(q))})
+    return counters
+
+
+def checkin_counters(symptom: dict) -> Dict[str, int]:
+    """Return the rollup counters of a symptom check-in (including its alarm signal, if any)"""
+    counters = {"checkins": 1, "suspicious": int(is_positive(symptom.get("is_suspicious")))}
+    counters.update({f"symptoms.{q}": 1 for q in SYMPTOM_QUESTIONS if is_positive(symptom.get(q))})
+    if symptom.get("alarm_signal"):
+        counters.update(alarm_signal_counters(symptom["alarm_signal"]))
+    return counters
+
+
+def rollup_increments(events: List[RollupEvent]) -> Dict[Tuple[str, Optional[str]], Counter]:
+    """Merge the counters of the events by (day, department). Each event is counted on its department
+    and on the totals of all the departments (department None)"""
+    increments = defaultdict(Counter)
+    for timestamp, department, counters in events:
+        day = utc_day(timestamp)
+        for key in {(day, None), (day, department)}:
+            increments[key].update(counters)
+    return increments
+
+
+def rollup_id(day: str, department: Optional[str]) -> str:
+    return f"{day}:{department or '*'}"
+
+
+def rollup_operations(events: List[RollupEvent]) -> List[UpdateOne]:
+    """Return the bulk write operations that increment the rollups counters with the events.
+    Returns no operations if the rollups are not maintained"""
+    if not mongo_settings.rollups:
+        return []
+    return [UpdateOne({"_id": rollup_id(day, department)},
+                      {"$setOnInsert": {"day": day, "department": department},
+                       "$inc": {name: value for name, value in counters.items() if value}},
+                      upsert=True)
+            for (day, department), counters in rollup_increments(events).items()]
+
+
+def department_projection() -> Optional[dict]:
+    """Return the projection of the person fields to fetch on updates, if required by their side effects
+    (to maintain the rollups, or to publish the events while there are subscribers)"""
+    return ROLLUP_PROJECTION if mongo_settings.rollups or event_bus.has_subscribers() else None
+
+
+def inserted_documents(documents: List[dict], write_errors: List[dict]) -> List[dict]:
+    """Return the documents of an unordered insert_many that were inserted, given its write errors"""
+    failed = {error["index"] for error in write_errors}
+    return [document for index, document in enumerate(documents) if index not in failed]
+
+
+HEATMAP_CELLS_DEPTH = 2
+"""Geohash characters of the heatmap cells, over the characters of their tile"""
+
+
+def heatmap_increments(symptoms: List[dict]) -> Dict[str, Counter]:
+    """Return the increments of the heatmap cells of each tile ({tile: {cell: count}}),
+    with the suspicious check-ins (symptom documents) that have a location"""
+    increments = defaultdict(Counter)
+    precision = max(mongo_settings.heatmap_tiles) + HEATMAP_CELLS_DEPTH
+    for symptom in symptoms:
+        if not symptom.get("is_suspicious") or not symptom.get("location"):
+            continue
+        longitude, latitude = symptom["location"]["coordinates"]
+        geohash = encode_geohash(latitude, longitude, precision)
+        for length in mongo_settings.heatmap_tiles:
+            increments[geohash[:length]][geohash[:length + HEATMAP_CELLS_DEPTH]] += 1
+    return increments
+
+
+def heatmap_operations(symptoms: List[dict]) -> List[UpdateOne]:
+    """Return the bulk write operations that increment the heatmap tiles with the check-ins (symptom documents).
+    Each tile is a single document, and its version is incremented on each update.
+    Returns no operations if the heatmap is not maintained"""
+    if not mongo_settings.heatmap:
+        return []
+    return [UpdateOne({"_id": tile},
+                      {"$inc": {"total": sum(cells.values()), "version": 1,
+                                **{f"cells.{cell}": count for cell, count in cells.items()}}},
+                      upsert=True)
+            for tile, cells in heatmap_increments(symptoms).items()]
+
+
+def heatmap_tile(tile: str, document: Optional[dict]) -> HeatmapTile:
+    """Return the heatmap tile, given its document (None if the tile has no check-ins yet)"""
+    document = document or dict()
+    return HeatmapTile(tile=tile, precision=len(tile) + HEATMAP_CELLS_DEPTH, total=document.get("total", 0),
+                       cells=document.get("cells", dict()), version=document.get("version", 0))
+
+
+def validate_tile(tile: str):
+    if len(tile) not in mongo_settings.heatmap_tiles or any(char not in GEOHASH_ALPHABET for char in tile):
+        raise InvalidTileException()
+
+
+def ndjson_chunk(model, documents: List[dict]) -> bytes:
+    """Serialize the given documents with the given Read model, as NDJSON lines (one JSON document per line)"""
+    return "".join(model(**document).json(exclude_none=True) + "\n" for document in documents).encode()
@@ -1,128 +1,359 @@
 """REPOSITORIES
-Methods to interact with the database
+Methods to interact with the database. The queries and operations are built by the queries module
 """
 
+# # Native # #
+from typing import Optional, Union, List, Tuple, Iterator
+
+# # Installed # #
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
 # # Package # #
 from people_api.models.alarm_signal_create import AlarmSignalCreate
 from .models import *
 from .exceptions import *
-from .database import collection, symptomCollection
+from .cache import contacts_cache
+from .queries import *
+from .events import publish_checkins, publish_alarm_signal
+from .database import collection, symptomCollection, symptomsHistory, rollups, heatmap, tombstones
+from .settings import api_settings, mongo_settings
 from .utils import get_time, get_uuid
 
 __all__ = (
     "ContactRepository",
     "SymptomsRepository",
+    "SymptomsHistoryRepository",
+    "StatsRepository",
+    "RollupsRepository",
+    "GeoRepository",
+    "HeatmapRepository",
+    "TombstonesRepository",
+    "CONTACTS_SORT",
+    "DUPLICATE_KEY_ERROR",
 )
 
 
 class ContactRepository:
+    collection = collection
+    indexes = [
+        IndexModel([("imei", ASCENDING)], name="imei_unique", unique=True,
+                   partialFilterExpression={"imei": {"$exists": True}}, background=True),
+        IndexModel([("doc_number", ASCENDING), ("doc_type", ASCENDING)], name="doc_number_doc_type_unique",
+                   unique=True, partialFilterExpression={"doc_number": {"$exists": True}}, background=True),
+        IndexModel([("parent_contact_id", ASCENDING)], name="parent_contact_id", background=True),
+        IndexModel(CONTACTS_SORT, name="updated_id", background=True),
+        IndexModel([("address.department.code", ASCENDING), ("updated", ASCENDING)], name="department_updated",
+                   background=True),
+        IndexModel([("symptoms.location", GEOSPHERE)], name="symptoms_location", background=True),
+    ]
+    """Indexes required by the queries of this repository, created by indexes.ensure_indexes (built in background,
+    so the collections are not locked meanwhile). The unique indexes reject the duplicated persons
+    (same document, or same IMEI if any). Being partial, they can be built while the former indexes with the same keys
+    still exist"""
+    dropped_indexes = ["imei", "doc_number_doc_type"]
+    """Former indexes with the same keys as the current ones, dropped by indexes.ensure_indexes once the current
+    indexes are built"""
+    query_shapes = [
+        ("_id",),
+        ("imei",),
+        ("doc_type", "doc_number"),
+        ("doc_number",),
+        ("parent_contact_id",),
+        ("updated", "_id"),
+        ("address.department.code", "updated"),
+        ("symptoms.location",),
+    ]
+    """Fields (equality first, then sort/range) of the queries performed by this repository"""
+
     @staticmethod
-    def getByImei(imei: str) -> ContactRead:
-        """Retrieve a single Person by its unique IMEI"""
-        print(imei)
-        document = collection.find_one({"imei": imei})
+    def getByImei(imei: str, fields: Optional[str] = None,
+                     version: Optional[ContactVersion] = None) -> ContactRead:
+        """Retrieve a single Person by its unique IMEI.
+        If fields are given (comma-separated), only those are fetched and a ContactPartialRead is returned.
+        Otherwise, the person is cached until it gets written. If its current version (read from the database)
+        is given, a cached person of another version (written by another process) is not returned"""
+        projection = contact_projection(fields)
+        if not projection:
+            contact = contacts_cache.get(f"imei:{imei}")
+            if contact is not None and (version is None or contact.version == version):
+                return contact
+
+        document = collection.find_one({"imei": imei}, projection)
         if not document:
             raise ContactNotFoundException(imei)
-        return ContactRead(**document)
+        if projection:
+            return ContactPartialRead(**document)
+
+        contact = contact_read(document)
+        contacts_cache.set(f"imei:{imei}", contact, tags=[document["_id"]])
+        return contact
 
     @staticmethod
-    def get(contact_id: str) -> ContactRead:
-        """Retrieve a single Person by its unique id"""
-        document = collection.find_one({"_id": contact_id})
-        print(document)
+    def getVersionByImei(imei: str) -> ContactVersion:
+        """Retrieve the version of a Person by its unique IMEI, fetching only its version fields.
+        Always read from the database (not the cache), so the writes done by other processes are seen"""
+        return contact_version(collection.find_one({"imei": imei}, VERSION_PROJECTION), imei)
+
+    @staticmethod
+    def getVersion(contact_id: str) -> ContactVersion:
+        """Retrieve the version of a Person by its unique id, fetching only its version fields.
+        Always read from the database (not the cache), so the writes done by other processes are seen"""
+        return contact_version(collection.find_one({"_id": contact_id}, VERSION_PROJECTION), contact_id)
+
+    @staticmethod
+    def get(contact_id: str, fields: Optional[str] = None,
+               version: Optional[ContactVersion] = None) -> ContactRead:
+        """Retrieve a single Person by its unique id.
+        If fields are given (comma-separated), only those are fetched and a ContactPartialRead is returned.
+        Otherwise, the person is cached until it gets written. If its current version (read from the database)
+        is given, a cached person of another version (written by another process) is not returned"""
+        projection = contact_projection(fields)
+        if not projection:
+            contact = contacts_cache.get(f"id:{contact_id}")
+            if contact is not None and (version is None or contact.version == version):
+                return contact
+
+        document = collection.find_one({"_id": contact_id}, projection)
         if not document:
             raise ContactNotFoundException(contact_id)
-        return ContactRead(**document)
+        if projection:
+            return ContactPartialRead(**document)
+
+        contact = contact_read(document)
+        contacts_cache.set(f"id:{contact_id}", contact, tags=[contact_id])
+        return contact
+
+    @staticmethod
+    def list(filters: Optional[ContactFilters] = None,
+             limit: int = api_settings.page_size,
+             cursor: Optional[str] = None,
+             fields: Optional[str] = None) -> ContactsPage:
+        """Retrieve a page of the available persons, optionally filtered.
+        The cursor is the next_cursor returned on the previous page.
+        If fields are given (comma-separated), only those (plus updated, required for the cursor) are fetched"""
+        query = contacts_page_query(filters, cursor)
+        projection = contact_projection(fields)
+        if projection:
+            projection["updated"] = 1
+        documents = collection.find(query, projection).sort(CONTACTS_SORT).limit(limit + 1)
+        return contacts_page(list(documents), limit, projection)
 
     @staticmethod
-    def list() -> ContactsRead:
-        """Retrieve all the available persons"""
-        cursor = collection.find()
-        # for document in cursor:
-        #     print(document)
-        return [ContactRead(**document) for document in cursor]
+    def changes(since: int = 0,
+                limit: int = api_settings.page_size,
+                cursor: Optional[str] = None) -> ContactChanges:
+        """Retrieve a page of the persons changed (created or updated) and deleted since a checkpoint (updated time),
+        for incremental syncs. The cursor is the next_cursor returned on the previous page (since is then ignored).
+        Each page has up to limit persons and up to limit deleted persons"""
+        since, until, persons_after, tombstones_after = changes_window(since, cursor)
+        persons, deleted = list(), list()
+        if persons_after is None or persons_after:
+            query = changes_query("updated", since, until, persons_after)
+            documents = collection.find(query).sort(CONTACTS_SORT).limit(limit + 1)
+            persons, persons_after = changes_page(list(documents), "updated", limit)
+        if tombstones_after is None or tombstones_after:
+            documents = TombstonesRepository.list(since, until, tombstones_after, limit + 1)
+            deleted, tombstones_after = changes_page(documents, "deleted", limit)
+        return contact_changes(persons, deleted, since, until, persons_after, tombstones_after)
+
+    @staticmethod
+    def export(filters: Optional[ContactFilters] = None,
+               batch_size: int = api_settings.export_batch_size) -> Iterator[bytes]:
+        """Iterate all the available persons, optionally filtered, as chunks of NDJSON lines.
+        Documents are fetched and serialized in batches, so memory usage does not depend on the collection size"""
+        query = filters.query() if filters else dict()
+        batch = list()
+        for document in collection.find(query).batch_size(batch_size):
+            batch.append(document)
+            if len(batch) == batch_size:
+                yield ndjson_chunk(ContactRead, batch)
+                batch.clear()
+        if batch:
+            yield ndjson_chunk(ContactRead, batch)
+
+    @staticmethod
+    def listSymptoms(contact_id: str,
+                     from_time: Optional[int] = None,
+                     to_time: Optional[int] = None,
+                     limit: int = api_settings.page_size,
+                     cursor: Optional[str] = None) -> SymptomCheckinsPage:
+        """Retrieve a page of the symptom check-ins of a person, newest first, optionally within a time range.
+        The cursor is the next_cursor returned on the previous page.
+        Only the matching check-ins are fetched: from the symptoms history if kept, otherwise from the person"""
+        if mongo_settings.symptoms_window > 0:
+            return SymptomsHistoryRepository.list(contact_id, from_time, to_time, limit, cursor)
+
+        upper, skip = checkins_cursor_range(to_time, cursor)
+        pipeline = checkins_pipeline(contact_id, from_time, upper, limit + 1 + skip)
+        documents = list(collection.aggregate(pipeline))
+        if not documents:
+            raise ContactNotFoundException(identifier=contact_id)
+        return checkins_page(documents[0]["symptoms"][::-1], limit, upper, skip)
 
     @staticmethod
     def create(create: ContactCreate) -> ContactRead:
         """Create a person and return its Read object"""
-        print(create)
         document = create.dict()
         document["created"] = document["updated"] = get_time()
+        document["version"] = 1
         document["_id"] = get_uuid()
         # The time and id could be inserted as a model's Field default factory,
         # but would require having another model for Repository only to implement it
 
-        result = collection.insert_one(document)
+        try:
+            result = collection.insert_one(document)
+        except DuplicateKeyError as ex:
+            raise ContactAlreadyExistsException(duplicate_key(ex))
         assert result.acknowledged
+        RollupsRepository.add([(document["created"], department_code(document), registration_counters(document))])
 
-        return ContactRepository.get(result.inserted_id)
+        # The Read object is built from the inserted document, to avoid reading it back
+        return ContactRead(**document)
 
     @staticmethod
-    def update(contact_id: str, update: ContactUpdate):
-        """Update a person by giving only the fields to update"""
-        # record = collection.find_one({"_id": person_id})
-        # if not record:
-        #     raise PersonNotFoundException(person_id)
-        document = update.dict()
-        document["updated"] = get_time()
-        # symptoms = record.pop("symptoms")
-        # print(symptoms)
-        # symptoms.append(document)
-        # document["symptoms"] = symptoms
-        # print(document)
-        result = collection.update_one({"_id": contact_id}, {"$set": document})
-        if not result.modified_count:
-            raise ContactNotFoundException(identifier=contact_id)
+    def upsertByDocument(doc_type: str, doc_number: str, upsert: ContactUpsert) -> ContactUpsertResult:
+        """Create or update a person by its document, atomically, so retried registrations do not duplicate it.
+        The previous id of the person (if any) is fetched on the same round trip (find_one_and_update)"""
+        query, update, inserted = upsert_operation(doc_type, doc_number, upsert)
+        try:
+            previous = collection.find_one_and_update(query, update, projection={"_id": 1}, upsert=True)
+        except DuplicateKeyError:
+            # a concurrent upsert inserted the same person: now it exists, so this one updates it
+            try:
+                previous = collection.find_one_and_update(query, update, projection={"_id": 1}, upsert=True)
+            except DuplicateKeyError as ex:
+                raise ContactAlreadyExistsException(duplicate_key(ex))
+
+        if previous:
+            contacts_cache.invalidate(previous["_id"])
+            return ContactUpsertResult(contact_id=previous["_id"], created=False)
+        RollupsRepository.add([(inserted["created"], department_code(inserted), registration_counters(inserted))])
+        return ContactUpsertResult(contact_id=inserted["_id"], created=True)
 
     @staticmethod
-    def addSymptom(contact_id: str, update: SymptomUpdate):
-        """Add a person symptom by giving only the fields to update"""
-        # record = collection.find_one({"_id": person_id})
-        # if not record:
-        #     raise PersonNotFoundException(person_id)
-        document = update.dict()
-        document["updated"] = get_time()
-        # symptoms = record.pop("symptoms")
-        # print(symptoms)
-        # symptoms.append(document)
-        # document["symptoms"] = symptoms
-        # print(document)
-        result = collection.update_one({"_id": contact_id},
-                                       {"$push": {
-                                           "symptoms": document
-                                       }})
-        if not result.modified_count:
-            raise ContactNotFoundException(identifier=contact_id)
+    def createMany(items: List[dict]) -> ContactsBatchResult:
+        """Create many persons with a single unordered insert. Each person is validated on its own,
+        and the invalid or duplicated persons are reported on the result, without failing the others"""
+        documents, results = contacts_batch_documents(items)
+        write_errors = list()
+        if documents:
+            try:
+                collection.insert_many(documents, ordered=False)
+            except BulkWriteError as ex:
+                write_errors = ex.details["writeErrors"]
+            RollupsRepository.add([(document["created"], department_code(document), registration_counters(document))
+                                   for document in inserted_documents(documents, write_errors)])
+        return contacts_batch_result(results, write_errors)
 
     @staticmethod
-    def addAlarmSignal(contact_id: str, update: AlarmSignalCreate):
-        """Add a person symptom by giving only the fields to update"""
-        # record = collection.find_one({"_id": person_id})
-        # if not record:
-        #     raise PersonNotFoundException(person_id)
-        document = update.dict()
-        document["updated"] = get_time()
-        # symptoms = record.pop("symptoms")
-        # print(symptoms)
-        # symptoms.append(document)
-        # document["symptoms"] = symptoms
-        # print(document)
-        result = collection.update_one({"_id": contact_id},
-                                       {"$set": {
-                                           "symptoms.alarm_signal": document
-                                       }})
-        if not result.modified_count:
+    def _update(contact_id: str, operation: Union[dict, List[dict]], return_document: bool,
+                projection: Optional[dict] = None) -> Optional[dict]:
+        """Apply an update operation (or pipeline) on a person. If return_document, the updated person document is returned,
+        fetched on the same round trip (find_one_and_update). Otherwise, if a projection is given,
+        those fields of the person are returned, also on the same round trip"""
+        if return_document or projection:
+            try:
+                document = collection.find_one_and_update({"_id": contact_id}, operation,
+                                                          projection=None if return_document else projection,
+                                                          return_document=ReturnDocument.AFTER)
+            except DuplicateKeyError as ex:
+                raise ContactAlreadyExistsException(duplicate_key(ex))
+            contacts_cache.invalidate(contact_id)
+            if not document:
+                raise ContactNotFoundException(identifier=contact_id)
+            return document
+
+        try:
+            result = collection.update_one({"_id": contact_id}, operation)
+        except DuplicateKeyError as ex:
+            raise ContactAlreadyExistsException(duplicate_key(ex))
+        contacts_cache.invalidate(contact_id)
+        if not result.matched_count:
             raise ContactNotFoundException(identifier=contact_id)
 
+    @staticmethod
+    def update(contact_id: str, update: ContactUpdate, return_document: bool = False) -> Optional[ContactRead]:
+        """Update a person by giving only the fields to update. Only the fields sent are written (nested fields
+        by their dotted path), and the updated time only changes if some of them changed.
+        If return_document, the updated person is returned"""
+        document = ContactRepository._update(contact_id, patch_pipeline(update), return_document)
+        return ContactRead(**document) if return_document else None
+
+    @staticmethod
+    def addSymptom(contact_id: str, update: SymptomUpdate, return_document: bool = False) -> Optional[ContactRead]:
+        """Add a person symptom by giving only the fields to update.
+        If return_document, the updated person is returned"""
+        symptom = symptom_document(update)
+        document = ContactRepository._update(contact_id, add_symptom_operation(symptom), return_document,
+                                             department_projection())
+        SymptomsHistoryRepository.add([(contact_id, symptom)])
+        RollupsRepository.add([(symptom["updated"], department_code(document), checkin_counters(symptom))])
+        HeatmapRepository.add([symptom])
+        publish_checkins([(contact_id, department_code(document), symptom)])
+        return ContactRead(**document) if return_document else None
+
+    @staticmethod
+    def addSymptoms(items: List[SymptomBatchItem]) -> SymptomsBatchResult:
+        """Add many symptoms, for one or many persons, with a single bulk write.
+        The symptoms of persons that do not exist are skipped, and reported on the result"""
+        contact_ids = list(dict.fromkeys(item.contact_id for item in items))
+        departments = {document["_id"]: department_code(document)
+                       for document in collection.find({"_id": {"$in": contact_ids}}, ROLLUP_PROJECTION)}
+        existing_ids = set(departments)
+
+        added = 0
+        checkins = symptoms_batch_checkins(items, existing_ids)
+        if checkins:
+            result = collection.bulk_write(symptoms_batch_operations(checkins), ordered=False)
+            added = result.modified_count
+            for contact_id in existing_ids:
+                contacts_cache.invalidate(contact_id)
+            SymptomsHistoryRepository.add(checkins)
+            RollupsRepository.add([(symptom["updated"], departments[contact_id], checkin_counters(symptom))
+                                   for contact_id, symptom in checkins])
+            HeatmapRepository.add([symptom for _, symptom in checkins])
+            publish_checkins([(contact_id, departments[contact_id], symptom) for contact_id, symptom in checkins])
+
+        not_found = [contact_id for contact_id in contact_ids if contact_id not in existing_ids]
+        return SymptomsBatchResult(added=added, not_found=not_found)
+
+    @staticmethod
+    def addAlarmSignal(contact_id: str, update: AlarmSignalCreate,
+                       return_document: bool = False) -> Optional[ContactRead]:
+        """Add an alarm signal report to a person, kept with its time on the person alarm signals.
+        If return_document, the updated person is returned"""
+        alarm_signal = alarm_signal_document(update)
+        document = ContactRepository._update(contact_id, add_alarm_signal_operation(alarm_signal), return_document,
+                                             department_projection())
+        RollupsRepository.add([(alarm_signal["updated"], department_code(document),
+                                alarm_signal_counters(alarm_signal))])
+        publish_alarm_signal(contact_id, department_code(document), alarm_signal)
+        return ContactRead(**document) if return_document else None
+
     @staticmethod
     def delete(contact_id: str):
-        """Delete a person given its unique id"""
+        """Delete a person given its unique id. A tombstone is kept, so the deletion is synced on the changes"""
         result = collection.delete_one({"_id": contact_id})
+        contacts_cache.invalidate(contact_id)
         if not result.deleted_count:
             raise ContactNotFoundException(identifier=contact_id)
+        TombstonesRepository.add(contact_id)
 
 
 class SymptomsRepository:
+    collection = symptomCollection
+    indexes = [
+        IndexModel([("person_id", ASCENDING)], name="person_id", background=True),
+    ]
+    """Indexes required by the queries of this repository, created by indexes.ensure_indexes (built in background,
+    so the collections are not locked meanwhile)"""
+    query_shapes = [
+        ("_id",),
+        ("person_id",),
+    ]
+    """Fields (equality first, then sort/range) of the queries performed by this repository"""
+
     @staticmethod
     def get(symptom_id: str) -> SymptomRead:
         """Retrieve a single Symptom by its unique id"""
@@ -132,12 +363,26 @@ class SymptomsRepository:
         return SymptomRead(**document)
 
     @staticmethod
-    def list(person_id: str) -> SymptomsRead:
-        """Retrieve all the available symptoms"""
-        print("person_id", person_id)
-        cursor = symptomCollection.find({"person_id": person_id})
+    def list(person_id: Optional[str] = None) -> SymptomsRead:
+        """Retrieve all the available symptoms, optionally of a single person"""
+        cursor = symptomCollection.find({"person_id": person_id} if person_id else dict())
         return [SymptomRead(**document) for document in cursor]
 
+    @staticmethod
+    def export(person_id: Optional[str] = None,
+               batch_size: int = api_settings.export_batch_size) -> Iterator[bytes]:
+        """Iterate all the available symptoms, optionally of a single person, as chunks of NDJSON lines.
+        Documents are fetched and serialized in batches, so memory usage does not depend on the collection size"""
+        query = {"person_id": person_id} if person_id else dict()
+        batch = list()
+        for document in symptomCollection.find(query).batch_size(batch_size):
+            batch.append(document)
+            if len(batch) == batch_size:
+                yield ndjson_chunk(SymptomRead, batch)
+                batch.clear()
+        if batch:
+            yield ndjson_chunk(SymptomRead, batch)
+
     @staticmethod
     def create(create: SymptomCreate) -> SymptomRead:
         """Create a symptom and return its Read object"""
@@ -147,27 +392,32 @@ class SymptomsRepository:
         # The time and id could be inserted as a model's Field default factory,
         # but would require having another model for Repository only to implement it
 
-        result = symptomCollection.insert_one(document)
+        try:
+            result = symptomCollection.insert_one(document)
+        except DuplicateKeyError as ex:
+            raise SymptomAlreadyExistsException(duplicate_key(ex))
         assert result.acknowledged
 
-        return SymptomsRepository.get(result.inserted_id)
+        # The Read object is built from the inserted document, to avoid reading it back
+        return SymptomRead(**document)
 
     @staticmethod
-    def update(symptom_id: str, update: SymptomUpdate):
-        """Update a symptom by giving only the fields to update"""
-        # record = collection.find_one({"_id": person_id})
-        # if not record:
-        #     raise PersonNotFoundException(person_id)
+    def update(symptom_id: str, update: SymptomUpdate, return_document: bool = False) -> Optional[SymptomRead]:
+        """Update a symptom by giving only the fields to update.
+        If return_document, the updated symptom is returned, fetched on the same round trip (find_one_and_update)"""
         document = update.dict()
         document["updated"] = get_time()
-        # symptoms = record.pop("symptoms")
-        # print(symptoms)
-        # symptoms.append(document)
-        # document["symptoms"] = symptoms
-        # print(document)
+
+        if return_document:
+            document = symptomCollection.find_one_and_update({"_id": symptom_id}, {"$set": document},
+                                                             return_document=ReturnDocument.AFTER)
+            if not document:
+                raise SymptomNotFoundException(identifier=symptom_id)
+            return SymptomRead(**document)
+
         result = symptomCollection.update_one({"_id": symptom_id},
                                               {"$set": document})
-        if not result.modified_count:
+        if not result.matched_count:
             raise SymptomNotFoundException(identifier=symptom_id)
 
     @staticmethod
@@ -201,3 +451,187 @@ class SymptomsRepository:
 #         assert result.acknowledged
 
 #         return result
+
+
+class SymptomsHistoryRepository:
+    """Full history of the symptom check-ins, kept when the person documents only keep the latest ones
+    (symptoms_window setting). Check-ins are stored on buckets, one per person and day"""
+    collection = symptomsHistory
+    indexes = [
+        IndexModel([("contact_id", ASCENDING), ("day", ASCENDING)], name="contact_id_day", background=True),
+        IndexModel([("day", ASCENDING)], name="day", background=True),
+        IndexModel([("symptoms.location", GEOSPHERE)], name="symptoms_location", background=True),
+    ]
+    """Indexes required by the queries of this repository, created by indexes.ensure_indexes (built in background,
+    so the collections are not locked meanwhile)"""
+    query_shapes = [
+        ("contact_id", "day"),
+        ("day",),
+        ("symptoms.location",),
+    ]
+    """Fields (equality first, then sort/range) of the queries performed by this repository"""
+
+    @staticmethod
+    def add(checkins: List[Tuple[str, dict]]):
+        """Append (person id, symptom document) check-ins to the history, if kept"""
+        operations = symptoms_history_operations(checkins)
+        if operations:
+            symptomsHistory.bulk_write(operations, ordered=False)
+
+    @staticmethod
+    def list(contact_id: str,
+             from_time: Optional[int] = None,
+             to_time: Optional[int] = None,
+             limit: int = api_settings.page_size,
+             cursor: Optional[str] = None) -> SymptomCheckinsPage:
+        """Retrieve a page of the symptom check-ins of a person, newest first, optionally within a time range.
+        Buckets are read, newest day first, until the page is complete"""
+        upper, skip = checkins_cursor_range(to_time, cursor)
+        query = {"contact_id": contact_id}
+        days = checkins_days(from_time, upper)
+        if days:
+            query["day"] = days
+
+        documents = list()
+        # Buckets are fetched in small batches, as a page usually needs only a few days
+        for bucket in symptomsHistory.find(query).sort("day", DESCENDING).batch_size(2):
+            documents.extend(bucket_checkins(bucket, from_time, upper))
+            if len(documents) > limit + skip:
+                break
+        if not documents and not collection.count_documents({"_id": contact_id}, limit=1):
+            raise ContactNotFoundException(identifier=contact_id)
+        return checkins_page(documents, limit, upper, skip)
+
+
+class StatsRepository:
+    """Summaries computed with aggregation pipelines, on the server.
+    Pipelines may use disk for the $group/$sort stages (allowDiskUse), if the data does not fit in memory"""
+
+    @staticmethod
+    def symptoms(group_by: List[StatsDimension],
+                 from_time: Optional[int] = None,
+                 to_time: Optional[int] = None,
+                 regions: Optional[dict] = None) -> List[SymptomsStats]:
+        """Count the symptom check-ins (total and suspicious) within a time range,
+        optionally of some regions ({dimension: code}), grouped by the given dimensions"""
+        pipeline = symptoms_stats_pipeline(group_by, from_time, to_time, regions)
+        source = collection if mongo_settings.symptoms_window <= 0 else symptomsHistory
+        return symptoms_stats(list(source.aggregate(pipeline, allowDiskUse=True)))
+
+    @staticmethod
+    def alarmSignals(group_by: List[StatsDimension],
+                     from_time: Optional[int] = None,
+                     to_time: Optional[int] = None,
+                     regions: Optional[dict] = None) -> List[AlarmSignalsStats]:
+        """Count the alarm signal reports (total and positives of each question) within a time range,
+        optionally of some regions ({dimension: code}), grouped by the given dimensions"""
+        pipeline = alarm_signals_stats_pipeline(group_by, from_time, to_time, regions)
+        return alarm_signals_stats(list(collection.aggregate(pipeline, allowDiskUse=True)))
+
+    @staticmethod
+    def comorbidities(group_by: List[StatsDimension], regions: Optional[dict] = None) -> List[ComorbiditiesStats]:
+        """Count the persons with each comorbidity, optionally of some regions ({dimension: code}),
+        grouped by the given dimensions"""
+        pipeline = comorbidities_stats_pipeline(group_by, regions)
+        return comorbidities_stats(list(collection.aggregate(pipeline, allowDiskUse=True)))
+
+
+class RollupsRepository:
+    """Counters per day and department, incremented on each write, so they can be read without aggregating"""
+    collection = rollups
+    indexes = [
+        IndexModel([("department", ASCENDING), ("day", ASCENDING)], name="department_day", background=True),
+    ]
+    """Indexes required by the queries of this repository, created by indexes.ensure_indexes (built in background,
+    so the collections are not locked meanwhile)"""
+    query_shapes = [
+        ("department", "day"),
+    ]
+    """Fields (equality first, then sort/range) of the queries performed by this repository"""
+
+    @staticmethod
+    def add(events: List[RollupEvent]):
+        """Increment the rollups counters with the given events, if maintained"""
+        operations = rollup_operations(events)
+        if operations:
+            rollups.bulk_write(operations, ordered=False)
+
+    @staticmethod
+    def list(from_day: str, to_day: str, department: Optional[str] = None) -> List[Rollup]:
+        """Retrieve the rollups of a range of days (YYYY-MM-DD), of a department or of all of them (None)"""
+        cursor = rollups.find({"department": department, "day": {"$gte": from_day, "$lte": to_day}})
+        return [Rollup(**document) for document in cursor.sort("day", ASCENDING)]
+
+
+class TombstonesRepository:
+    """Ids of the deleted persons, with their deletion time, so the incremental syncs (changes) can return them"""
+    collection = tombstones
+    indexes = [
+        IndexModel(TOMBSTONES_SORT, name="deleted_id", background=True),
+    ]
+    """Indexes required by the queries of this repository, created by indexes.ensure_indexes (built in background,
+    so the collections are not locked meanwhile)"""
+    query_shapes = [
+        ("deleted", "_id"),
+    ]
+    """Fields (equality first, then sort/range) of the queries performed by this repository"""
+
+    @staticmethod
+    def add(contact_id: str):
+        tombstones.replace_one({"_id": contact_id}, {"deleted": get_time()}, upsert=True)
+
+    @staticmethod
+    def list(since: int, until: int, after: Optional[list], limit: int) -> List[dict]:
+        """Retrieve the tombstones of the persons deleted on (since, until], after the given (deleted, id) position"""
+        cursor = tombstones.find(changes_query("deleted", since, until, after))
+        return list(cursor.sort(TOMBSTONES_SORT).limit(limit))
+
+
+class GeoRepository:
+    """Geospatial queries of the symptom check-ins, on their location (GeoJSON point, 2dsphere indexes).
+    Check-ins are read from the persons, or from the symptoms history if kept (symptoms_window setting)"""
+
+    @staticmethod
+    def _checkins(area: dict, suspicious_only: bool, from_time: Optional[int], to_time: Optional[int],
+                  limit: int) -> List[GeoCheckin]:
+        pipeline = geo_checkins_pipeline(area, suspicious_only, from_time, to_time, limit)
+        source = collection if mongo_settings.symptoms_window <= 0 else symptomsHistory
+        return [GeoCheckin(**document) for document in source.aggregate(pipeline)]
+
+    @staticmethod
+    def near(latitude: float, longitude: float, radius_km: float,
+             suspicious_only: bool = True,
+             from_time: Optional[int] = None,
+             to_time: Optional[int] = None,
+             limit: int = api_settings.page_size) -> List[GeoCheckin]:
+        """Retrieve the latest check-ins located within a distance (km) of a point, newest first"""
+        area = circle_area(latitude, longitude, radius_km)
+        return GeoRepository._checkins(area, suspicious_only, from_time, to_time, limit)
+
+    @staticmethod
+    def within(south: float, west: float, north: float, east: float,
+               suspicious_only: bool = True,
+               from_time: Optional[int] = None,
+               to_time: Optional[int] = None,
+               limit: int = api_settings.page_size) -> List[GeoCheckin]:
+        """Retrieve the latest check-ins located inside a bounding box (latitudes and longitudes), newest first"""
+        area = box_area(south, west, north, east)
+        return GeoRepository._checkins(area, suspicious_only, from_time, to_time, limit)
+
+
+class HeatmapRepository:
+    """Heatmap tiles of the suspicious check-ins, incremented on each check-in, so they can be read without
+    aggregating. Each tile (geohash, identified by _id) is a document with the counts of its cells"""
+
+    @staticmethod
+    def add(symptoms: List[dict]):
+        """Increment the heatmap tiles with the check-ins (symptom documents), if maintained"""
+        operations = heatmap_operations(symptoms)
+        if operations:
+            heatmap.bulk_write(operations, ordered=False)
+
+    @staticmethod
+    def get(tile: str) -> HeatmapTile:
+        """Retrieve a heatmap tile, given its geohash"""
+        validate_tile(tile)
+        return heatmap_tile(tile, heatmap.find_one({"_id": tile}))
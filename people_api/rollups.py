@@ -0,0 +1,118 @@
+"""ROLLUPS
+Rebuild of the rollups counters from the stored persons (and symptoms history, if kept), to repair drift
+(e.g. writes done while the rollups were not maintained). The persons are processed in parallel chunks.
+Can be run as a command: python -m people_api.rollups rebuild [workers]
+"""
+
+# # Native # #
+import re
+import sys
+import logging
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Tuple, Iterator
+
+# # Package # #
+from .database import collection, symptomsHistory, rollups
+from .repositories import RollupsRepository
+from .queries import (RollupEvent, ROLLUP_PROJECTION, department_code, registration_counters, checkin_counters,
+                      alarm_signal_counters, rollup_increments, rollup_id)
+from .settings import mongo_settings
+from .utils import parse_timestamp
+
+__all__ = ("rebuild",)
+
+CHUNKS = [re.compile(f"^{character}") for character in "0123456789abcdef"] + [{"$not": re.compile("^[0-9a-f]")}]
+"""Queries of the person ids of each chunk: by the first character of the ids (UUIDs), plus the other ids"""
+
+logger = logging.getLogger(__name__)
+
+
+def _chunk_events(ids_query) -> Iterator[RollupEvent]:
+    """Iterate the rollup events (registrations, check-ins and alarm signal reports) of the persons of a chunk.
+    The check-in times stored as ISO date strings (persons registered with symptoms) are converted;
+    the check-ins without a valid time are skipped"""
+    history = mongo_settings.symptoms_window > 0
+    projection = {"created": 1, "comorbidity": 1, "alarm_signals": 1, **ROLLUP_PROJECTION}
+    if not history:
+        projection["symptoms"] = 1
+
+    departments = dict()
+    checkins = list()
+    for person in collection.find({"_id": ids_query}, projection):
+        department = departments[person["_id"]] = department_code(person)
+        if "created" in person:
+            yield person["created"], department, registration_counters(person)
+        for alarm_signal in person.get("alarm_signals") or []:
+            yield alarm_signal["updated"], department, alarm_signal_counters(alarm_signal)
+        symptoms = person.get("symptoms")
+        checkins.extend((symptom, department) for symptom in (symptoms if isinstance(symptoms, list) else []))
+
+    if history:
+        for bucket in symptomsHistory.find({"contact_id": ids_query}):
+            department = departments.get(bucket["contact_id"])
+            checkins.extend((symptom, department) for symptom in bucket["symptoms"])
+
+    skipped = 0
+    for symptom, department in checkins:
+        timestamp = parse_timestamp(symptom.get("updated")) if isinstance(symptom, dict) else None
+        if timestamp is None:
+            skipped += 1
+            continue
+        yield timestamp, department, checkin_counters(symptom)
+    if skipped:
+        logger.warning("Check-ins skipped on rebuild, without a valid time: %d", skipped)
+
+
+def _chunk_increments(ids_query) -> Dict[Tuple[str, Optional[str]], Counter]:
+    return rollup_increments(list(_chunk_events(ids_query)))
+
+
+def _rollup_document(day: str, department: Optional[str], counters: Counter) -> dict:
+    """Return the rollup document of a day and department, given its counters (nested by their dotted names)"""
+    document = {"_id": rollup_id(day, department), "day": day, "department": department}
+    for name, value in counters.items():
+        if value:
+            if "." in name:
+                group, question = name.split(".")
+                document.setdefault(group, dict())[question] = value
+            else:
+                document[name] = value
+    return document
+
+
+def rebuild(workers: int = 4) -> int:
+    """Recompute all the rollups from the stored data, and return the number of rollups written.
+    The rollups are written to a temporary collection, that then replaces the rollups collection at once.
+    Increments done while rebuilding are lost, and the counters of deleted persons are not recomputed"""
+    totals = defaultdict(Counter)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for increments in executor.map(_chunk_increments, CHUNKS):
+            for key, counters in increments.items():
+                totals[key].update(counters)
+
+    documents = [_rollup_document(day, department, counters) for (day, department), counters in totals.items()]
+    if not documents:
+        rollups.delete_many({})
+        return 0
+
+    temporary = rollups.database[f"{rollups.name}_rebuild"]
+    temporary.drop()
+    temporary.insert_many(documents)
+    temporary.rename(rollups.name, dropTarget=True)
+    rollups.create_indexes(RollupsRepository.indexes)
+    return len(documents)
+
+
+def main(command: str = "rebuild", workers: str = "4"):
+    if command == "rebuild":
+        logging.basicConfig(level=logging.INFO)
+        logger.info(f"Rollups rebuilt: {rebuild(int(workers))}")
+    else:
+        print("Usage: python -m people_api.rollups rebuild [workers]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,42 @@
+"""SERIALIZATION
+Serialization of the persons built with trusted reads (ContactRead.construct, see queries.contact_read).
+Their values are kept as stored, which are JSON-ready, so they are serialized without validating them again.
+The values stored with a different type than the one returned by the Read models are normalized
+"""
+
+# # Native # #
+from typing import Optional
+
+# # Installed # #
+from pydantic.validators import bool_validator
+
+# # Package # #
+from .models import ContactRead
+from .queries import SYMPTOM_QUESTIONS
+from .utils import parse_timestamp
+
+__all__ = ("trusted_dict", "trusted_checkin")
+
+
+def trusted_checkin(symptom: Optional[dict]) -> Optional[dict]:
+    """Return a stored symptom check-in as returned by the Read models (SymptomCheckin): the answers stored
+    as strings ("true"/"false") as booleans, and the time stored as ISO date string as timestamp"""
+    if not symptom:
+        return symptom
+    checkin = {key: value for key, value in symptom.items() if value is not None}
+    for question in SYMPTOM_QUESTIONS:
+        if question in checkin:
+            checkin[question] = bool_validator(checkin[question])
+    if "updated" in checkin:
+        checkin["updated"] = parse_timestamp(checkin["updated"])
+    return checkin
+
+
+def trusted_dict(contact: ContactRead) -> dict:
+    """Return the JSON-ready body of a person built with trusted reads, without the null fields (as the Read models)"""
+    values = {key: value for key, value in contact.__dict__.items() if value is not None}
+    if "symptoms" in values:
+        values["symptoms"] = [trusted_checkin(symptom) for symptom in values["symptoms"]]
+    if "latest_symptom" in values:
+        values["latest_symptom"] = trusted_checkin(values["latest_symptom"])
+    return values
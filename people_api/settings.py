@@ -2,10 +2,14 @@
 Settings loaders using Pydantic BaseSettings classes (load from environment variables / dotenv file)
 """
 
+# # Native # #
+from typing import List
+
 # # Installed # #
 import pydantic
 
-__all__ = ("api_settings", "mongo_settings")
+__all__ = ("api_settings", "mongo_settings", "cache_settings", "profiling_settings", "events_settings",
+           "idempotency_settings")
 
 
 class BaseSettings(pydantic.BaseSettings):
@@ -18,6 +22,19 @@ class APISettings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 5000
     log_level: str = "INFO"
+    page_size: int = 100
+    """Default number of items returned by list endpoints"""
+    max_page_size: int = 1000
+    """Maximum number of items that can be requested per page on list endpoints"""
+    export_batch_size: int = 1000
+    """Number of documents fetched from Mongo, and written to the response, at once on export endpoints"""
+    batch_max_size: int = 1000
+    """Maximum number of items accepted on a single request by batch endpoints"""
+    geo_max_radius_km: float = 100
+    """Maximum radius (km) of the geospatial queries around a point"""
+    trusted_reads: bool = False
+    """Return the persons read (get, list) as stored, without validating them with the Read model,
+    and serialize them with orjson. Only safe while all the documents are written by this API"""
 
     class Config(BaseSettings.Config):
         env_prefix = "API_"
@@ -29,10 +46,102 @@ class MongoSettings(BaseSettings):
     collection: str = "people"
     symptoms_collection: str = "symptoms"
     comorbidity_collection: str = "comorbidities"
+    symptoms_history_collection: str = "symptoms_history"
+    """Collection of the full symptom check-ins history, bucketed by person and day (used with symptoms_window)"""
+    rollups_collection: str = "rollups"
+    """Collection of the counters per day and region, maintained on writes (see rollups)"""
+    rollups: bool = True
+    """Maintain the rollups counters on each registration, symptom check-in and alarm signal"""
+    tombstones_collection: str = "tombstones"
+    """Collection of the ids of the deleted persons, with their deletion time, for the incremental sync (changes)"""
+    idempotency_collection: str = "idempotency_keys"
+    """Collection of the results of the write requests sent with an Idempotency-Key (see idempotency)"""
+    heatmap_collection: str = "heatmap"
+    """Collection of the heatmap tiles: counts of suspicious check-ins per geohash cell, maintained on writes"""
+    heatmap: bool = True
+    """Maintain the heatmap tiles on each symptom check-in"""
+    heatmap_tiles: List[int] = [1, 2, 3, 4]
+    """Geohash lengths of the heatmap tiles (zoom levels). Each tile has the counts of its cells,
+    which are 2 characters longer (e.g. tiles of 4 characters count the check-ins per cell of 6 characters)"""
+    symptoms_window: int = 0
+    """Number of latest symptom check-ins kept on the person document. If set, the full history is kept on the
+    symptoms history collection instead. 0 keeps all the check-ins on the person document (unbounded)"""
+    backend: str = "sync"
+    """Repository backend used by the routes: "sync" (pymongo, on the threadpool) or "async" (motor)"""
+    create_indexes: bool = True
+    """Create the indexes declared on the repositories when the API starts"""
 
     class Config(BaseSettings.Config):
         env_prefix = "MONGO_"
 
 
+class CacheSettings(BaseSettings):
+    enabled: bool = True
+    backend: str = "memory"
+    """Cache backend; "memory" is an in-process LRU cache, per worker"""
+    max_size: int = 10000
+    """Maximum number of cached entries"""
+    ttl: float = 30
+    """Seconds an entry is cached. Bounds the staleness of entries not invalidated (e.g. written by other workers)"""
+
+    class Config(BaseSettings.Config):
+        env_prefix = "CACHE_"
+
+
+class ProfilingSettings(BaseSettings):
+    enabled: bool = False
+    """Allow profiling requests. When disabled, requests are never profiled (and the profiles endpoint returns 404)"""
+    sample_rate: float = 0
+    """Fraction (0 to 1) of the requests that are profiled, without requiring the profiling header"""
+    header: str = "X-Profile"
+    """Request header that asks to profile the request (any non-empty value)"""
+    allowed_hosts: List[str] = ["127.0.0.1"]
+    """Client hosts allowed to ask for profiling with the header, and to download profiles"""
+    interval: float = 0.001
+    """Seconds between the call-stack samples taken while a request is profiled"""
+    directory: str = "profiles"
+    """Directory where the profiles are stored"""
+    keep: int = 100
+    """Number of profiles kept on the directory; the oldest ones are deleted"""
+
+    class Config(BaseSettings.Config):
+        env_prefix = "PROFILING_"
+
+
+class EventsSettings(BaseSettings):
+    source: str = "auto"
+    """Source of the events: "change_streams" (watch the persons collection, requires a replica set), "bus" (published
+    by the repositories of this process), or "auto" (change streams if available, otherwise bus)"""
+    queue_size: int = 100
+    """Events queued per subscriber. When full (slow subscriber), the oldest queued events are dropped"""
+    max_subscribers: int = 100
+    """Maximum number of concurrent subscribers, per worker"""
+    keepalive: float = 15
+    """Seconds without events after which a keepalive comment is sent to the subscribers"""
+
+    class Config(BaseSettings.Config):
+        env_prefix = "EVENTS_"
+
+
+class IdempotencySettings(BaseSettings):
+    enabled: bool = True
+    """Honor the Idempotency-Key header of the write requests"""
+    ttl: int = 86400
+    """Seconds the result of a request is kept (and replayed) after it is first processed"""
+    pending_timeout: int = 60
+    """Seconds after which a key whose request did not end (e.g. its worker died) can be used again"""
+    cache_size: int = 1000
+    """Results kept in memory, in front of the idempotency collection. 0 disables the in-memory cache"""
+    max_response_size: int = 1048576
+    """Bytes of the largest response body stored. The results of larger responses are not kept"""
+
+    class Config(BaseSettings.Config):
+        env_prefix = "IDEMPOTENCY_"
+
+
 api_settings = APISettings()
 mongo_settings = MongoSettings()
+cache_settings = CacheSettings()
+profiling_settings = ProfilingSettings()
+events_settings = EventsSettings()
+idempotency_settings = IdempotencySettings()
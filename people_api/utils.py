@@ -3,11 +3,18 @@ Misc helpers/utils functions
 """
 
 # # Native # #
+import json
+import base64
+import binascii
 from time import time
 from uuid import uuid4
-from typing import Union
+from datetime import datetime, timezone
+from typing import Union, Optional
 
-__all__ = ("get_time", "get_uuid")
+__all__ = ("get_time", "parse_timestamp", "get_uuid", "encode_cursor", "decode_cursor", "encode_geohash",
+           "GEOHASH_ALPHABET")
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
 
 
 def get_time(seconds_precision=True) -> Union[int, float]:
@@ -15,6 +22,63 @@ def get_time(seconds_precision=True) -> Union[int, float]:
     return time() if not seconds_precision else int(time())
 
 
+def parse_timestamp(value) -> Optional[int]:
+    """Returns the Unix/Epoch timestamp (seconds precision) of a time stored as timestamp or as ISO date(time) string
+    (naive ones are taken as UTC). Returns None if the value is not a valid time"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
 def get_uuid() -> str:
     """Returns an unique UUID (UUID4)"""
     return str(uuid4())
+
+
+def encode_cursor(*values) -> str:
+    """Returns an opaque, URL-safe cursor string that encodes the given (JSON serializable) values"""
+    data = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """Returns the list of values encoded on a cursor returned by encode_cursor.
+    Raises ValueError if the cursor is not valid"""
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as ex:
+        raise ValueError("Invalid cursor") from ex
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int) -> str:
+    """Returns the geohash (of the given length) of the cell that contains a point"""
+    latitude_range, longitude_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash, value, bits, is_longitude = list(), 0, 0, True
+    while len(geohash) < precision:
+        # bits alternate between longitude and latitude, halving the range of the coordinate each time
+        bounds, coordinate = (longitude_range, longitude) if is_longitude else (latitude_range, latitude)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        is_longitude = not is_longitude
+        bits += 1
+        if bits == 5:
+            geohash.append(GEOHASH_ALPHABET[value])
+            value, bits = 0, 0
+    return "".join(geohash)
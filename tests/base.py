@@ -42,23 +42,63 @@ class BaseTest:
 
     # # API Methods # #
 
-    def get_person(self, person_id: str, statuscode: int = 200):
-        r = httpx.get(f"{self.api_url}/people/{person_id}")
+    def get_person(self, person_id: str, statuscode: int = 200, headers: dict = None, **params):
+        r = httpx.get(f"{self.api_url}/people/{person_id}", params=params, headers=headers)
         assert r.status_code == statuscode, r.text
         return r
 
-    def list_people(self, statuscode: int = 200):
-        r = httpx.get(f"{self.api_url}/people")
+    def list_people(self, statuscode: int = 200, **params):
+        r = httpx.get(f"{self.api_url}/people", params=params)
         assert r.status_code == statuscode, r.text
         return r
 
-    def create_person(self, create: dict, statuscode: int = 201):
-        r = httpx.post(f"{self.api_url}/people", json=create)
+    def list_people_changes(self, statuscode: int = 200, **params):
+        r = httpx.get(f"{self.api_url}/people/changes", params=params)
         assert r.status_code == statuscode, r.text
         return r
 
-    def update_person(self, person_id: str, update: dict, statuscode: int = 204):
-        r = httpx.patch(f"{self.api_url}/people/{person_id}", json=update)
+    def list_person_symptoms(self, person_id: str, statuscode: int = 200, **params):
+        r = httpx.get(f"{self.api_url}/people/{person_id}/symptoms", params=params)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def list_symptoms(self, statuscode: int = 200, **params):
+        r = httpx.get(f"{self.api_url}/symptoms", params=params)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def export_people(self, statuscode: int = 200, **params):
+        r = httpx.get(f"{self.api_url}/people/export", params=params)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def create_person(self, create: dict, statuscode: int = 201, headers: dict = None):
+        r = httpx.post(f"{self.api_url}/people", json=create, headers=headers)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def upsert_person(self, doc_type: str, doc_number: str, upsert: dict, statuscode: int = 201):
+        r = httpx.put(f"{self.api_url}/people/by-document/{doc_type}/{doc_number}", json=upsert)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def create_people_batch(self, creates: list, statuscode: int = 200):
+        r = httpx.post(f"{self.api_url}/people:batch", json=creates)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def update_person(self, person_id: str, update: dict, statuscode: int = 204, headers: dict = None):
+        r = httpx.patch(f"{self.api_url}/people/{person_id}", json=update, headers=headers)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def add_symptom(self, person_id: str, update: dict, statuscode: int = 204, headers: dict = None):
+        r = httpx.patch(f"{self.api_url}/people-symptom/{person_id}", json=update, headers=headers)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def add_symptoms_batch(self, items: list, statuscode: int = 200):
+        r = httpx.patch(f"{self.api_url}/people-symptom:batch", json=items)
         assert r.status_code == statuscode, r.text
         return r
 
@@ -66,3 +106,24 @@ class BaseTest:
         r = httpx.delete(f"{self.api_url}/people/{person_id}")
         assert r.status_code == statuscode, r.text
         return r
+
+    def get_stats(self, name: str, statuscode: int = 200, **params):
+        r = httpx.get(f"{self.api_url}/stats/{name}", params=params)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def get_checkins(self, area: str, statuscode: int = 200, **params):
+        r = httpx.get(f"{self.api_url}/checkins/{area}", params=params)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def get_heatmap_tile(self, tile: str, statuscode: int = 200, etag: str = None):
+        headers = {"If-None-Match": etag} if etag else {}
+        r = httpx.get(f"{self.api_url}/heatmap/{tile}", headers=headers)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def get_metrics(self, statuscode: int = 200):
+        r = httpx.get(f"{self.api_url}/metrics")
+        assert r.status_code == statuscode, r.text
+        return r
@@ -0,0 +1,57 @@
+"""TEST CACHE
+Test the in-process LRU cache backend used by the repositories
+"""
+
+# # Installed # #
+from freezegun import freeze_time
+
+# # Project # #
+from people_api.cache import LRUCache
+
+
+class TestLRUCache:
+    def test_get_set(self):
+        """Set a value and get it.
+        Should return the value, and count a hit"""
+        cache = LRUCache(max_size=10, ttl=60)
+        cache.set("key", "value")
+
+        assert cache.get("key") == "value"
+        assert cache.get("other") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_evict_least_recently_used(self):
+        """Set more values than the max size, after reading the first one.
+        Should evict the least recently used value"""
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_expire(self):
+        """Set a value and get it after the TTL.
+        Should not return the value"""
+        with freeze_time("2020-01-01 00:00:00") as frozen_time:
+            cache = LRUCache(max_size=10, ttl=60)
+            cache.set("key", "value")
+            frozen_time.tick(61)
+            assert cache.get("key") is None
+
+    def test_invalidate_tag(self):
+        """Set values with different tags, and invalidate one of the tags.
+        Should remove only the values with that tag"""
+        cache = LRUCache(max_size=10, ttl=60)
+        cache.set("id:1", "person 1", tags=["1"])
+        cache.set("imei:111", "person 1", tags=["1"])
+        cache.set("id:2", "person 2", tags=["2"])
+        cache.invalidate("1")
+
+        assert cache.get("id:1") is None
+        assert cache.get("imei:111") is None
+        assert cache.get("id:2") == "person 2"
@@ -0,0 +1,83 @@
+"""TEST EVENTS
+Test the events bus (fan-out, filters and slow subscribers), and the events of the persons change stream
+"""
+
+# # Native # #
+import asyncio
+
+# # Installed # #
+import pytest
+
+# # Project # #
+from people_api.events import EventBus, Subscription, _change_events
+from people_api.exceptions import TooManySubscribersException
+from people_api.models import CaseEvent, EventType
+from people_api.utils import get_time, get_uuid
+
+
+def get_event(event_type: EventType = EventType.suspicious_case, department: str = None) -> CaseEvent:
+    return CaseEvent(type=event_type, contact_id=get_uuid(), time=get_time(), department=department)
+
+
+def test_events_filtered_by_subscription():
+    """Having subscriptions filtered by type and department, publish events of different types and departments.
+    Should deliver to each subscription only the events that match its filters"""
+    async def run():
+        bus = EventBus()
+        alarms = bus.subscribe(types={EventType.alarm_signal})
+        lima = bus.subscribe(department="LIM")
+        events = [get_event(EventType.alarm_signal, "CUS"), get_event(department="LIM"), get_event(department="CUS")]
+        bus.publish(events)
+        return [await alarms.get(timeout=1), await alarms.get(timeout=0.01)], \
+               [await lima.get(timeout=1), await lima.get(timeout=0.01)], events
+
+    alarms, lima, events = asyncio.run(run())
+    assert alarms == [events[0], None]
+    assert lima == [events[1], None]
+
+
+def test_slow_subscriber_drops_oldest_events():
+    """Having a subscription with a queue of 2 events, publish 5 events before reading them.
+    Should keep the latest 2 events, and count the 3 dropped ones"""
+    async def run():
+        subscription = Subscription(queue_size=2)
+        events = [get_event() for _ in range(5)]
+        for event in events:
+            subscription.put(event)
+        return [await subscription.get(timeout=1) for _ in range(2)], subscription.pop_dropped(), events
+
+    received, dropped, events = asyncio.run(run())
+    assert received == events[-2:]
+    assert dropped == 3
+
+
+def test_max_subscribers():
+    """Subscribe more than the maximum subscribers, and unsubscribe one of them.
+    Should reject the subscription over the maximum, and accept it again after unsubscribing"""
+    async def run():
+        bus = EventBus(max_subscribers=1)
+        subscription = bus.subscribe()
+        with pytest.raises(TooManySubscribersException):
+            bus.subscribe()
+        bus.unsubscribe(subscription)
+        bus.subscribe()
+
+    asyncio.run(run())
+
+
+def test_change_stream_events():
+    """Get the events of a change stream update that sets a suspicious check-in and a positive alarm signal.
+    Should return a suspicious case and an alarm signal events, with the department of the person"""
+    now = get_time()
+    change = {
+        "documentKey": {"_id": "person"},
+        "department": "LIM",
+        "fields": [
+            {"k": "latest_symptom", "v": {"is_suspicious": True, "updated": now}},
+            {"k": "latest_alarm_signal", "v": {"q1": False, "q3": True, "q6": False, "updated": now}},
+        ]
+    }
+    events = _change_events(change)
+    assert [event.type for event in events] == [EventType.suspicious_case, EventType.alarm_signal]
+    assert all(event.contact_id == "person" and event.department == "LIM" for event in events)
+    assert events[1].alarm_signals == ["q3"]
@@ -0,0 +1,116 @@
+"""TEST GEO
+Test the geospatial queries of the symptom check-ins
+"""
+
+# # Project # #
+from people_api.database import heatmap
+from people_api.repositories import ContactRepository
+from people_api.queries import geo_point
+from people_api.utils import encode_geohash
+
+# # Package # #
+from .base import BaseTest
+from .utils import *
+
+LIMA = ("-12.046374", "-77.042793")
+CALLAO = ("-12.056106", "-77.118430")
+CUSCO = ("-13.531950", "-71.967463")
+
+
+def add_checkin(location, is_suspicious: bool = True) -> str:
+    person = get_existing_person()
+    latitude, longitude = location
+    ContactRepository.addSymptom(person.contact_id, get_symptom_update(
+        latitude=latitude, longitude=longitude, is_suspicious=is_suspicious))
+    return person.contact_id
+
+
+class TestGeo(BaseTest):
+    def test_checkins_near(self):
+        """Having suspicious check-ins on three cities, find the check-ins within 20 km of one of them.
+        Should return the check-ins of the two close cities, with their location"""
+        lima, callao = add_checkin(LIMA), add_checkin(CALLAO)
+        add_checkin(CUSCO)
+
+        response = self.get_checkins("near", latitude=LIMA[0], longitude=LIMA[1], radius_km=20)
+        checkins = response.json()
+        assert sorted(checkin["contact_id"] for checkin in checkins) == sorted([lima, callao])
+        assert all(checkin["location"]["type"] == "Point" for checkin in checkins)
+
+    def test_checkins_within_suspicious_only(self):
+        """Having a suspicious and a non-suspicious check-in inside a box, and another outside, find the check-ins
+        inside the box, of suspicious cases or all of them.
+        Should return only the check-ins inside the box, filtered by suspicious case by default"""
+        suspicious = add_checkin(LIMA)
+        not_suspicious = add_checkin(CALLAO, is_suspicious=False)
+        add_checkin(CUSCO)
+        box = dict(south=-12.5, west=-77.5, north=-11.5, east=-76.5)
+
+        response = self.get_checkins("within", **box)
+        assert [checkin["contact_id"] for checkin in response.json()] == [suspicious]
+
+        response = self.get_checkins("within", suspicious_only=False, **box)
+        assert sorted(checkin["contact_id"] for checkin in response.json()) == sorted([suspicious, not_suspicious])
+
+    def test_checkins_within_invalid_box(self):
+        """Find the check-ins inside a box with the south edge over the north edge.
+        Should return status code 400"""
+        self.get_checkins("within", statuscode=400, south=-11, west=-78, north=-12, east=-77)
+
+    def test_checkin_without_valid_coordinates(self):
+        """Add a check-in with coordinates that are not valid.
+        Should store the check-in without location"""
+        contact_id = add_checkin(("not a latitude", "-77.0"))
+        [checkin] = self.list_person_symptoms(contact_id).json()
+        assert "location" not in checkin
+
+
+class TestHeatmap(BaseTest):
+    @classmethod
+    def setup_method(cls):
+        # The heatmap is incremented by the check-ins of the other tests too
+        heatmap.delete_many({})
+
+    @classmethod
+    def teardown_method(cls):
+        super().teardown_method()
+        heatmap.delete_many({})
+
+    def test_heatmap_tile(self):
+        """Having suspicious check-ins on two cells of a tile, and a non-suspicious one, get the tile.
+        Should return the count of suspicious check-ins on each cell"""
+        add_checkin(LIMA)
+        add_checkin(LIMA)
+        add_checkin(CALLAO)
+        add_checkin(LIMA, is_suspicious=False)
+        lima, callao = (encode_geohash(float(latitude), float(longitude), 5) for latitude, longitude in (LIMA, CALLAO))
+
+        tile = self.get_heatmap_tile(lima[:3]).json()
+        assert tile["precision"] == 5
+        assert tile["total"] == 3
+        assert tile["cells"] == {lima: 2, callao: 1}
+
+    def test_heatmap_tile_etag(self):
+        """Get a heatmap tile again with its ETag, before and after a new check-in on the tile.
+        Should return status code 304 while the tile is not updated"""
+        add_checkin(LIMA)
+        tile = encode_geohash(float(LIMA[0]), float(LIMA[1]), 2)
+        etag = self.get_heatmap_tile(tile).headers["ETag"]
+        self.get_heatmap_tile(tile, statuscode=304, etag=etag)
+
+        add_checkin(LIMA)
+        response = self.get_heatmap_tile(tile, etag=etag)
+        assert response.headers["ETag"] != etag
+        assert response.json()["total"] == 2
+
+    def test_heatmap_invalid_tile(self):
+        """Get a heatmap tile that is not a geohash.
+        Should return status code 400"""
+        self.get_heatmap_tile("6a", statuscode=400)
+
+
+def test_geo_point():
+    assert geo_point("-12.5", "-77") == {"type": "Point", "coordinates": [-77.0, -12.5]}
+    assert geo_point("-91", "-77") is None
+    assert geo_point("nan", "-77") is None
+    assert geo_point(None, None) is None
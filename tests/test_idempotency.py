@@ -0,0 +1,76 @@
+"""TEST IDEMPOTENCY
+Test the write requests sent with an Idempotency-Key header
+"""
+
+# # Installed # #
+from fastapi import status as statuscode
+
+# # Project # #
+from people_api.database import idempotency
+
+# # Package # #
+from .base import BaseTest
+from .test_metrics import get_samples
+from .utils import *
+
+
+class TestIdempotency(BaseTest):
+    @classmethod
+    def teardown_method(cls):
+        super().teardown_method()
+        idempotency.delete_many({})
+
+    def test_retried_symptom_added_once(self):
+        """Add a symptom to a person twice, with the same Idempotency-Key.
+        Should add the symptom once, and replay the result on the second request"""
+        person = get_existing_person()
+        update = get_symptom_update().dict()
+        headers = {"Idempotency-Key": get_uuid()}
+
+        response = self.add_symptom(person.contact_id, update, headers=headers)
+        assert "Idempotent-Replayed" not in response.headers
+        response = self.add_symptom(person.contact_id, update, headers=headers)
+        assert response.headers["Idempotent-Replayed"] == "true"
+        assert len(self.get_person(person.contact_id).json()["symptoms"]) == 1
+
+    def test_retried_create_replayed(self):
+        """Create a person twice, with the same Idempotency-Key.
+        Should create one person, and return it on both requests"""
+        create = get_person_create().dict()
+        headers = {"Idempotency-Key": get_uuid()}
+
+        created = self.create_person(create, headers=headers).json()
+        assert self.create_person(create, headers=headers).json() == created
+        assert len(self.list_people(doc_number=create["doc_number"]).json()) == 1
+
+    def test_key_reused_by_other_request(self):
+        """Add two different symptoms to a person, with the same Idempotency-Key.
+        Should return unprocessable 422 error on the second request"""
+        person = get_existing_person()
+        headers = {"Idempotency-Key": get_uuid()}
+
+        self.add_symptom(person.contact_id, get_symptom_update().dict(), headers=headers)
+        self.add_symptom(person.contact_id, get_symptom_update().dict(), headers=headers,
+                         statuscode=statuscode.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_error_result_replayed(self):
+        """Add a symptom to a person that does not exist, twice with the same Idempotency-Key.
+        Should return not found 404 error on both requests, the second one replayed"""
+        person_id = get_uuid()
+        update = get_symptom_update().dict()
+        headers = {"Idempotency-Key": get_uuid()}
+
+        self.add_symptom(person_id, update, headers=headers, statuscode=statuscode.HTTP_404_NOT_FOUND)
+        response = self.add_symptom(person_id, update, headers=headers, statuscode=statuscode.HTTP_404_NOT_FOUND)
+        assert response.headers["Idempotent-Replayed"] == "true"
+
+    def test_replay_metrics(self):
+        """Create a person twice, with the same Idempotency-Key.
+        Should count the replay"""
+        create = get_person_create().dict()
+        headers = {"Idempotency-Key": get_uuid()}
+        self.create_person(create, headers=headers)
+        self.create_person(create, headers=headers)
+
+        samples = get_samples(self.get_metrics().text)
+        assert samples[("people_api_idempotency_replays_total", (("source", "memory"),))] >= 1
@@ -0,0 +1,84 @@
+"""TEST INDEXES
+Test the creation of the indexes declared on the repositories
+"""
+
+# # Installed # #
+import pytest
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+# # Project # #
+from people_api.database import collection
+from people_api.indexes import ensure_indexes, get_index_report, get_duplicates_report
+from people_api.utils import get_uuid
+
+
+class TestIndexes:
+    def test_ensure_indexes(self):
+        """Create the indexes.
+        The report should not flag any repository query as unsupported"""
+        ensure_indexes()
+        assert get_index_report() == []
+
+    def test_ensure_indexes_idempotent(self):
+        """Create the indexes twice.
+        Should not fail"""
+        ensure_indexes()
+        ensure_indexes()
+
+    def test_ensure_indexes_replace_former_indexes(self):
+        """Having the former non-unique index of the documents, create the indexes.
+        Should build the unique index while the former one exists (same keys), then drop the former one"""
+        ensure_indexes()
+        collection.drop_index("doc_number_doc_type_unique")
+        collection.create_index([("doc_number", ASCENDING), ("doc_type", ASCENDING)], name="doc_number_doc_type")
+
+        ensure_indexes()
+        indexes = collection.index_information()
+        assert "doc_number_doc_type_unique" in indexes
+        assert "doc_number_doc_type" not in indexes
+
+    def test_ensure_indexes_conflicting_former_indexes(self, monkeypatch):
+        """Having the former non-unique index of the documents, create the indexes on a server that rejects
+        the unique index while the former one exists.
+        Should drop the former index first, then build the unique one"""
+        ensure_indexes()
+        collection.drop_index("doc_number_doc_type_unique")
+        collection.create_index([("doc_number", ASCENDING), ("doc_type", ASCENDING)], name="doc_number_doc_type")
+        create_indexes = collection.create_indexes
+
+        def create_indexes_conflicting(indexes):
+            if "doc_number_doc_type" in collection.index_information():
+                raise OperationFailure("Index already exists with a different name", code=85)
+            return create_indexes(indexes)
+
+        monkeypatch.setattr(collection, "create_indexes", create_indexes_conflicting)
+        ensure_indexes()
+        indexes = collection.index_information()
+        assert "doc_number_doc_type_unique" in indexes
+        assert "doc_number_doc_type" not in indexes
+
+    def test_ensure_indexes_duplicated_documents(self):
+        """Having the former non-unique index of the documents, and two persons with the same document,
+        create the indexes.
+        Should report the duplicated document on the dry-run, then fail with it, and keep the former index"""
+        ensure_indexes()
+        collection.drop_index("doc_number_doc_type_unique")
+        collection.create_index([("doc_number", ASCENDING), ("doc_type", ASCENDING)], name="doc_number_doc_type")
+        doc_number = get_uuid()
+        collection.insert_many([{"_id": get_uuid(), "doc_type": "DNI", "doc_number": doc_number} for _ in range(2)])
+
+        try:
+            [duplicates] = get_duplicates_report()
+            assert duplicates == (collection.name, "doc_number_doc_type_unique",
+                                  {"doc_number": doc_number, "doc_type": "DNI"}, 2)
+            assert "doc_number_doc_type_unique" not in collection.index_information()
+
+            with pytest.raises(DuplicateKeyError):
+                ensure_indexes()
+            indexes = collection.index_information()
+            assert "doc_number_doc_type" in indexes
+            assert "doc_number_doc_type_unique" not in indexes
+        finally:
+            collection.delete_many({"doc_number": doc_number})
+            ensure_indexes()
@@ -0,0 +1,44 @@
+"""TEST METRICS
+Test the Prometheus metrics endpoint
+"""
+
+# # Installed # #
+from prometheus_client.parser import text_string_to_metric_families
+
+# # Package # #
+from .base import BaseTest
+from .utils import *
+
+
+def get_samples(text: str) -> dict:
+    """Parse the metrics text into a dict of {(sample name, sorted labels): value}"""
+    return {(sample.name, tuple(sorted(sample.labels.items()))): sample.value
+            for family in text_string_to_metric_families(text)
+            for sample in family.samples}
+
+
+class TestMetrics(BaseTest):
+    def test_request_metrics_by_route(self):
+        """Get an existing person, and a non-existing route.
+        Should count the requests by route template, not by path"""
+        person = get_existing_person()
+        self.get_person(person.contact_id)
+        self.get_person(get_uuid(), statuscode=404)
+
+        samples = get_samples(self.get_metrics().text)
+        labels = (("method", "GET"), ("route", "/people/{contact_id}"), ("status", "200"))
+        assert samples[("people_api_requests_total", labels)] >= 1
+        labels = (("method", "GET"), ("route", "/people/{contact_id}"), ("status", "404"))
+        assert samples[("people_api_requests_total", labels)] >= 1
+        assert not any(("route", f"/people/{person.contact_id}") in labels for _, labels in samples)
+
+    def test_mongo_command_metrics(self):
+        """Get an existing person.
+        Should observe the duration of the find command on the people collection"""
+        person = get_existing_person()
+        self.get_person(person.contact_id, fields="name")
+
+        samples = get_samples(self.get_metrics().text)
+        assert any(name == "people_api_mongo_command_duration_seconds_count"
+                   and ("operation", "find") in labels and value >= 1
+                   for (name, labels), value in samples.items())
@@ -0,0 +1,68 @@
+"""TEST PROFILING
+Test the sampling profiler used to profile single requests
+"""
+
+# # Native # #
+import os
+import time
+import asyncio
+import threading
+
+# # Installed # #
+import pytest
+
+# # Project # #
+from people_api.profiling import Profile, get_profile_path
+from people_api.settings import profiling_settings
+from people_api.exceptions import ProfileNotFoundException
+from people_api.async_repositories import ThreadpoolRepository
+
+
+class SlowRepository:
+    @staticmethod
+    def slow_method():
+        time.sleep(0.05)
+        return threading.get_ident()
+
+
+@pytest.fixture(autouse=True)
+def profiles_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling_settings, "directory", str(tmp_path))
+    return tmp_path
+
+
+class TestProfile:
+    def test_profile_threadpool_calls(self):
+        """Profile a coroutine that calls a sync repository method on the threadpool.
+        Should sample the threadpool thread while it runs the method, and store the folded stacks"""
+        async def profiled():
+            async with Profile(name="GET /test") as profile:
+                await ThreadpoolRepository(SlowRepository).slow_method()
+            return profile
+
+        profile = asyncio.run(profiled())
+        assert any(";slow_method (test_profiling.py:" in stack for stack in profile.samples)
+
+        with open(get_profile_path(profile.id)) as file:
+            lines = file.read().splitlines()
+        assert lines
+        assert all(line.startswith("GET /test;") and line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    def test_keep_newest_profiles(self, monkeypatch, profiles_directory):
+        """Store more profiles than the ones to keep.
+        Should delete the oldest profiles"""
+        monkeypatch.setattr(profiling_settings, "keep", 2)
+        ids = list()
+        for _ in range(3):
+            with Profile(name="test") as profile:
+                pass
+            ids.append(profile.id)
+            time.sleep(0.01)
+
+        assert sorted(os.listdir(profiles_directory)) == sorted(f"{id}.folded" for id in ids[1:])
+
+    def test_get_unknown_profile(self):
+        """Get the path of a profile that does not exist.
+        Should raise ProfileNotFoundException"""
+        with pytest.raises(ProfileNotFoundException):
+            get_profile_path("../settings")
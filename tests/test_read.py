@@ -2,9 +2,23 @@
 Test read actions (get one, list)
 """
 
+# # Native # #
+import json
+import asyncio
+from datetime import datetime, date, time, timezone
+
 # # Installed # #
+import pytest
 from fastapi import status as statuscode
 
+# # Project # #
+from people_api.async_repositories import AsyncContactRepository
+from people_api.repositories import ContactRepository, SymptomsRepository
+from people_api.models import Symptoms, SymptomCreate
+from people_api.utils import encode_cursor
+from people_api.database import collection, tombstones
+from people_api.exceptions import ContactNotFoundException
+
 # # Package # #
 from .base import BaseTest
 from .utils import *
@@ -16,7 +30,7 @@ class TestGet(BaseTest):
         Should return the person"""
         person = get_existing_person()
 
-        response = self.get_person(person.person_id)
+        response = self.get_person(person.contact_id)
         assert response.json() == person.dict()
 
     def test_get_nonexisting_person(self):
@@ -27,6 +41,70 @@ class TestGet(BaseTest):
         response = self.get_person(person_id, statuscode=statuscode.HTTP_404_NOT_FOUND)
         assert response.json()["identifier"] == person_id
 
+    def test_get_person_fields(self):
+        """Having an existing person, get only some of its fields.
+        Should return only the requested fields and the person id"""
+        person = get_existing_person()
+
+        response = self.get_person(person.contact_id, fields="name,doc_number")
+        assert response.json() == {
+            "contact_id": person.contact_id,
+            "name": person.name,
+            "doc_number": person.doc_number
+        }
+
+    def test_get_person_unknown_fields(self):
+        """Having an existing person, get it requesting a field that does not exist.
+        Should return bad request 400 error"""
+        person = get_existing_person()
+        self.get_person(person.contact_id, fields="name,foo", statuscode=statuscode.HTTP_400_BAD_REQUEST)
+
+    def test_get_person_not_modified(self):
+        """Having an existing person, get it again with its ETag and with its Last-Modified date.
+        Should return not modified 304 responses with no body"""
+        person = get_existing_person()
+        response = self.get_person(person.contact_id)
+        etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+
+        response = self.get_person(person.contact_id, headers={"If-None-Match": etag},
+                                   statuscode=statuscode.HTTP_304_NOT_MODIFIED)
+        assert response.headers["ETag"] == etag
+        assert not response.content
+        self.get_person(person.contact_id, headers={"If-None-Match": f"W/{etag}"},
+                        statuscode=statuscode.HTTP_304_NOT_MODIFIED)
+        self.get_person(person.contact_id, headers={"If-Modified-Since": last_modified},
+                        statuscode=statuscode.HTTP_304_NOT_MODIFIED)
+
+    def test_get_person_modified(self):
+        """Having an existing person, update it and get it with its previous ETag.
+        Should return the updated person with a new ETag"""
+        person = get_existing_person()
+        etag = self.get_person(person.contact_id).headers["ETag"]
+        collection.update_one({"_id": person.contact_id}, {"$inc": {"version": 1}, "$set": {"name": "Updated"}})
+
+        response = self.get_person(person.contact_id, headers={"If-None-Match": etag})
+        assert response.json()["name"] == "Updated"
+        assert response.headers["ETag"] != etag
+
+    def test_get_person_modified_same_second(self):
+        """Having an existing person, update it twice (within the same second) and get it with the ETag
+        returned after the first update.
+        Should return the person with the second update, and a new ETag"""
+        person = get_existing_person()
+        self.update_person(person.contact_id, {"name": get_uuid()})
+        etag = self.get_person(person.contact_id).headers["ETag"]
+        new_name = get_uuid()
+        self.update_person(person.contact_id, {"name": new_name})
+
+        response = self.get_person(person.contact_id, headers={"If-None-Match": etag})
+        assert response.json()["name"] == new_name
+        assert response.headers["ETag"] != etag
+
+    def test_get_nonexisting_person_conditional(self):
+        """Get a person that does not exist, with an If-None-Match header.
+        Should return not found 404 error"""
+        self.get_person(get_uuid(), headers={"If-None-Match": "*"}, statuscode=statuscode.HTTP_404_NOT_FOUND)
+
 
 class TestList(BaseTest):
     def test_list_people(self):
@@ -34,5 +112,192 @@ class TestList(BaseTest):
         Should return all of them in array"""
         people = [get_existing_person() for _ in range(4)]
 
+        # Persons are listed sorted by (updated, id), so the order is not the creation order
         response = self.list_people()
-        assert response.json() == [p.dict() for p in people]
+        listed = sorted(response.json(), key=lambda p: p["contact_id"])
+        assert listed == [p.dict() for p in sorted(people, key=lambda p: p.contact_id)]
+
+    def test_list_people_paginated(self):
+        """Having multiple persons, list them in pages of 2, following the cursors.
+        Should return all of them once, and no cursor on the last page"""
+        people = [get_existing_person() for _ in range(5)]
+
+        listed_ids = list()
+        cursor = None
+        for expected_length in (2, 2, 1):
+            params = dict(limit=2, cursor=cursor) if cursor else dict(limit=2)
+            response = self.list_people(**params)
+            assert len(response.json()) == expected_length
+            listed_ids.extend(p["contact_id"] for p in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+
+        assert cursor is None
+        assert sorted(listed_ids) == sorted(p.contact_id for p in people)
+
+    def test_list_people_filtered(self):
+        """Having multiple persons, list them filtering by document number.
+        Should return only the matching person"""
+        people = [get_existing_person(doc_number=str(i)) for i in range(3)]
+
+        response = self.list_people(doc_number="1")
+        assert [p["contact_id"] for p in response.json()] == [people[1].contact_id]
+
+    def test_list_people_invalid_cursor(self):
+        """List persons with a malformed cursor.
+        Should return bad request 400 error"""
+        self.list_people(cursor="foo", statuscode=statuscode.HTTP_400_BAD_REQUEST)
+
+
+class TestChanges(BaseTest):
+    @classmethod
+    def teardown_method(cls):
+        super().teardown_method()
+        tombstones.delete_many({})
+
+    @staticmethod
+    def get_existing_person_updated(updated: int):
+        # The changes of the current second are not returned yet, so the persons are set as updated before
+        person = get_existing_person()
+        collection.update_one({"_id": person.contact_id}, {"$set": {"updated": updated}})
+        return person
+
+    def test_changes_since_checkpoint(self):
+        """Having persons updated before and after a checkpoint, get the changes since the checkpoint.
+        Should return only the persons updated after it, and a newer checkpoint"""
+        self.get_existing_person_updated(100)
+        person = self.get_existing_person_updated(200)
+
+        result = self.list_people_changes(since=150).json()
+        assert [item["contact_id"] for item in result["items"]] == [person.contact_id]
+        assert result["deleted"] == []
+        assert result["checkpoint"] >= 200
+        assert result["next_cursor"] is None
+
+        result = self.list_people_changes(since=result["checkpoint"]).json()
+        assert result["items"] == []
+
+    def test_changes_deleted(self):
+        """Delete a person, and get the changes.
+        Should return the id of the deleted person"""
+        person = self.get_existing_person_updated(100)
+        self.delete_person(person.contact_id)
+        tombstones.update_one({"_id": person.contact_id}, {"$set": {"deleted": 200}})
+
+        result = self.list_people_changes(since=150).json()
+        assert result["items"] == []
+        assert result["deleted"] == [person.contact_id]
+
+    def test_changes_paginated(self):
+        """Having persons updated on the same second, get the changes by pages of 2 persons.
+        Should return all the persons, on two pages"""
+        people = [self.get_existing_person_updated(100) for _ in range(3)]
+
+        first = self.list_people_changes(limit=2).json()
+        second = self.list_people_changes(limit=2, cursor=first["next_cursor"]).json()
+        assert second["next_cursor"] is None
+        assert sorted(item["contact_id"] for item in first["items"] + second["items"]) == \
+            sorted(person.contact_id for person in people)
+
+    def test_changes_invalid_cursor(self):
+        """Get the changes with a malformed cursor.
+        Should return bad request 400 error"""
+        self.list_people_changes(cursor="foo", statuscode=statuscode.HTTP_400_BAD_REQUEST)
+
+    def test_changes_invalid_cursor_positions(self):
+        """Get the changes with cursors whose positions are not a (time, id) pair.
+        Should return bad request 400 error"""
+        for position in ([1], [1, "a", "b"], 1, "a", ["a", "b"]):
+            cursor = encode_cursor(0, 1, position, None)
+            self.list_people_changes(cursor=cursor, statuscode=statuscode.HTTP_400_BAD_REQUEST)
+            cursor = encode_cursor(0, 1, [], position)
+            self.list_people_changes(cursor=cursor, statuscode=statuscode.HTTP_400_BAD_REQUEST)
+
+
+class TestListSymptoms(BaseTest):
+    def test_list_symptoms_paginated(self):
+        """Having a person with check-ins, some of them at the same time, list them in pages of 2 within a range.
+        Should return the check-ins in range once, newest first, and no cursor on the last page"""
+        person = get_existing_person()
+        times = [100, 200, 200, 200, 300, 400]
+        checkins = [{**get_symptom_update().dict(), "updated": time} for time in times]
+        collection.update_one({"_id": person.contact_id}, {"$set": {"symptoms": checkins}})
+
+        listed = list()
+        cursor = None
+        for expected_length in (2, 2):
+            params = {"from": 150, "to": 300, "limit": 2, **({"cursor": cursor} if cursor else {})}
+            response = self.list_person_symptoms(person.contact_id, **params)
+            assert len(response.json()) == expected_length
+            listed.extend(response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+
+        assert cursor is None
+        assert [checkin["q10"] for checkin in listed] == [checkin["q10"] for checkin in reversed(checkins[1:5])]
+        assert [checkin["updated"] for checkin in listed] == [300, 200, 200, 200]
+
+    def test_list_symptoms_registered_symptoms(self):
+        """Having a person registered with symptoms (stored with their time as date string) and a check-in added,
+        list its check-ins, also within a range.
+        Should return both check-ins, newest first, with their time as timestamp"""
+        symptoms = Symptoms(**{f"q{i}": False for i in range(1, 10)}, is_suspicious=True)
+        person = get_existing_person(symptoms=[symptoms])
+        ContactRepository.addSymptom(person.contact_id, get_symptom_update())
+        registered = int(datetime.combine(date.today(), time(), timezone.utc).timestamp())
+
+        listed = self.list_person_symptoms(person.contact_id).json()
+        assert [checkin["is_suspicious"] for checkin in listed] == [False, True]
+        assert listed[1]["updated"] == registered
+        assert self.list_person_symptoms(person.contact_id, to=registered).json() == listed[1:]
+
+    def test_list_symptoms_nonexisting_person(self):
+        """List the check-ins of a person that does not exist.
+        Should return not found 404 error"""
+        self.list_person_symptoms(get_uuid(), statuscode=statuscode.HTTP_404_NOT_FOUND)
+
+
+class TestListSymptomsCollection(BaseTest):
+    def test_list_symptoms_filtered(self):
+        """Having symptoms of two persons on the symptoms collection, list all of them and those of one person.
+        Should return all the symptoms, and only the symptoms of the person when filtered"""
+        person_ids = [get_uuid(), get_uuid()]
+        created = [SymptomsRepository.create(SymptomCreate(**get_symptom_update().dict(), person_id=person_id))
+                   for person_id in person_ids]
+
+        listed = {symptom["symptom_id"] for symptom in self.list_symptoms().json()}
+        assert {symptom.symptom_id for symptom in created} <= listed
+        [symptom] = self.list_symptoms(person_id=person_ids[0]).json()
+        assert symptom["symptom_id"] == created[0].symptom_id
+
+
+class TestExport(BaseTest):
+    def test_export_people(self):
+        """Having multiple persons, export all of them.
+        Should return all of them as NDJSON, one person per line"""
+        people = [get_existing_person() for _ in range(4)]
+
+        response = self.export_people()
+        assert response.headers["content-type"] == "application/x-ndjson"
+
+        exported = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(p["contact_id"] for p in exported) == sorted(p.contact_id for p in people)
+
+
+class TestAsyncRepository(BaseTest):
+    # The Motor client binds to the first event loop it runs on, so all the tests must share the same loop
+    loop = asyncio.new_event_loop()
+
+    def test_async_get_existing_person(self):
+        """Having an existing person, get it through the async repository.
+        Should return the same person as the sync repository"""
+        person = get_existing_person()
+
+        read = self.loop.run_until_complete(AsyncContactRepository.get(person.contact_id))
+        assert read.dict() == person.dict()
+
+    def test_async_get_nonexisting_person(self):
+        """Get a person that does not exist through the async repository.
+        Should raise the same not found exception as the sync repository"""
+        person_id = get_uuid()
+
+        with pytest.raises(ContactNotFoundException):
+            self.loop.run_until_complete(AsyncContactRepository.get(person_id))
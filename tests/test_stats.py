@@ -0,0 +1,150 @@
+"""TEST STATS
+Test the stats endpoints (aggregation pipelines)
+"""
+
+# # Native # #
+from datetime import datetime
+
+# # Project # #
+from people_api.database import rollups
+from people_api.rollups import rebuild
+from people_api.models import Address, Comorbidity, Symptoms
+from people_api.models.alarm_signal_create import AlarmSignalCreate
+from people_api.models.department import Department
+from people_api.models.province import Province
+from people_api.repositories import ContactRepository
+
+# # Package # #
+from .base import BaseTest
+from .utils import *
+
+
+def get_person_in_department(code: str, **kwargs):
+    address = Address(street=get_uuid(), department=Department(code=code, name=code))
+    return get_existing_person(address=address, **kwargs)
+
+
+def get_alarm_signal(*positives: str):
+    return AlarmSignalCreate(**{f"q{i}": f"q{i}" in positives for i in range(1, 7)})
+
+
+class TestStats(BaseTest):
+    def test_symptoms_stats_by_department(self):
+        """Having persons of two departments with symptoms, get the symptoms stats grouped by department.
+        Should return the check-ins and suspicious counts of each department"""
+        for code, suspicious in (("LIM", True), ("LIM", False), ("CUS", True)):
+            person = get_person_in_department(code)
+            ContactRepository.addSymptom(person.contact_id, get_symptom_update(is_suspicious=suspicious))
+
+        response = self.get_stats("symptoms", group_by="department")
+        stats = {row["group"]["department"]: (row["checkins"], row["suspicious"]) for row in response.json()}
+        assert stats == {"CUS": (1, 1), "LIM": (2, 1)}
+
+    def test_symptoms_stats_by_day_registered_symptoms(self):
+        """Having a person registered with symptoms (stored with their time as date string) and a check-in added,
+        get the symptoms stats grouped by day.
+        Should count both check-ins by their day"""
+        symptoms = Symptoms(**{f"q{i}": False for i in range(1, 10)}, is_suspicious=True)
+        person = get_existing_person(symptoms=[symptoms])
+        ContactRepository.addSymptom(person.contact_id, get_symptom_update())
+
+        rows = self.get_stats("symptoms", group_by="day").json()
+        assert all(row["group"]["day"] for row in rows)
+        assert (sum(row["checkins"] for row in rows), sum(row["suspicious"] for row in rows)) == (2, 1)
+
+    def test_alarm_signals_stats_by_province(self):
+        """Having persons of two provinces of a department with alarm signals reported, and a person of another
+        department, get the alarm signals stats of the department grouped by day and province.
+        Should return the reports and positives of each province of that department, for the day of the reports"""
+        for province, positives in (("LIM01", ("q1", "q3")), ("LIM01", ("q3",)), ("LIM02", ("q6",)), (None, ("q1",))):
+            if province:
+                address = Address(street=get_uuid(), department=Department(code="LIM", name="LIM"),
+                                  province=Province(code=province, name=province))
+                person = get_existing_person(address=address)
+            else:
+                person = get_person_in_department("CUS")
+            ContactRepository.addAlarmSignal(person.contact_id, get_alarm_signal(*positives))
+
+        rows = self.get_stats("alarm-signals", group_by=["day", "province"], department="LIM").json()
+        assert {row["group"]["day"] for row in rows} == {datetime.utcnow().date().isoformat()}
+        stats = {row["group"]["province"]: (row["reports"], row["alarm_signals"]) for row in rows}
+        assert stats["LIM01"] == (2, {"q1": 1, "q2": 0, "q3": 2, "q4": 0, "q5": 0, "q6": 0})
+        assert stats["LIM02"] == (1, {"q1": 0, "q2": 0, "q3": 0, "q4": 0, "q5": 0, "q6": 1})
+
+    def test_comorbidities_stats_filtered(self):
+        """Having persons of two departments, one of them with comorbidities, get the comorbidities stats
+        of one department.
+        Should return the counts of the persons of that department"""
+        comorbidity = Comorbidity(**{f"q{i}": i == 1 for i in range(1, 17)})
+        get_person_in_department("LIM", comorbidity=comorbidity)
+        get_person_in_department("LIM")
+        get_person_in_department("CUS", comorbidity=comorbidity)
+
+        response = self.get_stats("comorbidities", group_by="department", department="LIM")
+        [row] = response.json()
+        assert (row["persons"], row["with_comorbidity"]) == (2, 1)
+        assert row["comorbidities"]["q1"] == 1 and row["comorbidities"]["q2"] == 0
+
+
+class TestRollups(BaseTest):
+    @classmethod
+    def setup_method(cls):
+        # The rollups are incremented by the writes of the other tests too
+        rollups.delete_many({})
+
+    @classmethod
+    def teardown_method(cls):
+        super().teardown_method()
+        rollups.delete_many({})
+
+    def get_today_rollups(self, **params):
+        return self.get_stats("rollups", **{"from": datetime.utcnow().date().isoformat(), **params}).json()
+
+    def test_rollups_counted_on_writes(self):
+        """Having persons of two departments created, with symptoms added, get the rollups of today.
+        Should return the counters of each department, or the total of all the departments if none is given"""
+        for code, suspicious in (("LIM", True), ("LIM", False), ("CUS", True)):
+            person = get_person_in_department(code)
+            ContactRepository.addSymptom(person.contact_id, get_symptom_update(is_suspicious=suspicious, q1="true"))
+
+        for department, counters in ((None, (3, 3, 2, 3)), ("LIM", (2, 2, 1, 2)), ("CUS", (1, 1, 1, 1))):
+            params = {"department": department} if department else {}
+            [row] = self.get_today_rollups(**params)
+            assert row["department"] == department
+            assert (row["registrations"], row["checkins"], row["suspicious"], row["symptoms"]["q1"]) == counters
+
+    def test_rebuild_rollups(self):
+        """Having persons with symptoms, and their rollups deleted, rebuild the rollups.
+        Should return the same counters that were maintained on the writes"""
+        for code in ("LIM", "CUS", "CUS"):
+            person = get_person_in_department(code)
+            ContactRepository.addSymptom(person.contact_id, get_symptom_update(is_suspicious=True))
+        maintained = [self.get_today_rollups(department=code) for code in ("LIM", "CUS")]
+
+        rollups.delete_many({})
+        assert rebuild(workers=2) == 3
+        assert [self.get_today_rollups(department=code) for code in ("LIM", "CUS")] == maintained
+
+    def test_rebuild_rollups_registered_symptoms(self):
+        """Having a person registered with symptoms (stored with their time as date string), rebuild the rollups.
+        Should count the check-in by its day, without failing"""
+        symptoms = Symptoms(**{f"q{i}": False for i in range(1, 10)}, is_suspicious=True)
+        get_existing_person(symptoms=[symptoms])
+
+        rollups.delete_many({})
+        assert rebuild(workers=2) >= 1
+        assert sum(document.get("checkins", 0) for document in rollups.find()) == 1
+
+    def test_rebuild_rollups_alarm_signals(self):
+        """Having a person with two alarm signals reported, and its rollups deleted, rebuild the rollups.
+        Should return the same alarm signal counters that were maintained on the writes"""
+        person = get_person_in_department("LIM")
+        ContactRepository.addAlarmSignal(person.contact_id, get_alarm_signal("q1", "q3"))
+        ContactRepository.addAlarmSignal(person.contact_id, get_alarm_signal("q3"))
+        [maintained] = self.get_today_rollups(department="LIM")
+        assert maintained["alarm_signal_reports"] == 2
+        assert maintained["alarm_signals"] == {"q1": 1, "q3": 2}
+
+        rollups.delete_many({})
+        rebuild(workers=2)
+        assert self.get_today_rollups(department="LIM") == [maintained]
@@ -0,0 +1,65 @@
+"""TEST TRUSTED READS
+Test that the persons built with trusted reads serialize as the validated ones
+"""
+
+# # Native # #
+import json
+
+# # Installed # #
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+
+# # Project # #
+from people_api.queries import contact_read
+from people_api.serialization import trusted_dict
+from people_api.settings import api_settings
+from people_api.utils import get_time, get_uuid
+
+
+@pytest.fixture
+def document():
+    now = get_time()
+    return {"_id": get_uuid(), "doc_type": "DNI", "doc_number": "12345678", "name": "Name", "first_name": "First",
+            "birth": "1990-05-01", "alternative_cellphone_number": "935397346",
+            "address": {"street": "Av. Example 123"}, "created": now, "updated": now}
+
+
+def get_checkins(now: int) -> list:
+    """Return the check-ins of a person as stored: registered with the person (answers as booleans, time as
+    ISO date string), and added later (answers as strings, time as timestamp, with location)"""
+    registered = {**{f"q{i}": i == 1 for i in range(1, 10)}, "is_suspicious": True,
+                  "created": "2021-10-04", "updated": "2021-10-04"}
+    added = {**{f"q{i}": "true" if i == 2 else "false" for i in range(1, 10)}, "q10": "cough", "is_suspicious": False,
+             "latitude": "-12.046374", "longitude": "-77.042793",
+             "location": {"type": "Point", "coordinates": [-77.042793, -12.046374]}, "updated": now}
+    return [registered, added]
+
+
+def get_trusted_body(document: dict, monkeypatch) -> dict:
+    monkeypatch.setattr(api_settings, "trusted_reads", True)
+    return json.loads(ORJSONResponse(content=trusted_dict(contact_read(dict(document)))).body)
+
+
+def test_trusted_read_matches_validated(document, monkeypatch):
+    """Build a person from a stored document, with and without trusted reads.
+    Should return the same JSON body"""
+    validated = jsonable_encoder(contact_read(dict(document)))
+    trusted = get_trusted_body(document, monkeypatch)
+
+    assert trusted == validated
+    assert trusted["contact_id"] == document["_id"]
+    assert "age" in trusted and "created" not in trusted
+
+
+def test_trusted_read_with_checkins_matches_validated(document, monkeypatch):
+    """Build a person with check-ins (registered and added) from a stored document, with and without trusted reads.
+    Should return the same JSON body, with the answers as booleans and the check-in times as timestamps"""
+    checkins = get_checkins(document["updated"])
+    document = {**document, "symptoms": checkins, "latest_symptom": checkins[-1]}
+    validated = jsonable_encoder(contact_read(dict(document)))
+    trusted = get_trusted_body(document, monkeypatch)
+
+    assert trusted == validated
+    assert [checkin["updated"] for checkin in trusted["symptoms"]] == [1633305600, document["updated"]]
+    assert trusted["latest_symptom"]["q2"] is True
@@ -8,7 +8,11 @@ from random import randint
 
 # # Project # #
 from people_api.models import *
+from people_api.models.department import Department
 from people_api.repositories import ContactRepository
+from people_api.database import collection, symptomsHistory
+from people_api.indexes import ensure_indexes
+from people_api.settings import api_settings, mongo_settings
 
 # # Installed # #
 import pydantic
@@ -27,6 +31,9 @@ class PersonAsCreate(ContactCreate):
     class Config(ContactCreate.Config):
         extra = pydantic.Extra.ignore
 
+    def dict(self, **kwargs):
+        return super().dict(exclude={"contact_id"}, **kwargs)
+
 
 class TestCreate(BaseTest):
     def test_create_person(self):
@@ -61,7 +68,7 @@ class TestCreate(BaseTest):
         response_as_read = ContactRead(**response.json())
 
         assert response_as_read.birth is None
-        assert response_as_read.age is None
+        assert "age" not in response.json()
 
     def test_timestamp_created_updated(self):
         """Create a person and assert the created and updated timestamp fields.
@@ -74,8 +81,164 @@ class TestCreate(BaseTest):
             create = get_person_create()
             result = ContactRepository.create(create)
 
-        assert result.created == result.updated
-        assert result.created == expected_timestamp
+        document = collection.find_one({"_id": result.contact_id})
+        assert document["created"] == document["updated"]
+        assert document["created"] == expected_timestamp
+
+
+class TestCreateBatch(BaseTest):
+    def test_create_people_batch(self):
+        """Create multiple persons on a single batch.
+        Should create all of them, and return their ids"""
+        creates = [get_person_create().dict() for _ in range(3)]
+
+        response = self.create_people_batch(creates)
+        result = response.json()
+        assert result["created"] == 3
+        assert [item["status"] for item in result["items"]] == ["created"] * 3
+
+        for create, item in zip(creates, result["items"]):
+            read = self.get_person(item["contact_id"]).json()
+            assert PersonAsCreate(**read).dict() == create
+
+    def test_create_people_batch_invalid_items(self):
+        """Create a batch with valid and invalid persons.
+        Should create the valid ones and report the invalid ones, with their errors"""
+        creates = [get_person_create().dict(), {"foo": "bar"}, get_person_create().dict()]
+
+        response = self.create_people_batch(creates)
+        result = response.json()
+        assert result["created"] == 2
+        assert result["invalid"] == 1
+        assert [item["status"] for item in result["items"]] == ["created", "invalid", "created"]
+        assert result["items"][1]["errors"]
+
+    def test_create_people_batch_too_large(self):
+        """Create a batch with more persons than allowed.
+        Should return 413 error"""
+        creates = [get_person_create().dict()] * (api_settings.batch_max_size + 1)
+        self.create_people_batch(creates, statuscode=statuscode.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+
+class TestAddSymptomsBatch(BaseTest):
+    def test_add_symptoms_batch(self):
+        """Add symptoms for multiple persons on a single batch, including a person that does not exist.
+        Should add the symptoms of the existing persons, and return the id of the nonexisting one"""
+        people = [get_existing_person() for _ in range(2)]
+        nonexisting_id = get_uuid()
+        items = [
+            {"contact_id": people[0].contact_id, "symptom": get_symptom_update().dict()},
+            {"contact_id": nonexisting_id, "symptom": get_symptom_update().dict()},
+            {"contact_id": people[0].contact_id, "symptom": get_symptom_update().dict()},
+            {"contact_id": people[1].contact_id, "symptom": get_symptom_update().dict()},
+        ]
+
+        response = self.add_symptoms_batch(items)
+        assert response.json() == {"added": 3, "not_found": [nonexisting_id]}
+
+        assert len(self.get_person(people[0].contact_id).json()["symptoms"]) == 2
+        assert len(self.get_person(people[1].contact_id).json()["symptoms"]) == 1
+
+
+class TestSymptomsWindow(BaseTest):
+    @classmethod
+    def setup_class(cls):
+        # The API process is forked with the changed setting
+        mongo_settings.symptoms_window = 2
+        super().setup_class()
+        mongo_settings.symptoms_window = 0
+
+    @classmethod
+    def teardown_method(cls):
+        super().teardown_method()
+        symptomsHistory.delete_many({})
+
+    def test_keep_latest_symptoms(self):
+        """Add more symptoms to a person than the symptoms window.
+        Should keep only the latest ones on the person, the last one as latest_symptom,
+        and all of them on the history"""
+        person = get_existing_person()
+        updates = [get_symptom_update() for _ in range(3)]
+        items = [{"contact_id": person.contact_id, "symptom": update.dict()} for update in updates]
+        self.add_symptoms_batch(items)
+
+        read = self.get_person(person.contact_id).json()
+        assert [symptom["q10"] for symptom in read["symptoms"]] == [update.q10 for update in updates[1:]]
+        assert read["latest_symptom"]["q10"] == updates[-1].q10
+
+        buckets = list(symptomsHistory.find({"contact_id": person.contact_id}))
+        assert sum(bucket["count"] for bucket in buckets) == 3
+
+
+class TestUpsert(BaseTest):
+    def test_upsert_new_person(self):
+        """Upsert a person by a document that does not exist.
+        Should create the person, with the document of the path"""
+        create = get_person_create()
+        upsert = create.dict(exclude={"doc_type", "doc_number"})
+
+        result = self.upsert_person(create.doc_type, create.doc_number, upsert).json()
+        assert result["created"] is True
+        read = self.get_person(result["contact_id"]).json()
+        assert PersonAsCreate(**read).dict() == create.dict()
+
+    def test_upsert_existing_person(self):
+        """Upsert twice a person by its document, changing its name on the second time.
+        Should update the same person, and not create another one"""
+        create = get_person_create()
+        upsert = create.dict(exclude={"doc_type", "doc_number"})
+        contact_id = self.upsert_person(create.doc_type, create.doc_number, upsert).json()["contact_id"]
+
+        new_name = get_uuid()
+        result = self.upsert_person(create.doc_type, create.doc_number, {**upsert, "name": new_name},
+                                    statuscode=statuscode.HTTP_200_OK).json()
+        assert result == {"contact_id": contact_id, "created": False}
+        assert self.get_person(contact_id).json()["name"] == new_name
+        people = self.list_people(doc_number=create.doc_number).json()
+        assert [person["contact_id"] for person in people] == [contact_id]
+
+    def test_upsert_person_document_mismatch(self):
+        """Upsert a person sending on the body a document number different to the one of the path.
+        Should return bad request 400 error"""
+        create = get_person_create()
+        self.upsert_person(create.doc_type, get_uuid(), create.dict(), statuscode=statuscode.HTTP_400_BAD_REQUEST)
+
+
+class TestDuplicates(BaseTest):
+    @classmethod
+    def setup_class(cls):
+        super().setup_class()
+        ensure_indexes()
+
+    def test_create_duplicated_person(self):
+        """Create a person with the same document (type and number) as an existing person.
+        Should return already exists 409 error, and the duplicated key"""
+        person = get_existing_person()
+        create = get_person_create(doc_type=person.doc_type, doc_number=person.doc_number)
+
+        response = self.create_person(create.dict(), statuscode=statuscode.HTTP_409_CONFLICT)
+        assert person.doc_number in response.json()["identifier"]
+
+    def test_create_people_batch_duplicates(self):
+        """Create a batch with a person with the same document as an existing person.
+        Should create the others and report the duplicated one"""
+        person = get_existing_person()
+        creates = [get_person_create().dict(),
+                   get_person_create(doc_type=person.doc_type, doc_number=person.doc_number).dict()]
+
+        result = self.create_people_batch(creates).json()
+        assert result["created"] == 1
+        assert result["duplicates"] == 1
+        assert [item["status"] for item in result["items"]] == ["created", "duplicate"]
+
+    def test_update_person_duplicated_document(self):
+        """Update the document of a person to the document of another existing person.
+        Should return already exists 409 error, and not update the person"""
+        person, other = get_existing_person(), get_existing_person()
+        update = ContactUpdate(doc_type=other.doc_type, doc_number=other.doc_number)
+
+        self.update_person(person.contact_id, update.dict(), statuscode=statuscode.HTTP_409_CONFLICT)
+        assert self.get_person(person.contact_id).json()["doc_number"] == person.doc_number
 
 
 class TestDelete(BaseTest):
@@ -84,8 +247,8 @@ class TestDelete(BaseTest):
         Then get it. Should end returning 404 not found"""
         person = get_existing_person()
 
-        self.delete_person(person.person_id)
-        self.get_person(person.person_id, statuscode=statuscode.HTTP_404_NOT_FOUND)
+        self.delete_person(person.contact_id)
+        self.get_person(person.contact_id, statuscode=statuscode.HTTP_404_NOT_FOUND)
 
     def test_delete_nonexisting_person(self):
         """Delete a person that does not exist.
@@ -104,11 +267,79 @@ class TestUpdate(BaseTest):
 
         new_name = get_uuid()
         update = ContactUpdate(name=new_name)
-        self.update_person(person.person_id, update.dict())
+        self.update_person(person.contact_id, update.dict())
 
-        read = ContactRead(**self.get_person(person.person_id).json())
+        read = ContactRead(**self.get_person(person.contact_id).json())
         assert read.name == new_name
-        assert read.dict() == {**person.dict(), "name": new_name, "updated": read.updated}
+        assert read.dict() == {**person.dict(), "name": new_name}
+
+    def test_update_person_nested_attribute(self):
+        """Update the street of the address of a person.
+        Then get it. Should return the person with its street updated, keeping the other address fields"""
+        department = Department(code="15", name="LIMA")
+        person = get_existing_person(address=Address(street=get_uuid(), department=department))
+
+        new_street = get_uuid()
+        self.update_person(person.contact_id, {"address": {"street": new_street}})
+
+        read = self.get_person(person.contact_id).json()
+        assert read["address"] == {"street": new_street, "department": department.dict()}
+
+    def test_update_person_nested_attribute_partial(self):
+        """Update the department of the address of a person, without sending the street.
+        Then get it. Should return the person with its department updated, keeping its street"""
+        person = get_existing_person()
+        department = Department(code="15", name="LIMA")
+
+        self.update_person(person.contact_id, {"address": {"department": department.dict()}})
+
+        read = self.get_person(person.contact_id).json()
+        assert read["address"] == {"street": person.address.street, "department": department.dict()}
+
+    def test_update_person_comorbidity_partial(self):
+        """Update a single comorbidity question of a person registered with comorbidities.
+        Then get it. Should return the person with that question updated, keeping the other ones"""
+        comorbidity = Comorbidity(**{f"q{i}": False for i in range(1, 17)})
+        person = get_existing_person(comorbidity=comorbidity)
+
+        self.update_person(person.contact_id, {"comorbidity": {"q3": True}})
+
+        read = self.get_person(person.contact_id).json()
+        assert read["comorbidity"] == {**comorbidity.dict(), "q3": True}
+
+    def test_update_person_symptoms(self):
+        """Update the symptoms of a person (they are added as check-ins instead).
+        Should return validation error 422"""
+        person = get_existing_person()
+        symptoms = [{**{f"q{i}": False for i in range(1, 10)}, "is_suspicious": False}]
+        self.update_person(person.contact_id, {"symptoms": symptoms},
+                           statuscode=statuscode.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_update_person_unchanged(self):
+        """Update the name of a person with its current name.
+        Should not fail, and not change the updated timestamp nor the version (ETag)"""
+        person = get_existing_person()
+        collection.update_one({"_id": person.contact_id}, {"$set": {"updated": 1}})
+        etag = self.get_person(person.contact_id).headers["ETag"]
+
+        self.update_person(person.contact_id, {"name": person.name})
+        document = collection.find_one({"_id": person.contact_id})
+        assert (document["updated"], document["version"]) == (1, 1)
+        assert self.get_person(person.contact_id).headers["ETag"] == etag
+
+    def test_update_person_return_representation(self):
+        """Update the name of a person, asking for the updated person with the Prefer header.
+        Should return the person with its name updated"""
+        person = get_existing_person()
+
+        new_name = get_uuid()
+        update = ContactUpdate(name=new_name)
+        response = self.update_person(person.contact_id, update.dict(), statuscode=statuscode.HTTP_200_OK,
+                                      headers={"Prefer": "return=representation"})
+
+        assert response.headers["Preference-Applied"] == "return=representation"
+        assert response.json() == self.get_person(person.contact_id).json()
+        assert response.json()["name"] == new_name
 
     def test_update_nonexisting_person(self):
         """Update the name of a person that does not exist.
@@ -123,13 +354,13 @@ class TestUpdate(BaseTest):
         """Update a person sending an empty object.
         Should return validation error 422"""
         person = get_existing_person()
-        self.update_person(person.person_id, {}, statuscode=statuscode.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.update_person(person.contact_id, {}, statuscode=statuscode.HTTP_422_UNPROCESSABLE_ENTITY)
 
     def test_update_person_extra_attributes(self):
         """Update a person sending unknown attributes.
         Should return validation error 422"""
         person = get_existing_person()
-        self.update_person(person.person_id, {"foo": "bar"}, statuscode=statuscode.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.update_person(person.contact_id, {"foo": "bar"}, statuscode=statuscode.HTTP_422_UNPROCESSABLE_ENTITY)
 
     def test_timestamp_updated(self):
         """Update a person and assert the updated timestamp.
@@ -141,11 +372,8 @@ class TestUpdate(BaseTest):
 
         with freeze_time(iso_timestamp):
             update = ContactUpdate(name=get_uuid())
-            ContactRepository.update(contact_id=person.person_id, update=update)
-
-        read_response = self.get_person(person.person_id)
-        read = ContactRead(**read_response.json())
+            ContactRepository.update(contact_id=person.contact_id, update=update)
 
-        assert read.updated == expected_timestamp
-        assert read.updated != read.created
-        assert read.created == person.created
+        document = collection.find_one({"_id": person.contact_id})
+        assert document["updated"] == expected_timestamp
+        assert document["updated"] != document["created"]
@@ -12,7 +12,7 @@ from people_api.repositories import ContactRepository
 from people_api.utils import get_uuid
 
 __all__ = (
-    "get_person_create", "get_existing_person",
+    "get_person_create", "get_existing_person", "get_symptom_update",
     "get_uuid"
 )
 
@@ -20,16 +20,17 @@ __all__ = (
 def get_address(**kwargs):
     return Address(**{
         "street": get_uuid(),
-        "city": get_uuid(),
-        "state": get_uuid(),
-        "zip_code": randint(1000, 10000),
         **kwargs
     })
 
 
 def get_person_create(**kwargs):
     return ContactCreate(**{
+        "doc_type": "DNI",
+        "doc_number": get_uuid(),
         "name": get_uuid(),
+        "first_name": get_uuid(),
+        "alternative_cellphone_number": str(randint(900000000, 999999999)),
         "address": get_address(),
         "birth": datetime.now().date(),
         **kwargs
@@ -38,3 +39,14 @@ def get_person_create(**kwargs):
 
 def get_existing_person(**kwargs):
     return ContactRepository.create(get_person_create(**kwargs))
+
+
+def get_symptom_update(**kwargs):
+    return SymptomUpdate(**{
+        "is_suspicious": False,
+        **{f"q{i}": "false" for i in range(1, 10)},
+        "q10": get_uuid(),
+        "latitude": "-12.046374",
+        "longitude": "-77.042793",
+        **kwargs
+    })